@@ -1,38 +1,219 @@
-from typing import Optional
-import os
-import pathlib
+from __future__ import annotations
+from typing import Optional, TYPE_CHECKING
 import logging
 
 from . import html
+from .assets import AssetManager, Asset
+from .routing import Router, Route, ResponseCache, CachedResponse, Recorder
+from .api import QueryAPI, CursorRegistry
+
+if TYPE_CHECKING:
+    from boic.jewel import Jewel
+
 _logger = logging.getLogger(__name__)
 
-class AssetManager:
-    """ Gestionnaire d'assets de l'application """
-    def __init__(self, dir: Optional[str] = None):
-        self.dir = pathlib.Path(dir or os.getcwd(), 'assets')
-    
-    def __contains__(self, filepath: str) -> str:
-        self.dir
+# Préfixe des URIs des assets statiques (cf. AssetManager)
+ASSETS_PREFIX = "/assets/"
+
+TAILWIND_CDN = "https://cdn.tailwindcss.com"
+
+class RequestCancelled(Exception):
+    """ La requête a été annulée par le client (navigateur ou connexion HTTP fermée) """
+
+def _head(tailwind: str) -> html.Static:
+    """ En-tête commun des pages, rendu une seule fois. """
+    return html.static(
+        html.e("head", {}, [
+            html.e("title", {}, ["BOIC"]),
+            html.e("meta", {"charset": "UTF8"}),
+            html.e("meta", {"name": "viewport", "content": "width=device-width, initial-scale=1.0"}),
+            html.e("script", {"src": tailwind}, [""])
+        ])
+    )
+
+def _age(seconds: float) -> str:
+    """ Durée lisible (ex: 3 h) """
+    for unit, size in (("j", 86400), ("h", 3600), ("min", 60)):
+        if seconds >= size:
+            return f"{int(seconds // size)} {unit}"
+
+    return f"{int(seconds)} s"
 
 class App:
-    def __init__(self):
+    def __init__(self, jewel: Optional[Jewel] = None, assets: Optional[AssetManager] = None, cache: Optional[ResponseCache] = None):
         _logger.info("Initialise la couche applicative")
+        self.jewel = jewel
+        self.assets = assets or AssetManager()
+        self.cache = cache or ResponseCache()
+        # Revalidation en arrière-plan des situations GUN périmées (ouverte au premier besoin)
+        self.revalidator = None
+
+        # Les postes d'inspection peuvent être hors ligne : Tailwind est servi localement s'il est disponible.
+        self.head = _head(f"{ASSETS_PREFIX}tailwind.js" if "tailwind.js" in self.assets else TAILWIND_CDN)
+
+        self.router = Router()
+        self.router.add("/", self.home)
+        self.router.add("/aiots", self.aiots)
+        self.router.add("/shard/{id:path}", self.shard)
+        # Les pages d'une requête dépendent du curseur ouvert : elles ne sont pas mises en cache.
+        self.router.add("/api/query", QueryAPI(jewel), name="api_query", cache=False)
+
+    def generation(self) -> int:
+        """ Génération du Jewel, les pages en cache d'une génération antérieure sont périmées """
+        return self.jewel.generation if self.jewel else 0
 
     def process(self, ctx):
         """ Traite la requête, et écris une réponse. """
-        _logger.info(f"Traitement de la requête: {ctx.uri()}")
-        resp = ctx.response(status=200).set_header("Content-Type", "text/html").build()
-        
-        html.e("html", {}, [
-            html.e("head", {}, [
-                html.e("title", {}, ["BOIC"]),
-                html.e("meta", {"charset": "UTF8"}),
-                html.e("meta", {"name": "viewport", "content": "width=device-width, initial-scale=1.0"}),
-                html.e("script", {"src": "https://cdn.tailwindcss.com"}, [""])
-            ]),
+        uri = ctx.uri()
+        _logger.info(f"Traitement de la requête: {uri}")
+
+        if uri.startswith(ASSETS_PREFIX):
+            return self.serve_asset(ctx, uri.removeprefix(ASSETS_PREFIX))
+
+        matched = self.router.match(uri)
+
+        if matched is None:
+            return self.render(ctx, self.layout("Page introuvable", html.e("p", {}, [uri])), status=404)
+
+        route, params = matched
+        cacheable = route.cache and ctx.method() == "GET"
+        # Génération lue avant le rendu : une modification pendant le rendu périme l'entrée.
+        generation = self.generation()
+
+        if cacheable:
+            cached = self.cache.get(uri, generation)
+
+            if cached is not None:
+                _logger.debug(f"Réponse en cache: {uri}")
+                return self.replay(ctx, cached)
+
+        node = route.view(ctx, **params)
+
+        # La vue a écrit la réponse elle-même.
+        if node is None:
+            return
+
+        self.render(ctx, node, cache_key=uri if cacheable else None, generation=generation)
+
+    def render(self, ctx, node: html.Node, status: int = 200, cache_key: Optional[str] = None, generation: int = 0):
+        """ Ecris la page dans la réponse, et la met en cache si *cache_key* est fournie """
+        headers = {"Content-Type": "text/html"}
+        builder = ctx.response(status=status)
+
+        for key, value in headers.items():
+            builder.set_header(key, value)
+
+        resp = builder.build()
+        stream = Recorder(resp, limit=self.cache.max_entry) if cache_key else resp
+        node.write_to_stream(stream)
+        resp.close()
+
+        # Une page interrompue (requête annulée) n'est pas mise en cache.
+        if cache_key and not ctx.cancelled() and stream.body() is not None:
+            self.cache.put(cache_key, CachedResponse(generation=generation, status=status, headers=headers, body=stream.body()))
+
+    def replay(self, ctx, cached: CachedResponse):
+        builder = ctx.response(status=cached.status)
+
+        for key, value in cached.headers.items():
+            builder.set_header(key, value)
+
+        resp = builder.build()
+        resp.write(cached.body)
+        resp.close()
+
+    def layout(self, title: str, *content) -> html.Element:
+        return html.e("html", {}, [
+            self.head,
             html.e("body", {"class": "bg-slate-600"}, [
-                html.e("h1", {}, ["Hello world"])
+                html.e("h1", {}, [title]),
+                *content
             ])
-        ]).write_to_stream(resp)
+        ])
+
+    # --- VUES ---
+    def home(self, ctx) -> html.Node:
+        return self.layout("BOIC", html.e("a", {"href": self.router.url("aiots")}, ["AIOTs"]))
+
+    def aiots(self, ctx) -> html.Node:
+        if self.jewel is None:
+            return self.layout("AIOTs", html.e("p", {}, ["Aucun jewel n'est ouvert."]))
+
+        from boic import sql
+
+        cursor = sql.execute(self.jewel, "SELECT nom, id FROM aiot")
+
+        def rows():
+            for row in cursor:
+                if ctx.cancelled():
+                    return
+
+                href = self.router.url("shard", id=row["id"].lstrip("/"))
+                yield html.e("tr", {}, [html.e("td", {}, [html.e("a", {"href": href}, [str(row["nom"])])])])
+
+        return self.layout("AIOTs", html.e("table", {}, rows()))
+
+    def shard(self, ctx, id: str) -> html.Node:
+        if self.jewel is None:
+            return self.layout(id, html.e("p", {}, ["Aucun jewel n'est ouvert."]))
+
+        from boic import shards
+        from boic.jewel import split_path
+
+        # L'identifiant vient de l'URI : il ne doit désigner qu'un Shard du Jewel.
+        try:
+            path = self.jewel.path(*split_path(id))
+        except ValueError:
+            path = None
+
+        if path is None or path.suffix != ".md" or not path.is_file():
+            return self.render(ctx, self.layout("Page introuvable", html.e("p", {}, [id])), status=404)
+
+        shard = shards.load(path)
+        rows = [
+            html.e("tr", {}, [html.e("th", {}, [key]), html.e("td", {}, [str(shard[key])])])
+            for key in shard.keys()
+        ]
+
+        if "gun" in shard and self.jewel.config.gun.url:
+            # La page est servie immédiatement, la situation périmée est revalidée en arrière-plan.
+            from boic.gun.cache import Revalidator
+
+            if self.revalidator is None:
+                self.revalidator = Revalidator(self.jewel)
+
+            entry = self.revalidator.situation(shard["id"], str(shard["gun"]))
+
+            if entry is not None:
+                rows.append(html.e("tr", {}, [html.e("th", {}, ["Extraction GUN"]), html.e("td", {}, [f"il y a {_age(entry.age())}"])]))
+
+        return self.layout(str(shard["nom"]) if "nom" in shard else id, html.e("table", {}, rows))
+
+    def serve_asset(self, ctx, name: str):
+        """ Sert un asset statique (requêtes conditionnelles et variantes pré-compressées) """
+        asset = self.assets.get(name)
+
+        if asset is None:
+            resp = ctx.response(status=404).set_header("Content-Type", "text/plain").build()
+            resp.write(f"Asset introuvable: {name}".encode("utf8"))
+            resp.close()
+            return
+
+        if asset.not_modified(ctx.header("If-None-Match"), ctx.header("If-Modified-Since")):
+            builder = ctx.response(status=304)
+
+            for key in ("ETag", "Last-Modified", "Cache-Control"):
+                builder.set_header(key, asset.headers()[key])
+
+            builder.set_header("Content-Length", "0").build().close()
+            return
+
+        body, encoding = asset.select(ctx.header("Accept-Encoding"))
+        builder = ctx.response(status=200)
+
+        for key, value in asset.headers(encoding).items():
+            builder.set_header(key, value)
 
+        resp = builder.set_header("Content-Length", str(len(body))).build()
+        resp.write(body)
         resp.close()
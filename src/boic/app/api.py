@@ -0,0 +1,215 @@
+""" API JSON de l'application : exécution des requêtes ShQL (/api/query)
+
+GET /api/query?q=<requête>&limit=<taille de page>&cursor=<jeton>
+
+Les pages sont paginées par clé (keyset) : les lignes sont produites par identifiant de
+Shard croissant, et le jeton de la page suivante porte l'identifiant du dernier Shard lu.
+Le curseur ouvert est gardé en mémoire quelques instants (TTL) : la page suivante poursuit
+le même parcours. S'il a expiré, ou si le Jewel a changé entre-temps, le parcours est
+relancé à partir de la clé, sans relire les pages précédentes.
+
+La réponse est sérialisée ligne par ligne :
+{"rows": [[...], ...], "columns": [...], "cursor": "<jeton>" | null}
+"""
+from __future__ import annotations
+from typing import Optional, TYPE_CHECKING
+from collections import OrderedDict
+from collections.abc import Iterator
+from urllib.parse import urlsplit, parse_qs
+import base64
+import json
+import logging
+import secrets
+import threading
+import time
+
+if TYPE_CHECKING:
+    from boic.jewel import Jewel
+    from boic.sql.execution import Cursor
+
+_logger = logging.getLogger(__name__)
+
+# Colonne ajoutée à la projection pour connaître le Shard de chaque ligne.
+ID_COLUMN = "__boic_id"
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+def _with_id(query: str) -> str:
+    """ Ajoute l'identifiant du Shard à la projection de la requête """
+    from sqlglot import parse_one, exp
+    from sqlglot.errors import SqlglotError
+
+    try:
+        ast = parse_one(query)
+    except SqlglotError as e:
+        raise ValueError(f"Requête invalide : {e}")
+
+    if not isinstance(ast, exp.Select):
+        raise ValueError("Seules les requêtes SELECT sont paginables.")
+
+    if not any(isinstance(expr, exp.Star) for expr in ast.expressions):
+        ast = ast.select(exp.alias_(exp.column("id"), ID_COLUMN), append=True)
+
+    return ast.sql()
+
+def _value(value: any) -> any:
+    value = getattr(value, "value", value)
+
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+
+    if isinstance(value, list):
+        return [_value(item) for item in value]
+
+    if isinstance(value, dict):
+        return {str(key): _value(item) for key, item in value.items()}
+
+    return str(value)
+
+class OpenCursor:
+    """ Parcours en cours d'une requête, repris page après page """
+    def __init__(self, key: str, query: str, generation: int, rows: Iterator[tuple[str, list[str], list[any]]]):
+        self.key = key
+        self.query = query
+        self.generation = generation
+        self.rows = rows
+        self.last_id: Optional[str] = None
+        self.expires = 0.0
+        self.lock = threading.Lock()
+
+class CursorRegistry:
+    """ Curseurs ouverts, gardés *ttl* secondes après leur dernière page """
+    def __init__(self, ttl: float = 60.0, capacity: int = 32):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.cursors: OrderedDict[str, OpenCursor] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _expire(self, now: float):
+        for key in [key for key, cursor in self.cursors.items() if cursor.expires < now]:
+            del self.cursors[key]
+
+    def take(self, key: str) -> Optional[OpenCursor]:
+        """ Retire le curseur du registre (il y est remis après la lecture de la page) """
+        with self.lock:
+            self._expire(time.monotonic())
+            return self.cursors.pop(key, None)
+
+    def keep(self, cursor: OpenCursor):
+        with self.lock:
+            cursor.expires = time.monotonic() + self.ttl
+            self.cursors[cursor.key] = cursor
+
+            while len(self.cursors) > self.capacity:
+                self.cursors.popitem(last=False)
+
+def encode_token(key: str, query: str, after: str) -> str:
+    payload = json.dumps({"k": key, "q": query, "a": after}).encode("utf8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+def decode_token(token: str) -> tuple[str, str, str]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        return (payload["k"], payload["q"], payload["a"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Jeton de pagination invalide.")
+
+def _rows(jewel: Jewel, query: str, after: str) -> Iterator[tuple[str, list[str], list[any]]]:
+    """ Exécute la requête, et retourne l'itérateur de ses lignes : (identifiant du Shard, colonnes, valeurs)
+
+        La requête est planifiée immédiatement : une requête refusée lève ValueError 
+        avant que la réponse ne commence. Seule la lecture des lignes est différée.
+    """
+    from sqlglot.errors import SqlglotError
+    from boic import sql
+
+    try:
+        cursor = sql.execute(jewel, _with_id(query), after=after)
+    except SqlglotError as e:
+        raise ValueError(f"Requête invalide : {e}")
+
+    return _iter_rows(cursor)
+
+def _iter_rows(cursor: Cursor) -> Iterator[tuple[str, list[str], list[any]]]:
+    for row in cursor:
+        keys = row.keys()
+        id = row[ID_COLUMN] if ID_COLUMN in keys else row["id"]
+        columns = [key for key in keys if key != ID_COLUMN]
+        yield (str(id), columns, [_value(row[key]) for key in columns])
+
+class QueryAPI:
+    """ Point d'entrée /api/query """
+    def __init__(self, jewel: Optional[Jewel], registry: Optional[CursorRegistry] = None):
+        self.jewel = jewel
+        self.registry = registry or CursorRegistry()
+
+    def __call__(self, ctx):
+        params = parse_qs(urlsplit(ctx.uri()).query)
+
+        try:
+            if self.jewel is None:
+                raise ValueError("Aucun jewel n'est ouvert.")
+
+            limit = min(int(params.get("limit", [DEFAULT_LIMIT])[0]), MAX_LIMIT)
+
+            if limit <= 0:
+                raise ValueError("La taille de page doit être positive.")
+
+            cursor = self.open(params.get("q", [None])[0], params.get("cursor", [None])[0])
+        except ValueError as e:
+            return self.error(ctx, 400, str(e))
+
+        resp = ctx.response(status=200).set_header("Content-Type", "application/json").build()
+
+        try:
+            with cursor.lock:
+                self.write_page(resp, cursor, limit)
+        finally:
+            resp.close()
+
+    def open(self, query: Optional[str], token: Optional[str]) -> OpenCursor:
+        """ Reprend le curseur du jeton, ou (re)lance le parcours à partir de la clé """
+        generation = self.jewel.generation
+
+        if token:
+            key, query, after = decode_token(token)
+            cursor = self.registry.take(key)
+
+            if cursor is not None and cursor.generation == generation and cursor.last_id == after:
+                return cursor
+
+            _logger.debug(f"Curseur {key} expiré, reprise après {after}")
+        elif query:
+            key, after = (secrets.token_urlsafe(12), "")
+        else:
+            raise ValueError("Paramètre q (requête) manquant.")
+
+        return OpenCursor(key=key, query=query, generation=generation, rows=_rows(self.jewel, query, after))
+
+    def write_page(self, resp, cursor: OpenCursor, limit: int):
+        """ Ecris la page, ligne par ligne """
+        resp.write(b'{"rows": [')
+        columns, count = ([], 0)
+
+        for id, row_columns, values in cursor.rows:
+            resp.write((b"," if count else b"") + json.dumps(values, ensure_ascii=False).encode("utf8"))
+            columns = columns or row_columns
+            cursor.last_id = id
+            count += 1
+
+            if count >= limit:
+                break
+
+        token = None
+
+        if count >= limit:
+            self.registry.keep(cursor)
+            token = encode_token(cursor.key, cursor.query, cursor.last_id)
+
+        resp.write(f'], "columns": {json.dumps(columns, ensure_ascii=False)}, "cursor": {json.dumps(token)}}}'.encode("utf8"))
+
+    def error(self, ctx, status: int, message: str):
+        resp = ctx.response(status=status).set_header("Content-Type", "application/json").build()
+        resp.write(json.dumps({"error": message}, ensure_ascii=False).encode("utf8"))
+        resp.close()
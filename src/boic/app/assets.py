@@ -0,0 +1,182 @@
+""" Assets statiques de l'application (répertoire assets/)
+
+Les fichiers sont gardés en mémoire (cache LRU borné en octets), et re-validés par un
+simple stat : une navigation ne relit pas les fichiers depuis le disque. Les réponses
+portent un ETag et un Last-Modified (requêtes conditionnelles, 304), et les variantes
+pré-compressées (x.js.br, x.js.gz) sont servies selon l'en-tête Accept-Encoding.
+Les fichiers dont le nom porte une empreinte (ex: app.3f2a9c1b.js) sont mis en cache
+par le navigateur pour un an.
+"""
+from __future__ import annotations
+from typing import Optional
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+import hashlib
+import logging
+import mimetypes
+import os
+import pathlib
+import re
+import threading
+
+_logger = logging.getLogger(__name__)
+
+# Variantes pré-compressées, par ordre de préférence : (Content-Encoding, suffixe du fichier)
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+# Empreinte dans le nom du fichier (ex: app.3f2a9c1b.js, app-3f2a9c1b.css)
+_FINGERPRINT = re.compile(r"[.-][0-9a-fA-F]{8,}\.[^.]+$")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+class Asset:
+    """ Fichier servi, et ses variantes pré-compressées """
+    def __init__(self, name: str, path: pathlib.Path, data: bytes, mtime_ns: int, encoded: dict[str, bytes]):
+        self.name = name
+        self.path = path
+        self.data = data
+        self.mtime_ns = mtime_ns
+        self.encoded = encoded
+        self.etag = hashlib.sha1(data).hexdigest()[:20]
+        self.content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.last_modified = formatdate(mtime_ns / 1e9, usegmt=True)
+        self.cache_control = IMMUTABLE if _FINGERPRINT.search(name) else REVALIDATE
+
+    @property
+    def size(self) -> int:
+        return len(self.data) + sum(map(len, self.encoded.values()))
+
+    def select(self, accept_encoding: Optional[str]) -> tuple[bytes, Optional[str]]:
+        """ Retourne la représentation à servir : (corps, Content-Encoding) """
+        accepted = {token.split(";")[0].strip() for token in (accept_encoding or "").split(",")}
+
+        for encoding, _ in ENCODINGS:
+            if encoding in self.encoded and encoding in accepted:
+                return (self.encoded[encoding], encoding)
+
+        return (self.data, None)
+
+    def headers(self, encoding: Optional[str] = None) -> dict[str, str]:
+        headers = {
+            "Content-Type": self.content_type,
+            "ETag": f'"{self.etag}-{encoding}"' if encoding else f'"{self.etag}"',
+            "Last-Modified": self.last_modified,
+            "Cache-Control": self.cache_control
+        }
+
+        if self.encoded:
+            headers["Vary"] = "Accept-Encoding"
+
+        if encoding:
+            headers["Content-Encoding"] = encoding
+
+        return headers
+
+    def not_modified(self, if_none_match: Optional[str] = None, if_modified_since: Optional[str] = None) -> bool:
+        """ Vérifie si la copie du client est à jour (requête conditionnelle) """
+        if if_none_match:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or any(tag.strip('"').split("-")[0] == self.etag for tag in tags)
+
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= self.mtime_ns // 1_000_000_000
+            except (TypeError, ValueError):
+                return False
+
+        return False
+
+class AssetManager:
+    """ Gestionnaire d'assets de l'application """
+    def __init__(self, dir: Optional[str] = None, capacity: int = 32 * 1024 * 1024):
+        self.dir = pathlib.Path(dir or os.getcwd(), 'assets')
+        # Taille maximale du cache, en octets
+        self.capacity = capacity
+        self.entries: OrderedDict[str, Asset] = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def resolve(self, filepath: str) -> Optional[pathlib.Path]:
+        """ Chemin du fichier dans le répertoire des assets (None si en dehors) """
+        parts = [part for part in filepath.split("?")[0].split("/") if part not in ("", ".")]
+
+        if not parts or ".." in parts:
+            return None
+
+        return self.dir.joinpath(*parts)
+
+    def __contains__(self, filepath: str) -> bool:
+        path = self.resolve(filepath)
+        return path is not None and path.is_file()
+
+    def get(self, filepath: str) -> Optional[Asset]:
+        """ Retourne l'asset (depuis le cache s'il est à jour), ou None s'il n'existe pas """
+        path = self.resolve(filepath)
+
+        if path is None:
+            return None
+
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            self.invalidate(filepath)
+            return None
+
+        name = "/".join(path.relative_to(self.dir).parts)
+
+        with self.lock:
+            asset = self.entries.get(name)
+
+            if asset is not None and asset.mtime_ns == mtime_ns:
+                self.entries.move_to_end(name)
+                return asset
+
+        asset = self._load(name, path, mtime_ns)
+
+        with self.lock:
+            self._evict(name)
+
+            if asset.size <= self.capacity:
+                self.entries[name] = asset
+                self.size += asset.size
+
+                while self.size > self.capacity:
+                    self._evict(next(iter(self.entries)))
+
+        return asset
+
+    def _load(self, name: str, path: pathlib.Path, mtime_ns: int) -> Asset:
+        _logger.debug(f"Chargement de l'asset: {path}")
+        data = path.read_bytes()
+        encoded = {}
+
+        for encoding, suffix in ENCODINGS:
+            variant = path.with_name(path.name + suffix)
+
+            # Une variante plus ancienne que le fichier est périmée.
+            try:
+                if os.stat(variant).st_mtime_ns >= mtime_ns:
+                    encoded[encoding] = variant.read_bytes()
+            except OSError:
+                continue
+
+        return Asset(name=name, path=path, data=data, mtime_ns=mtime_ns, encoded=encoded)
+
+    def _evict(self, name: str):
+        asset = self.entries.pop(name, None)
+
+        if asset is not None:
+            self.size -= asset.size
+
+    def invalidate(self, filepath: str):
+        path = self.resolve(filepath)
+
+        if path is not None:
+            with self.lock:
+                self._evict("/".join(path.relative_to(self.dir).parts))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
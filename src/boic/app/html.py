@@ -1,55 +1,181 @@
+""" Rendu HTML incrémental
+
+Les enfants d'un élément peuvent être des générateurs (ex: les lignes d'un curseur) :
+ils ne sont parcourus qu'au rendu, qui écrit dans le flux par gros morceaux UTF-8
+(Renderer), en mémoire constante. Les sous-arbres statiques (static) sont rendus une
+seule fois, puis resservis depuis le cache. Le texte et les attributs sont échappés,
+sauf les fragments marqués comme sûrs (raw).
+"""
 from __future__ import annotations
-from typing import Union
-from collections.abc import Iterator
-import itertools
+from typing import Union, Optional
+from collections.abc import Iterator, Iterable
+from html import escape
+
+class Renderer:
+    """ Ecrit le rendu dans le flux par morceaux d'au moins *chunk_size* octets """
+    def __init__(self, stream, chunk_size: int = 64 * 1024):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.parts: list[str] = []
+        self.size = 0
+
+    def write(self, text: str):
+        self.parts.append(text)
+        self.size += len(text)
+
+        if self.size >= self.chunk_size:
+            self.flush()
+
+    def write_bytes(self, data: bytes):
+        """ Ecrit un fragment déjà encodé (sous-arbre statique) """
+        self.flush()
+        self.stream.write(data)
+
+    def flush(self):
+        """ Encode et écrit les fragments en attente, en un seul morceau """
+        if self.parts:
+            self.stream.write("".join(self.parts).encode("utf8"))
+            self.parts, self.size = ([], 0)
+
+    def render(self, node: Node):
+        node.render(self)
+        self.flush()
+
+class _Sink:
+    """ Flux en mémoire (pré-rendu des sous-arbres statiques) """
+    def __init__(self):
+        self.chunks: list[bytes] = []
+
+    def write(self, data: bytes):
+        self.chunks.append(data)
 
 class Attributes:
     def __init__(self, props: dict):
         self.props = props
 
-    def write_to_stream(self, stream):
+    def render(self, renderer: Renderer):
         if not self.props:
             return
-        
+
         for k, v in self.props.items():
-            stream.write(f' {k}="{v}"'.encode("utf8"))
+            if v is None or v is False:
+                continue
+
+            if v is True:
+                renderer.write(f' {k}')
+            else:
+                renderer.write(f' {k}="{escape(str(v), quote=True)}"')
+
+    def write_to_stream(self, stream):
+        renderer = Renderer(stream)
+        renderer.render(self)
 
 class Node:
-    def __init__(self, tag: str, *children: Iterable[Iterator[Union[Node, str]]]):
+    def __init__(self, tag: str, *children: Iterable[Union[Node, str]]):
         self.tag = tag
-        self.children = list(map(Node.ensure, itertools.chain(*children)))
+        # Les enfants ne sont parcourus qu'au rendu (les générateurs ne le sont qu'une fois).
+        self.children = children
 
+    @staticmethod
     def ensure(node_or_str: Union[Node, str]) -> Node:
-        if isinstance(node_or_str, str):
-            return Text(node_or_str)
-        else:
+        if isinstance(node_or_str, Node):
             return node_or_str
+        else:
+            return Text(str(node_or_str))
+
+    def iter_children(self) -> Iterator[Node]:
+        return _flatten(self.children)
+
+    def render(self, renderer: Renderer):
+        raise NotImplementedError("Le noeud doit implémenter render.")
+
+    def write_to_stream(self, stream, chunk_size: int = 64 * 1024):
+        """ Ecris le noeud dans le flux. """
+        Renderer(stream, chunk_size=chunk_size).render(self)
+
+    def to_bytes(self) -> bytes:
+        sink = _Sink()
+        self.write_to_stream(sink)
+        return b"".join(sink.chunks)
+
+def _flatten(children: Iterable) -> Iterator[Node]:
+    """ Aplatit les enfants (noeuds, textes, listes et générateurs imbriqués) """
+    for child in children:
+        if child is None:
+            continue
+
+        if isinstance(child, (Node, str)):
+            yield Node.ensure(child)
+        elif isinstance(child, Iterable):
+            yield from _flatten(child)
+        else:
+            yield Text(str(child))
 
 class Text(Node):
     def __init__(self, text: str):
-        super().__init__(tag="#text")
-        self.text = text   
+        super().__init__("#text")
+        self.text = text
 
-    def write_to_stream(self, stream):
-        stream.write(self.text.encode("utf8"))
+    def render(self, renderer: Renderer):
+        renderer.write(escape(self.text, quote=False))
+
+class Raw(Node):
+    """ Fragment HTML sûr, écrit sans échappement """
+    def __init__(self, text: str):
+        super().__init__("#raw")
+        self.text = text
+
+    def render(self, renderer: Renderer):
+        renderer.write(self.text)
+
+class Static(Node):
+    """ Sous-arbre statique, rendu une seule fois puis resservi depuis le cache """
+    def __init__(self, node: Node):
+        super().__init__("#static")
+        self.node = node
+        self.cached: Optional[bytes] = None
+        self.text: Optional[str] = None
+
+    def render(self, renderer: Renderer):
+        if self.cached is None:
+            self.cached = self.node.to_bytes()
+            self.text = self.cached.decode("utf8")
+
+        # Un petit fragment rejoint le morceau en cours, un gros est écrit tel quel.
+        if len(self.cached) >= renderer.chunk_size:
+            renderer.write_bytes(self.cached)
+        else:
+            renderer.write(self.text)
 
 class Element(Node):
-    def __init__(self, tag: str, props: dict, *children: Iterable[Iterator[Union[Node, str]]]):
+    def __init__(self, tag: str, props: dict, *children: Iterable[Union[Node, str]]):
         super().__init__(tag, *children)
         self.props: Attributes = Attributes(props)
 
-    def write_to_stream(self, stream):
-        """ Ecris le noeud dans le flux. """
-        
-        stream.write(f'<{self.tag}'.encode("utf8"))
-        self.props.write_to_stream(stream)
-        
-        if len(self.children) > 0:
-            stream.write(b'>')
-            for c in self.children: c.write_to_stream(stream)
-            stream.write(f'</{self.tag}>'.encode("utf8"))
-        else:
-            stream.write(b'/>')       
+    def render(self, renderer: Renderer):
+        renderer.write(f'<{self.tag}')
+        self.props.render(renderer)
+
+        children = self.iter_children()
+        first = next(children, None)
+
+        if first is None:
+            renderer.write('/>')
+            return
+
+        renderer.write('>')
+        first.render(renderer)
+
+        for c in children:
+            c.render(renderer)
+
+        renderer.write(f'</{self.tag}>')
+
+def e(tag: str, props: dict[str, any], *children: Iterable[Union[Node, str]]) -> Element:
+    return Element(tag, props, *children)
+
+def raw(text: str) -> Raw:
+    return Raw(text)
 
-def e(tag: str, props: dict[str, any], *children: Iterable[Iterator[Union[Node, str]]]) -> Element:
-    return Element(tag, props, *children)
\ No newline at end of file
+def static(node: Node) -> Static:
+    return Static(node)
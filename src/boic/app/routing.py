@@ -0,0 +1,186 @@
+""" Table de routage et cache des réponses de l'application
+
+Les motifs de route portent des paramètres de chemin : /aiot/{id} (un segment) ou
+/shard/{id:path} (le reste du chemin, '/' compris).
+
+Les pages rendues sont gardées en cache par URI (cache LRU borné en octets), avec la
+génération du Jewel (Jewel.touch) au moment du rendu : une entrée d'une génération
+antérieure est périmée. Naviguer en arrière puis en avant resert la page sans ré-exécuter
+les requêtes.
+"""
+from __future__ import annotations
+from typing import Optional, Callable
+from collections import OrderedDict
+from urllib.parse import quote, unquote
+import re
+import threading
+
+_PARAM = re.compile(r"\{(\w+)(?::(\w+))?\}")
+
+# Expressions régulières des types de paramètre
+_CONVERTERS = {
+    None: "[^/]+",
+    "path": ".+",
+    "int": "[0-9]+"
+}
+
+class Route:
+    """ Route de l'application : motif, vue, et mise en cache de la réponse """
+    def __init__(self, pattern: str, view: Callable, name: Optional[str] = None, cache: bool = True):
+        self.pattern = pattern
+        self.view = view
+        self.name = name or view.__name__
+        self.cache = cache
+        self.types: dict[str, Optional[str]] = {}
+        self.regex = re.compile(self._compile(pattern))
+
+    def _compile(self, pattern: str) -> str:
+        regex, end = ([], 0)
+
+        for match in _PARAM.finditer(pattern):
+            name, typ = match.groups()
+
+            if typ not in _CONVERTERS:
+                raise ValueError(f"Type de paramètre {typ} inconnu ({pattern}).")
+
+            self.types[name] = typ
+            regex.append(re.escape(pattern[end:match.start()]))
+            regex.append(f"(?P<{name}>{_CONVERTERS[typ]})")
+            end = match.end()
+
+        regex.append(re.escape(pattern[end:]))
+        return "".join(regex)
+
+    def match(self, path: str) -> Optional[dict[str, any]]:
+        match = self.regex.fullmatch(path)
+
+        if match is None:
+            return None
+
+        return {
+            name: int(value) if self.types[name] == "int" else unquote(value)
+            for name, value in match.groupdict().items()
+        }
+
+    def url(self, **params) -> str:
+        """ Construit l'URI de la route à partir de ses paramètres (encodés, cf. match) """
+        def param(match: re.Match) -> str:
+            name, typ = match.groups()
+            # Seul un paramètre de type path peut contenir des '/'.
+            return quote(str(params[name]), safe="/" if typ == "path" else "")
+
+        return _PARAM.sub(param, self.pattern)
+
+class Router:
+    """ Table de routage (la première route correspondante l'emporte) """
+    def __init__(self):
+        self.routes: list[Route] = []
+
+    def add(self, pattern: str, view: Callable, name: Optional[str] = None, cache: bool = True) -> Route:
+        route = Route(pattern, view, name=name, cache=cache)
+        self.routes.append(route)
+        return route
+
+    def route(self, pattern: str, name: Optional[str] = None, cache: bool = True) -> Callable:
+        """ Décorateur : enregistre la vue pour le motif """
+        def decorator(view: Callable) -> Callable:
+            self.add(pattern, view, name=name, cache=cache)
+            return view
+
+        return decorator
+
+    def match(self, uri: str) -> Optional[tuple[Route, dict[str, any]]]:
+        path = uri.split("?", 1)[0].split("#", 1)[0] or "/"
+
+        for route in self.routes:
+            params = route.match(path)
+
+            if params is not None:
+                return (route, params)
+
+        return None
+
+    def url(self, name: str, **params) -> str:
+        route = next((route for route in self.routes if route.name == name), None)
+
+        if route is None:
+            raise ValueError(f"Route {name} inconnue.")
+
+        return route.url(**params)
+
+class CachedResponse:
+    """ Réponse rendue, associée à la génération du Jewel """
+    def __init__(self, generation: int, status: int, headers: dict[str, str], body: bytes):
+        self.generation = generation
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+class ResponseCache:
+    """ Cache des réponses par URI, borné en octets (*max_entry* : taille maximale d'une réponse) """
+    def __init__(self, capacity: int = 16 * 1024 * 1024, max_entry: int = 2 * 1024 * 1024):
+        self.capacity = capacity
+        self.max_entry = max_entry
+        self.entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, uri: str, generation: int) -> Optional[CachedResponse]:
+        with self.lock:
+            cached = self.entries.get(uri)
+
+            if cached is None:
+                return None
+
+            if cached.generation != generation:
+                self._evict(uri)
+                return None
+
+            self.entries.move_to_end(uri)
+            return cached
+
+    def put(self, uri: str, response: CachedResponse):
+        if len(response.body) > self.max_entry:
+            return
+
+        with self.lock:
+            self._evict(uri)
+            self.entries[uri] = response
+            self.size += len(response.body)
+
+            while self.size > self.capacity:
+                self._evict(next(iter(self.entries)))
+
+    def _evict(self, uri: str):
+        cached = self.entries.pop(uri, None)
+
+        if cached is not None:
+            self.size -= len(cached.body)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+class Recorder:
+    """ Flux qui enregistre ce qui est écrit dans la réponse, jusqu'à *limit* octets """
+    def __init__(self, stream, limit: int):
+        self.stream = stream
+        self.limit = limit
+        self.chunks: Optional[list[bytes]] = []
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        if self.chunks is not None:
+            self.size += len(data)
+
+            if self.size > self.limit:
+                # Réponse trop volumineuse pour le cache : l'enregistrement est abandonné.
+                self.chunks = None
+            else:
+                self.chunks.append(bytes(data))
+
+        return self.stream.write(data)
+
+    def body(self) -> Optional[bytes]:
+        return b"".join(self.chunks) if self.chunks is not None else None
@@ -0,0 +1,408 @@
+""" Serveur HTTP asyncio de l'application (sans navigateur)
+
+Usage : python -m boic.app.server [-j JEWEL_PATH] [--host HOST] [--port PORT] [-w WORKERS]
+
+Sert la même App que le navigateur CEF (boic.main), sur un serveur HTTP/1.1 local :
+l'application peut être testée en charge, ou mesurée (boic.tools.loadgen), sur une
+machine sans affichage.
+
+Comme avec CEF, App.process est exécuté par un fil du pool de travail : la boucle
+asyncio ne fait que lire les requêtes et écrire les réponses. Le corps est envoyé par
+morceaux (chunked, sauf si Content-Length est connu) dès qu'ils sont écrits ; l'écriture
+attend que la connexion les ait absorbés (contre-pression). Une connexion fermée par le
+client annule la requête (RequestCancelled).
+"""
+from __future__ import annotations
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from http import HTTPStatus
+from urllib.parse import urlsplit
+import argparse
+import asyncio
+import logging
+import os
+import pathlib
+import sys
+import threading
+
+from boic.app import App, RequestCancelled
+
+_logger = logging.getLogger(__name__)
+
+# Taille maximale de la ligne de requête et des en-têtes
+MAX_HEADERS = 64 * 1024
+
+# Délai maximal d'envoi d'un morceau au client (secondes)
+SEND_TIMEOUT = 30.0
+
+def _status_text(status: int) -> str:
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return "Unknown"
+
+class ServerRequest:
+    """ Requête HTTP reçue : ligne de requête et en-têtes """
+    def __init__(self, method: str, target: str, version: str, headers: dict[str, str]):
+        self.method = method
+        self.target = target
+        self.version = version
+        # Noms des en-têtes en minuscules
+        self.headers = headers
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+
+        return connection != "close"
+
+    @staticmethod
+    def parse(head: bytes) -> ServerRequest:
+        lines = head.decode("latin-1").split("\r\n")
+
+        try:
+            method, target, version = lines[0].split(" ")
+        except ValueError:
+            raise ValueError(f"Ligne de requête invalide : {lines[0]!r}")
+
+        if version not in ("HTTP/1.0", "HTTP/1.1"):
+            raise ValueError(f"Version HTTP non supportée : {version}")
+
+        headers = {}
+
+        for line in lines[1:]:
+            if not line:
+                continue
+
+            name, sep, value = line.partition(":")
+
+            if not sep:
+                raise ValueError(f"En-tête invalide : {line!r}")
+
+            headers[name.strip().lower()] = value.strip()
+
+        # Les requêtes en forme absolue (http://hôte/chemin) sont ramenées au chemin.
+        if not target.startswith("/"):
+            parts = urlsplit(target)
+            target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+
+        return ServerRequest(method=method.upper(), target=target, version=version, headers=headers)
+
+class Exchange:
+    """ Echange requête/réponse sur une connexion, partagé entre la boucle et le fil de travail """
+    def __init__(self, loop: asyncio.AbstractEventLoop, writer: asyncio.StreamWriter, request: ServerRequest):
+        self.loop = loop
+        self.writer = writer
+        self.request = request
+        self.response: Optional[ServerResponse] = None
+        self.cancelled = threading.Event()
+
+    def send(self, data: bytes):
+        """ Envoie les données au client (fil de travail), en attendant qu'elles soient absorbées """
+        if self.cancelled.is_set():
+            raise RequestCancelled()
+
+        future = asyncio.run_coroutine_threadsafe(self._send(data), self.loop)
+
+        try:
+            future.result(timeout=SEND_TIMEOUT)
+        except (ConnectionError, TimeoutError) as e:
+            future.cancel()
+            _logger.info(f"Connexion interrompue: {e!r}")
+            self.cancelled.set()
+            raise RequestCancelled()
+
+    async def _send(self, data: bytes):
+        self.writer.write(data)
+        await self.writer.drain()
+
+class ServerRequestContext:
+    """ Contexte d'exécution d'une requête (équivalent de main.AppRequestContext) """
+    def __init__(self, exchange: Exchange):
+        self.exchange = exchange
+
+    def uri(self) -> str:
+        return self.exchange.request.target
+
+    def method(self) -> str:
+        return self.exchange.request.method
+
+    def header(self, name: str) -> Optional[str]:
+        """ Retourne l'en-tête de la requête (insensible à la casse) """
+        return self.exchange.request.headers.get(name.lower())
+
+    def cancelled(self) -> bool:
+        """ Vérifie si la requête a été annulée (connexion fermée par le client) """
+        return self.exchange.cancelled.is_set()
+
+    def response(self, status) -> ServerResponseBuilder:
+        return ServerResponseBuilder(exchange=self.exchange, status=status)
+
+class ServerResponseBuilder:
+    def __init__(self, exchange: Exchange, status: int = 200):
+        self.exchange = exchange
+        self.status = status
+        self.headers = {}
+
+    def set_header(self, key: str, value: any) -> ServerResponseBuilder:
+        self.headers[key] = value
+        return self
+
+    def build(self) -> ServerResponse:
+        resp = ServerResponse(exchange=self.exchange, status=self.status, headers=self.headers)
+        self.exchange.response = resp
+        return resp
+
+class ServerResponse:
+    """ Réponse HTTP, envoyée par morceaux d'au moins *chunk_size* octets
+
+        Les en-têtes partent avec le premier morceau. Sans Content-Length, le corps est
+        envoyé en chunked (HTTP/1.1), ou délimité par la fermeture de la connexion (HTTP/1.0).
+    """
+    def __init__(self, exchange: Exchange, status: int, headers: dict[str, any], chunk_size: int = 64 * 1024):
+        self.exchange = exchange
+        self.status = status
+        self.headers = headers
+        self.chunk_size = chunk_size
+        self.buffer = bytearray()
+        self.closed = False
+        self.sent_headers = False
+
+        request = exchange.request
+        self.body = request.method != "HEAD" and status not in (204, 304) and status >= 200
+        self.chunked = self.body and "Content-Length" not in headers and request.version == "HTTP/1.1"
+        # Sans longueur ni chunked, la fin du corps est signalée par la fermeture de la connexion.
+        self.keep_alive = request.keep_alive and (not self.body or self.chunked or "Content-Length" in headers)
+
+    def write(self, b: bytes) -> int:
+        if self.body:
+            self.buffer += b
+
+            if len(self.buffer) >= self.chunk_size:
+                self._send()
+
+        return len(b)
+
+    def _head(self) -> bytes:
+        lines = [f"HTTP/1.1 {self.status} {_status_text(self.status)}"]
+        lines += [f"{key}: {value}" for key, value in self.headers.items()]
+
+        if self.chunked:
+            lines.append("Transfer-Encoding: chunked")
+
+        lines.append(f"Connection: {'keep-alive' if self.keep_alive else 'close'}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    def _send(self, last: bool = False):
+        data = bytes(self.buffer)
+        self.buffer = bytearray()
+
+        if self.chunked and data:
+            data = f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n"
+
+        if self.chunked and last:
+            data += b"0\r\n\r\n"
+
+        if not self.sent_headers:
+            data = self._head() + data
+            self.sent_headers = True
+
+        if data:
+            self.exchange.send(data)
+
+    def flush(self):
+        """ Envoie les écritures en attente """
+        if self.buffer:
+            self._send()
+
+    def close(self):
+        """ Ferme le flux de réponse """
+        if self.closed:
+            return
+
+        self.closed = True
+
+        if not self.exchange.cancelled.is_set():
+            self._send(last=True)
+
+class Server:
+    """ Serveur HTTP de l'application """
+    def __init__(self, app: App, host: str = "127.0.0.1", port: int = 8080, workers: Optional[ThreadPoolExecutor] = None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers or ThreadPoolExecutor(max_workers=4, thread_name_prefix="boic-app")
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    def _process(self, exchange: Exchange):
+        """ Traite la requête (fil du pool de travail) """
+        ctx = ServerRequestContext(exchange)
+
+        try:
+            self.app.process(ctx)
+
+        except RequestCancelled:
+            _logger.info(f"Requête annulée: {ctx.uri()}")
+
+        except Exception as e:
+            _logger.exception(e)
+
+            if exchange.response is None:
+                resp = ctx.response(status=500).set_header("Content-Type", "text/plain").build()
+                resp.write(f"Erreur: {e}".encode("utf8"))
+
+        finally:
+            if exchange.cancelled.is_set():
+                return
+
+            if exchange.response is None:
+                ctx.response(status=204).build()
+
+            try:
+                exchange.response.close()
+            except RequestCancelled:
+                pass
+
+    async def _error(self, writer: asyncio.StreamWriter, status: int, message: str):
+        body = message.encode("utf8")
+        head = f"HTTP/1.1 {status} {_status_text(status)}\r\nContent-Type: text/plain\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """ Traite les requêtes d'une connexion (keep-alive) """
+        loop = asyncio.get_running_loop()
+
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    return
+                except asyncio.LimitOverrunError:
+                    return await self._error(writer, 431, "En-têtes trop volumineux.")
+
+                try:
+                    request = ServerRequest.parse(head[:-4])
+                except ValueError as e:
+                    return await self._error(writer, 400, str(e))
+
+                if "chunked" in request.headers.get("transfer-encoding", "").lower():
+                    return await self._error(writer, 411, "Corps de requête chunked non supporté.")
+
+                # L'application ne lit pas le corps des requêtes : il est ignoré.
+                length = int(request.headers.get("content-length", "0") or 0)
+
+                if length:
+                    await reader.readexactly(length)
+
+                exchange = Exchange(loop, writer, request)
+
+                try:
+                    await loop.run_in_executor(self.workers, self._process, exchange)
+                except asyncio.CancelledError:
+                    exchange.cancelled.set()
+                    raise
+
+                if exchange.cancelled.is_set() or not exchange.response.keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError):
+            return
+        finally:
+            writer.close()
+
+    async def start(self) -> asyncio.AbstractServer:
+        self.server = await asyncio.start_server(self.handle, self.host, self.port, limit=MAX_HEADERS)
+        # Port effectif (port 0 : choisi par le système)
+        self.port = self.server.sockets[0].getsockname()[1]
+        _logger.info(f"Application servie sur http://{self.host}:{self.port}/")
+        return self.server
+
+    async def serve_forever(self):
+        server = await self.start()
+
+        async with server:
+            await server.serve_forever()
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(description="Serveur HTTP de l'application BOIC (sans navigateur)")
+
+    parser.add_argument(
+        "-j",
+        "--jewel",
+        dest="root",
+        help="La racine du dossier de l'inspection, par défaut la valeur est celle de la variable d'environnement JEWEL_PATH",
+        type=pathlib.Path,
+        metavar="JEWEL_PATH",
+        default=pathlib.Path(os.environ['JEWEL_PATH']) if 'JEWEL_PATH' in os.environ else None,
+    )
+
+    parser.add_argument("--host", dest="host", help="adresse d'écoute", default="127.0.0.1")
+    parser.add_argument("-p", "--port", dest="port", help="port d'écoute (0 : choisi par le système)", type=int, default=8080)
+    parser.add_argument("-w", "--workers", dest="workers", help="nombre de fils traitant les requêtes applicatives", type=int, default=4)
+    parser.add_argument("--no-watch", dest="watch", help="ne surveille pas les modifications du jewel", action="store_false")
+
+    parser.add_argument(
+        "-v",
+        "--verbose",
+        dest="loglevel",
+        help="set loglevel to INFO",
+        action="store_const",
+        const=logging.INFO,
+    )
+
+    parser.add_argument(
+        "-vv",
+        "--very-verbose",
+        dest="loglevel",
+        help="set loglevel to DEBUG",
+        action="store_const",
+        const=logging.DEBUG,
+    )
+
+    return parser.parse_args(args)
+
+def main(args):
+    args = parse_args(args)
+    logging.basicConfig(
+        level=args.loglevel or logging.WARNING, stream=sys.stdout, format="[%(asctime)s] %(levelname)s:%(name)s: %(message)s", datefmt="%d/%m/%Y %H:%M:%S"
+    )
+
+    jewel, watcher = (None, None)
+
+    if args.root:
+        from boic import jewel as J
+
+        jewel = J.open(args.root)
+
+        if args.watch:
+            from boic.watcher import Watcher
+
+            watcher = Watcher(jewel)
+            watcher.start()
+
+    workers = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="boic-app")
+    server = Server(App(jewel=jewel), host=args.host, port=args.port, workers=workers)
+
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if watcher:
+            watcher.stop()
+
+        workers.shutdown(wait=False, cancel_futures=True)
+
+def run():
+    """Calls :func:`main` passing the CLI arguments extracted from :obj:`sys.argv`
+
+    This function can be used as entry point to create console scripts with setuptools.
+    """
+    main(sys.argv[1:])
+
+if __name__ == "__main__":
+    run()
@@ -3,13 +3,20 @@ import argparse
 import logging
 import pathlib
 import sys
-import yaml
 import os
 
+from collections.abc import Iterator
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional
-from boic import __version__, jewel as J, shards, templates, sql, gun
-from prettytable import PrettyTable
+from typing import Optional, TextIO, TYPE_CHECKING
+from boic import jewel as J, output
+
+# Les modules lourds (sqlglot, docxtpl, jinja2, selenium, prettytable...) sont importés
+# par les commandes qui en ont besoin, pour que le démarrage de la CLI reste rapide
+# (cf. boic.tools.importtime).
+if TYPE_CHECKING:
+    from boic import shards
+    from boic.daemon import Client
 
 __author__ = "G. PABOIS"
 __copyright__ = "G. PABOIS"
@@ -19,6 +26,8 @@ _logger = logging.getLogger(__name__)
 _env_jewel_path = pathlib.Path(os.environ['JEWEL_PATH']) if 'JEWEL_PATH' in os.environ else None
 
 def read_aiot(jewel: J.Jewel, max_depth=None) -> Optional[shards.Shard]:
+    from boic import shards, sql
+
     nom = input("AIOT: ")
     if nom.startswith("jewel://"):
         aiot = shards.load(jewel.path(nom))
@@ -61,6 +70,8 @@ def read_query():
 
 # --- COMMANDS HANDLERS ---
 def new_aiot(jewel: J.Jewel, args):
+    from boic import shards, templates
+
     print("-- Créer un nouvel  AIOT --")
     
     nom = input("Nom de l'AIOT: ")
@@ -106,15 +117,73 @@ def new_aiot(jewel: J.Jewel, args):
         commune=commune
     )
 
+def import_aiots(jewel: J.Jewel, args):
+    import time
+    from boic import importer
+
+    start = time.perf_counter()
+    rows, created = importer.import_aiots(jewel, args.file, create_dirs=args.create_dirs, workers=args.workers)
+
+    for row in rows:
+        if row.error:
+            print(f"ECHEC ligne {row.line} ({row.nom or '?'}): {row.error}")
+
+    print(f"{len(created)} AIOT(s) créé(s) sur {len(rows)}, en {time.perf_counter() - start:.1f} s")
+
 def sync_aiot(jewel: J.Jewel, args):
-    """ Synchronise le Shard avec les données GUN """
-    aiot = read_aiot(jewel)
-    gun_id = aiot.gun
-    if gun_id is None:
-        raise ValueError("L'AIOT ne comporte pas d'identifiant interne GUN.")
-    gun.extract_situation_administrative(gun_id)
+    """ Synchronise les Shards des AIOTs avec les données GUN """
+    import time
+    from boic import gun
+    from boic.gun import sync
+
+    if args.all or args.query is not None:
+        aiots = sync.aiots(jewel, query=(args.query or read_query()) if args.query is not None else None, max_depth=args.max_depth)
+    else:
+        aiot = read_aiot(jewel)
+
+        if aiot is None:
+            return
+
+        gun_id = aiot["gun"] if "gun" in aiot else None
+
+        if not str(getattr(gun_id, "value", gun_id) or "").strip():
+            raise ValueError("L'AIOT ne comporte pas d'identifiant interne GUN.")
+
+        aiots = [(str(aiot["id"]), str(getattr(gun_id, "value", gun_id)).strip())]
+
+    config = jewel.config.gun
+    synchronizer = sync.Synchronizer(
+        jewel,
+        driver=gun.driver_class(args.driver or config.driver),
+        sessions=args.sessions or config.sessions,
+        rate=args.rate if args.rate is not None else config.rate,
+        retries=config.retries,
+        force=args.force,
+        url=args.url
+    )
+
+    print(f"{len(aiots)} AIOT(s) à synchroniser")
+    start = time.perf_counter()
+    failed = 0
+
+    results = []
+
+    for result in synchronizer.run(aiots):
+        results.append(result)
+
+        if not result.ok():
+            failed += 1
+            print(f"ECHEC {result.id} ({result.gun}) après {result.attempts} tentative(s): {result.error}")
+        elif not result.cached:
+            print(f"{result.id} ({result.gun}): {len(result.situation)} rubrique(s), {result.seconds:.1f} s")
+
+    cached = sum(1 for result in results if result.cached)
+    changed = sum(1 for result in results if result.changed)
+    print(f"{len(aiots) - failed} AIOT(s) synchronisé(s) dont {cached} depuis le cache, {changed} modifié(s), {failed} échec(s), en {time.perf_counter() - start:.1f} s")
 
 def new_inspection(jewel: J.Jewel, args):
+    from boic import shards, sql, templates
+
     print("-- Créer une nouvelle inspection --")
     nom = input("Nom de l'AIOT: ")
 
@@ -199,74 +268,199 @@ def new_inspection(jewel: J.Jewel, args):
 
     print(f"Dossier disponible ici: {chemin_dossier_affaire.canonicalize()}")
     
-def build_primary_index(jewel: J.Jewel, args):
-    _logger.info("Construit l'index primaire...")
-    shards.build_primary_index(jewel, max_depth=args.max_depth)
+def build_indexes(jewel: J.Jewel, args):
+    from boic import shards
+
+    _logger.info("Construit l'index primaire et les index secondaires...")
+    shards.build_indexes(jewel, max_depth=args.max_depth, incremental=args.incremental, deep=args.deep)
     _logger.info("Terminé !")
 
+def watch(jewel: J.Jewel, args):
+    from boic.watcher import Watcher
+
+    watcher = Watcher(jewel, debounce=args.debounce, interval=args.interval, polling=True if args.poll else None)
+    print(f"Surveillance du Jewel {jewel.root().canonicalize()} (Ctrl+C pour arrêter)...")
+
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stopped.set()
+
+def query_arg(args) -> str:
+    """ Requête de la commande : --query, sinon l'entrée standard (lue en entier si elle n'est pas un terminal) """
+    if args.query:
+        return args.query
+
+    if not sys.stdin.isatty():
+        return sys.stdin.read()
+
+    return read_query()
+
+@contextmanager
+def output_file(args) -> Iterator[TextIO]:
+    """ Fichier de sortie de la commande : --output, sinon la sortie standard """
+    if args.output is None:
+        yield sys.stdout
+        return
+
+    with args.output.open(mode="w", encoding="utf-8", newline="") as file:
+        yield file
+
+def write_rows(rows, args):
+    """ Ecrit les lignes (colonnes, valeurs) dans le format demandé (cf. boic.output) """
+    try:
+        with output_file(args) as file:
+            output.write(rows, args.format, file)
+    except BrokenPipeError:
+        # Lecteur fermé (ex: | head) : la sortie standard est détournée pour que sa fermeture n'échoue pas.
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
 def execute_query(jewel: J.Jewel, args):
-    query = read_query()
+    from boic import sql
+
+    query = query_arg(args)
 
     _logger.info("Execution de la requête...")
     cursor = sql.execute(jewel, query, max_depth=args.max_depth)
     
     # C'est un curseur qui itère sur des lignes. 
     if cursor.is_row_cursor():  
-        columns, rows = ([], [])
-
-        for i, cursor in enumerate(cursor):
-            if i == 0:
-                columns = cursor.keys()
-            
-            row = []
-            
-            for col in columns:
-                if col not in cursor:
-                    row.append("N/D")
-                else:
-                    row.append(str(cursor[col]))
-            
-            rows.append(row)
-
-        table = PrettyTable()
-        table.align = "l"
-        table.preserve_internal_border = True
-        table.field_names = columns
-        table.add_rows(rows)
-        print(table)
+        write_rows(sql.stream(cursor), args)
 
 def liste_aiots(jewel: J.Jewel, args):
+    from boic import shards
+
     for shard in shards.iter(jewel, max_depth=args.max_depth):
         print(repr(shard))
 
 def genere_modele_shard(jewel: J.Jewel, args):
+    from boic import templates
+
     name = args.name
     output = jewel.root().join(args.output)
     context = read_context_files(jewel, args.context_files)
     templates.new_shard_template(jewel, name, output)
 
 def genere_doc(jewel: J.Jewel, args):
-    shard_path = jewel.root().join(args.shard)
-    docx_path = shard_path.parent().join(f"{shard_path.stem}.docx")
-    print(f"Génère un document à partir du shard : {shard_path}, vers: {docx_path}")
-    shard = shards.load(shard_path)
-    templates.new_docx_template(jewel, shard['template'], docx_path, **shard)
+    import time
+    from boic import shards
+    from boic.templates import batch, build
+
+    manifest = build.DocumentManifest(jewel)
+
+    if args.all:
+        ids = list(shards.iter_ids(jewel, max_depth=args.max_depth))
+        manifest.forget(ids)
+    elif args.query is not None:
+        query = args.query or read_query()
+        ids = batch.query_ids(jewel, query, max_depth=args.max_depth)
+    elif args.shard:
+        shard_path = jewel.root().join(args.shard)
+        print(f"Génère un document à partir du shard : {shard_path}, vers: {batch.document_path(shard_path)}")
+        ids = ["/".join(shard_path.segments)]
+    else:
+        raise ValueError("Un Shard, une requête (--query) ou --all est attendu.")
+
+    start = time.perf_counter()
+    outdated = manifest.outdated(ids, force=args.force, plain=args.all)
+    print(f"{len(outdated)} document(s) à générer, {len(ids) - len(outdated)} Shard(s) à jour ou sans modèle")
+    failed = 0
+
+    try:
+        for result in batch.render_documents(jewel, outdated, workers=args.workers):
+            manifest.record(result)
+
+            if result.ok():
+                print(f"{result.output} ({result.template}, {result.seconds * 1000:.0f} ms)")
+            else:
+                failed += 1
+                print(f"ECHEC {result.id}: {result.error}")
+    finally:
+        manifest.flush()
+
+    print(f"{len(outdated) - failed} document(s) généré(s), {failed} échec(s), en {time.perf_counter() - start:.1f} s")
+
+def daemon(jewel: J.Jewel, args):
+    from boic import daemon as D
+
+    if args.stop:
+        client = D.connect(args.root)
+
+        if client is None:
+            print("Aucun démon n'est démarré pour ce Jewel.")
+            return
+
+        for message in client.request("stop"):
+            print(message["line"])
+        return
+
+    server = D.Daemon(jewel, watch=not args.no_watch)
+    print(f"Démon du Jewel {jewel.root().canonicalize()} à l'écoute sur {server.path} (Ctrl+C pour arrêter)...")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+# --- COMMANDS HANDLERS (via le démon) ---
+def remote_execute_query(client: Client, args):
+    query = query_arg(args)
+
+    def rows():
+        columns = []
+
+        for message in client.request("query", query=query, max_depth=args.max_depth):
+            if "columns" in message:
+                columns = message["columns"]
+            else:
+                yield (columns, [message["row"].get(col, output.MISSING) for col in columns])
+
+    write_rows(rows(), args)
+
+def remote_print(op: str):
+    def handler(client: Client, args):
+        kwargs = {key: getattr(args, key) for key in ("max_depth", "incremental", "deep") if hasattr(args, key)}
+
+        for message in client.request(op, **kwargs):
+            print(message["line"])
+
+    return handler
 
 _commands = {
     'nouveau:inspection': new_inspection,
     'nouveau:aiot': new_aiot,
+    'import:aiots': import_aiots,
     'sync:aiot': sync_aiot,
     'genere:modele:shard': genere_modele_shard,
     'genere:doc': genere_doc,
     'liste:aiots': liste_aiots,
     'execute': execute_query,
-    'build:index': build_primary_index
+    'build:index': build_indexes,
+    'watch': watch,
+    'daemon': daemon
+}
+
+# Commandes servies par le démon lorsqu'il est démarré.
+_remote_commands = {
+    'execute': remote_execute_query,
+    'liste:aiots': remote_print("shards"),
+    'build:index': remote_print("build")
 }
 
 # ---- CLI ----
 # The functions defined in this section are wrappers around the main Python
 # API allowing them to be called directly from the terminal as a CLI
 # executable/script.
+class _VersionAction(argparse.Action):
+    """ Affiche la version, résolue à la demande (cf. boic.__getattr__) """
+    def __init__(self, option_strings, dest=argparse.SUPPRESS, default=argparse.SUPPRESS, help="show program's version number and exit"):
+        super().__init__(option_strings=option_strings, dest=dest, default=default, nargs=0, help=help)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        import boic
+
+        parser.exit(message=f"boic {boic.__version__}\n")
+
 def parse_args(args):
     """Parse command line parameters
 
@@ -280,15 +474,23 @@ def parse_args(args):
     parser = argparse.ArgumentParser(description="CLI pour la Boîte à Outils de l'inspection des Installations Classées (BOIC)")
     parser.add_argument(
         "--version",
-        action="version",
-        version=f"boic {__version__}",
+        action=_VersionAction,
     )
 
 
     parser.add_argument("-j", "--jewel", dest="root", help="La racine du dossier de l'inspection, par défaut la valeur est celle de la variable d'environnement JEWEL_PATH", type=pathlib.Path, metavar="JEWEL_PATH", default=_env_jewel_path)
+    parser.add_argument("--no-daemon", dest="no_daemon", action="store_true", help="N'utilise pas le démon du jewel, même s'il est démarré")
     subparsers = parser.add_subparsers(dest="cmd", help='la commande à exécuter', required=True)
 
     parser_sync_aiot = subparsers.add_parser('sync:aiot', help='Synchronise l\'AIOT à partir des données GUN')
+    parser_sync_aiot.add_argument('-a', '--all', dest="all", action="store_true", help="Synchronise tous les AIOTs ayant un identifiant GUN.")
+    parser_sync_aiot.add_argument('-q', '--query', dest="query", nargs="?", const="", help="Synchronise les AIOTs retournés par la requête ShQL (colonnes id et gun).")
+    parser_sync_aiot.add_argument('-s', '--sessions', dest="sessions", type=int, help="Nombre de sessions (navigateurs) simultanées, par défaut gun.sessions.")
+    parser_sync_aiot.add_argument('-f', '--force', dest="force", action="store_true", help="Ré-extrait les situations, même extraites depuis moins de gun.ttl secondes.")
+    parser_sync_aiot.add_argument('--rate', dest="rate", type=float, help="Nombre maximal de requêtes par seconde vers le GUN, par défaut gun.rate.")
+    parser_sync_aiot.add_argument('--driver', dest="driver", help="Pilote d'extraction (auto, http, selenium, ou module:Classe), par défaut gun.driver.")
+    parser_sync_aiot.add_argument('--url', dest="url", help="Adresse du GUN, par défaut gun.url (ex: serveur factice, python -m boic.gun.fake).")
+    parser_sync_aiot.add_argument('-d', '--depth', dest="max_depth", type=int, help="Profondeur maximal pour rechercher les AIOTs.")
 
     parser_new_inspection = subparsers.add_parser('nouveau:inspection', help='Ajoute une nouvelle inspection')
     parser_new_inspection.add_argument('-d', '--depth', dest="max_depth", type=int, help="Profondeur maximal pour aller chercher les AIOTS.")
@@ -296,11 +498,30 @@ def parse_args(args):
     parser_new_inspection = subparsers.add_parser('nouveau:aiot', help='Ajoute un nouvel aiot')
     parser_new_inspection.add_argument('-d', '--depth', dest="max_depth", type=int, help="Profondeur maximal pour aller chercher les AIOTS.")
 
-    parser_build_index = subparsers.add_parser('build:index', help='Construit l\'index primaire des shards du jewel')
+    parser_import_aiots = subparsers.add_parser('import:aiots', help='Importe des AIOTs à partir d\'un fichier CSV ou JSON')
+    parser_import_aiots.add_argument(dest="file", type=pathlib.Path, help="Fichier CSV ou JSON (colonnes : nom, chemin, commune, inspecteur, numero.aiot, numero.dossier, numero.gup...)")
+    parser_import_aiots.add_argument('--dossiers', dest="create_dirs", action="store_true", help="Crée la structure des dossiers de chaque AIOT.")
+    parser_import_aiots.add_argument('-w', '--workers', dest="workers", type=int, default=8, help="Nombre de fils créant les dossiers et les Fiches.")
+
+    parser_build_index = subparsers.add_parser('build:index', help='Construit l\'index primaire et les index secondaires des shards du jewel')
     parser_build_index.add_argument('-d', '--depth', dest="max_depth", type=int, help="Profondeur maximal pour indexer.")
+    parser_build_index.add_argument('-i', '--incremental', dest="incremental", action="store_true", help="Ne ré-indexe que les Shards modifiés depuis la dernière construction.")
+    parser_build_index.add_argument('--deep', dest="deep", action="store_true", help="Re-vérifie chaque répertoire (modifications faites en dehors de la BOIC).")
+
+    parser_watch = subparsers.add_parser('watch', help='Surveille le jewel et maintient les index à jour')
+    parser_watch.add_argument('--debounce', dest="debounce", type=float, default=0.5, help="Délai de regroupement des modifications, en secondes.")
+    parser_watch.add_argument('--interval', dest="interval", type=float, default=2.0, help="Période de scrutation si inotify n'est pas disponible, en secondes.")
+    parser_watch.add_argument('--poll', dest="poll", action="store_true", help="Force la scrutation périodique.")
+
+    parser_daemon = subparsers.add_parser('daemon', help='Démarre le démon du jewel (index et caches gardés en mémoire)')
+    parser_daemon.add_argument('--stop', dest="stop", action="store_true", help="Arrête le démon démarré.")
+    parser_daemon.add_argument('--no-watch', dest="no_watch", action="store_true", help="Ne surveille pas le jewel.")
 
     parser_execute = subparsers.add_parser('execute', help='Execute une requête SQL')
     parser_execute.add_argument('-d', '--depth', dest="max_depth", type=int, help="Profondeur maximal pour executer la requête.")
+    parser_execute.add_argument('-q', '--query', dest="query", help="Requête ShQL (par défaut, lue sur l'entrée standard).")
+    parser_execute.add_argument('-f', '--format', dest="format", choices=output.FORMATS, default="table", help="Format de sortie : csv, tsv et jsonl sont écrits ligne à ligne (par défaut, table).")
+    parser_execute.add_argument('-o', '--output', dest="output", type=pathlib.Path, help="Fichier de sortie (par défaut, la sortie standard).")
 
     parser_liste_aiots = subparsers.add_parser('liste:aiots', help='Liste les AIOTS')
     parser_liste_aiots.add_argument('-d', '--depth', dest="max_depth", type=int, help="Profondeur maximal pour rechercher les AIOTS")
@@ -311,7 +532,12 @@ def parse_args(args):
     parser_genere_modele_shard.add_argument('-f', '--files', nargs='*', dest="context_files", help="Chemin vers des fichiers définissant des variables du modèle")
 
     parser_genere_modele_docx = subparsers.add_parser('genere:doc', help='Génère un document Word à partir d\'un modèle et d\'un shard (paramètre template)')
-    parser_genere_modele_docx.add_argument(dest="shard", help="Lien vers le Shard")
+    parser_genere_modele_docx.add_argument(dest="shard", nargs="?", help="Lien vers le Shard")
+    parser_genere_modele_docx.add_argument('-a', '--all', dest="all", action="store_true", help="Génère les documents de tous les Shards ayant un modèle (paramètre template), s'ils ne sont pas à jour.")
+    parser_genere_modele_docx.add_argument('-f', '--force', dest="force", action="store_true", help="Régénère les documents, même s'ils sont à jour.")
+    parser_genere_modele_docx.add_argument('-q', '--query', dest="query", nargs="?", const="", help="Génère les documents des Shards retournés par la requête ShQL (lue sur l'entrée standard si elle est omise).")
+    parser_genere_modele_docx.add_argument('-w', '--workers', dest="workers", type=int, help="Nombre de processus générant les documents (par défaut, le nombre de processeurs).")
+    parser_genere_modele_docx.add_argument('-d', '--depth', dest="max_depth", type=int, help="Profondeur maximal pour executer la requête.")
 
     parser.add_argument(
         "-v",
@@ -356,6 +582,15 @@ def main(args):
     args = parse_args(args)
     setup_logging(args.loglevel)
 
+    if args.cmd in _remote_commands and not args.no_daemon:
+        from boic import daemon as D
+        client = D.connect(args.root)
+
+        if client is not None:
+            _logger.info("Commande servie par le démon.")
+            _remote_commands[args.cmd](client, args)
+            return
+
     jewel = J.open(args.root)
     _commands[args.cmd](jewel, args)
 
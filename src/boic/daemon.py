@@ -0,0 +1,220 @@
+""" Démon résident de la BOIC
+
+Un démon par racine de Jewel garde en mémoire le Jewel, les Shards chargés, les plans
+d'exécution et les index, et sert les requêtes de la CLI sur un socket Unix. Les index
+sont maintenus à jour par le watcher (cf. boic.watcher).
+
+Protocole : une requête JSON par connexion ({"op": ..., "args": {...}}, terminée par un
+retour à la ligne), le démon répond par une suite de messages JSON (un par ligne) :
+- {"columns": [...]} puis {"row": {colonne: valeur}}... pour une requête (les colonnes
+  absentes de la ligne sont omises) ;
+- {"line": "..."} pour une sortie textuelle ;
+- {"error": "..."} en cas d'erreur ;
+- {"end": true} pour terminer la réponse.
+"""
+from __future__ import annotations
+from typing import Optional, TYPE_CHECKING
+from collections.abc import Iterator
+import hashlib
+import itertools
+import json
+import logging
+import os
+import pathlib
+import socket
+import socketserver
+import tempfile
+import threading
+
+if TYPE_CHECKING:
+    from boic.jewel import Jewel
+
+_logger = logging.getLogger(__name__)
+
+def socket_path(root: pathlib.Path) -> str:
+    """ Chemin du socket du démon associé à la racine du Jewel """
+    root = os.fspath(pathlib.Path(root).resolve())
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    digest = hashlib.sha1(root.encode("utf8")).hexdigest()[:16]
+    return os.path.join(directory, f"boic-{os.getuid() if hasattr(os, 'getuid') else 0}-{digest}.sock")
+
+class Client:
+    """ Client du démon """
+    def __init__(self, path: str, timeout: Optional[float] = None):
+        self.path = path
+        self.timeout = timeout
+
+    def request(self, op: str, **args) -> Iterator[dict]:
+        """ Envoie la requête, et itère sur les messages de la réponse """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            sock.sendall(json.dumps({"op": op, "args": args}).encode("utf8") + b"\n")
+
+            with sock.makefile(mode="r", encoding="utf8") as stream:
+                for line in stream:
+                    message = json.loads(line)
+
+                    if "error" in message:
+                        raise ValueError(message["error"])
+
+                    if message.get("end"):
+                        return
+
+                    yield message
+
+        raise ConnectionError("Le démon a interrompu la réponse.")
+
+    def ping(self) -> bool:
+        try:
+            return all(True for _ in self.request("ping"))
+        except OSError:
+            return False
+
+def connect(root: Optional[pathlib.Path]) -> Optional[Client]:
+    """ Retourne un client vers le démon du Jewel s'il est démarré """
+    if root is None or not hasattr(socket, "AF_UNIX"):
+        return None
+
+    path = socket_path(root)
+
+    if not os.path.exists(path):
+        return None
+
+    client = Client(path, timeout=1.0)
+
+    if not client.ping():
+        return None
+
+    client.timeout = None
+    return client
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon: Daemon = self.server.daemon
+
+        try:
+            request = json.loads(self.rfile.readline())
+            handler = daemon.handlers.get(request.get("op"))
+
+            if handler is None:
+                raise ValueError(f"Opération {request.get('op')} inconnue.")
+
+            for message in handler(**request.get("args", {})):
+                self._send(message)
+
+            self._send({"end": True})
+
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+        except Exception as e:
+            _logger.exception(e)
+            self._send({"error": f"{type(e).__name__}: {e}"})
+
+    def _send(self, message: dict):
+        self.wfile.write(json.dumps(message, default=str).encode("utf8") + b"\n")
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class Daemon:
+    """ Démon résident d'un Jewel """
+    def __init__(self, jewel: Jewel, path: Optional[str] = None, watch: bool = True):
+        self.jewel = jewel
+        self.path = path or socket_path(jewel.root().canonicalize())
+        # Les requêtes et la mise à jour des index (watcher) sont sérialisées.
+        self.lock = threading.RLock()
+        self.watcher = None
+        self.server: Optional[_Server] = None
+
+        if watch:
+            from boic.watcher import Watcher
+            self.watcher = Watcher(jewel, lock=self.lock)
+
+        self.handlers = {
+            "ping": self.ping,
+            "query": self.query,
+            "shards": self.shards,
+            "build": self.build,
+            "stop": self.stop
+        }
+
+    def ping(self) -> Iterator[dict]:
+        yield {"line": "pong"}
+
+    def query(self, query: str, max_depth: Optional[int] = None) -> Iterator[dict]:
+        """ Exécute la requête, et envoie les lignes au fil de leur lecture.
+
+            Le verrou n'est tenu que pendant l'exécution du plan (les recherches dans les index y 
+            sont résolues) : la lecture des Shards et l'envoi des lignes ne bloquent ni les autres 
+            clients, ni le watcher.
+        """
+        from boic import output, sql
+
+        with self.lock:
+            cursor = sql.execute(self.jewel, query, max_depth=max_depth)
+
+        if not cursor.is_row_cursor():
+            return
+
+        stream = sql.stream(cursor)
+        first = next(stream, None)
+
+        yield {"columns": first[0] if first else []}
+
+        if first is None:
+            return
+
+        for _, values in itertools.chain((first,), stream):
+            yield {"row": {col: output.plain(value) for col, value in zip(first[0], values) if value is not output.MISSING}}
+
+    def shards(self, max_depth: Optional[int] = None) -> Iterator[dict]:
+        from boic import shards
+
+        with self.lock:
+            lines = [repr(shard) for shard in shards.iter(self.jewel, max_depth=max_depth)]
+
+        for line in lines:
+            yield {"line": line}
+
+    def build(self, max_depth: Optional[int] = None, incremental: bool = False, deep: bool = False) -> Iterator[dict]:
+        from boic import shards
+
+        with self.lock:
+            shards.build_indexes(self.jewel, max_depth=max_depth, incremental=incremental, deep=deep)
+
+        yield {"line": "Index construits."}
+
+    def stop(self) -> Iterator[dict]:
+        yield {"line": "Arrêt du démon."}
+        threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def serve_forever(self):
+        """ Sert les requêtes jusqu'à l'arrêt (bloquant) """
+        if os.path.exists(self.path):
+            if Client(self.path, timeout=1.0).ping():
+                raise ValueError(f"Un démon est déjà démarré pour ce Jewel ({self.path}).")
+
+            # Socket orphelin d'un démon interrompu.
+            os.unlink(self.path)
+
+        self.server = _Server(self.path, _Handler)
+        self.server.daemon = self
+        os.chmod(self.path, 0o600)
+
+        if self.watcher:
+            self.watcher.start()
+
+        _logger.info(f"Démon à l'écoute sur {self.path}")
+
+        try:
+            self.server.serve_forever()
+        finally:
+            if self.watcher:
+                self.watcher.stop()
+
+            self.server.server_close()
+
+            if os.path.exists(self.path):
+                os.unlink(self.path)
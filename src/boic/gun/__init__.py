@@ -1,7 +1,285 @@
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.wait import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+""" Extraction des données du GUN (situation administrative des AIOTs)
 
-def extract_situation_administrative(gun_id: str):
-    return None
+La page de la situation administrative d'un AIOT (gun.url + gun.page, où {gun} est
+l'identifiant interne GUN) porte un tableau (gun.table) dont chaque ligne est une rubrique :
+les en-têtes du tableau sont les clés, les cellules les valeurs.
+
+L'extraction passe par un pilote (Driver), une session ouverte une fois et réutilisée
+d'un AIOT à l'autre :
+- http : client HTTP léger (connexion persistante), la page est analysée sans navigateur ;
+- selenium : navigateur, pour les pages qui ont besoin de JavaScript (plusieurs secondes
+  au démarrage, et plusieurs centaines de Mo) ;
+- auto (par défaut) : client HTTP, puis navigateur (ouvert au premier besoin) si le tableau
+  n'est pas dans la page servie (JavaScript, redirection vers l'authentification) ;
+- tout autre pilote donné par "module:Classe".
+
+Quel que soit le pilote, la page est analysée par parse_situation (cf. boic.tools.gunbench
+pour comparer les pilotes contre le serveur factice boic.gun.fake).
+"""
+from __future__ import annotations
+from typing import Optional, TYPE_CHECKING
+from html.parser import HTMLParser
+from urllib.parse import quote, urlsplit
+import gzip
+import importlib
+import logging
+
+if TYPE_CHECKING:
+    from boic.jewel import JewelConfig
+
+_logger = logging.getLogger(__name__)
+
+class ExtractionError(Exception):
+    """ Echec de l'extraction ; *retry* indique une erreur passagère (délai, indisponibilité) """
+    def __init__(self, message: str, retry: bool = False):
+        super().__init__(message)
+        self.retry = retry
+
+class JavaScriptRequired(ExtractionError):
+    """ La page servie ne porte pas le tableau : elle doit être rendue par un navigateur """
+
+class _TableParser(HTMLParser):
+    """ Lit les lignes du tableau dont l'identifiant est donné """
+    def __init__(self, table_id: str):
+        super().__init__(convert_charrefs=True)
+        self.table_id = table_id
+        # Profondeur des tableaux imbriqués dans le tableau recherché (0 : hors du tableau)
+        self.depth = 0
+        self.found = False
+        self.headers: list[str] = []
+        self.rows: list[list[str]] = []
+        self.row: Optional[list[str]] = None
+        self.cell: Optional[list[str]] = None
+        self.header = False
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]):
+        if tag == "table":
+            if self.depth:
+                self.depth += 1
+            elif dict(attrs).get("id") == self.table_id:
+                self.depth, self.found = (1, True)
+
+        elif self.depth == 1 and tag == "tr":
+            self.row = []
+
+        elif self.depth == 1 and tag in ("td", "th") and self.row is not None:
+            self.cell, self.header = ([], tag == "th")
+
+    def handle_endtag(self, tag: str):
+        if tag == "table" and self.depth:
+            self.depth -= 1
+
+        elif self.depth == 1 and tag in ("td", "th") and self.cell is not None:
+            self.row.append(" ".join("".join(self.cell).split()))
+            self.cell = None
+
+        elif self.depth == 1 and tag == "tr" and self.row is not None:
+            if self.header and not self.headers:
+                self.headers = self.row
+            elif self.row:
+                self.rows.append(self.row)
+
+            self.row = None
+
+    def handle_data(self, data: str):
+        if self.cell is not None:
+            self.cell.append(data)
+
+def parse_situation(html: str, table_id: str = "situation-administrative") -> list[dict[str, str]]:
+    """ Rubriques de la situation administrative (une par ligne du tableau) """
+    parser = _TableParser(table_id)
+    parser.feed(html)
+    parser.close()
+
+    if not parser.found:
+        raise JavaScriptRequired(f"Tableau #{table_id} introuvable dans la page.")
+
+    return [dict(zip(parser.headers, row)) for row in parser.rows]
+
+class Driver:
+    """ Session d'extraction des pages du GUN, réutilisée d'un AIOT à l'autre """
+    def __init__(self, url: str, page: str = "/aiot/{gun}/situation-administrative", table: str = "situation-administrative", timeout: float = 30.0):
+        if not url:
+            raise ValueError("L'adresse du GUN n'est pas configurée (gun.url dans jewel.yml).")
+
+        self.url = url.rstrip("/")
+        self.page = page
+        self.table = table
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, config: JewelConfig, **overrides) -> Driver:
+        values = {key: config[key] for key in ("url", "page", "table", "timeout")}
+        values.update({key: value for key, value in overrides.items() if value is not None})
+        return cls(**values)
+
+    def page_url(self, gun_id: str) -> str:
+        return self.url + self.page.format(gun=quote(str(gun_id), safe=""))
+
+    def extract(self, gun_id: str) -> list[dict[str, str]]:
+        """ Extrait la situation administrative de l'AIOT """
+        return parse_situation(self.fetch(self.page_url(gun_id)), self.table)
+
+    def fetch(self, url: str) -> str:
+        """ Retourne le HTML de la page """
+        raise NotImplementedError("Le pilote doit implémenter fetch.")
+
+    def close(self):
+        pass
+
+class SeleniumDriver(Driver):
+    """ Navigateur (Firefox sans interface), pour les pages qui ont besoin de JavaScript """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        from selenium import webdriver
+
+        options = webdriver.FirefoxOptions()
+        options.add_argument("-headless")
+        self.browser = webdriver.Firefox(options=options)
+        self.browser.set_page_load_timeout(self.timeout)
+
+    def fetch(self, url: str) -> str:
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.wait import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+
+        try:
+            self.browser.get(url)
+            WebDriverWait(self.browser, self.timeout).until(EC.presence_of_element_located((By.ID, self.table)))
+            return self.browser.page_source
+        except TimeoutException as e:
+            raise ExtractionError(f"Délai dépassé pour {url}", retry=True) from e
+        except WebDriverException as e:
+            raise ExtractionError(f"Erreur du navigateur pour {url}: {e.msg}", retry=True) from e
+
+    def close(self):
+        self.browser.quit()
+
+class HttpDriver(Driver):
+    """ Client HTTP léger : une connexion persistante (keep-alive) par session """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.connection = None
+
+    def connect(self):
+        from http.client import HTTPConnection, HTTPSConnection
+
+        parts = urlsplit(self.url)
+        cls = HTTPSConnection if parts.scheme == "https" else HTTPConnection
+        return cls(parts.hostname, parts.port, timeout=self.timeout)
+
+    def fetch(self, url: str) -> str:
+        from http.client import HTTPException, RemoteDisconnected
+
+        parts = urlsplit(url)
+        target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        headers = {"Accept": "text/html", "Accept-Encoding": "gzip", "User-Agent": "boic"}
+
+        # Une connexion persistante peut avoir été fermée par le serveur : une nouvelle est ouverte.
+        for reconnect in (False, True):
+            if self.connection is None:
+                self.connection = self.connect()
+
+            try:
+                self.connection.request("GET", target, headers=headers)
+                response = self.connection.getresponse()
+                body = response.read()
+                break
+            except (RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                self.close()
+
+                if reconnect:
+                    raise ExtractionError(f"{url}: {e}", retry=True) from e
+            except (OSError, HTTPException) as e:
+                self.close()
+                raise ExtractionError(f"{url}: {e}", retry=True) from e
+
+        if response.will_close:
+            self.close()
+
+        if 300 <= response.status < 400:
+            # Ex: redirection vers la page d'authentification
+            raise JavaScriptRequired(f"{url}: redirection vers {response.getheader('Location')}")
+
+        if response.status >= 400:
+            raise ExtractionError(f"{url}: HTTP {response.status}", retry=response.status == 429 or response.status >= 500)
+
+        if response.getheader("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+
+        return body.decode(response.headers.get_content_charset() or "utf-8")
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+class AutoDriver(Driver):
+    """ Client HTTP léger, et navigateur (ouvert au premier besoin) pour les pages qui ont besoin de JavaScript """
+    # Au-delà de ce nombre de pages consécutives rendues par le navigateur, le client HTTP 
+    # n'est plus essayé que pour une page sur PROBE.
+    STICKY = 5
+    PROBE = 10
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.options = (args, kwargs)
+        self.http = HttpDriver(*args, **kwargs)
+        self.browser: Optional[SeleniumDriver] = None
+        self.fallbacks = 0
+        self.skipped = 0
+
+    def extract(self, gun_id: str) -> list[dict[str, str]]:
+        if self.fallbacks >= self.STICKY and self.skipped < self.PROBE - 1:
+            self.skipped += 1
+        else:
+            self.skipped = 0
+
+            try:
+                situation = self.http.extract(gun_id)
+                self.fallbacks = 0
+                return situation
+            except JavaScriptRequired as e:
+                _logger.debug(f"{gun_id}: {e}, rendu par le navigateur")
+                self.fallbacks += 1
+
+        if self.browser is None:
+            args, kwargs = self.options
+            self.browser = SeleniumDriver(*args, **kwargs)
+
+        return self.browser.extract(gun_id)
+
+    def close(self):
+        self.http.close()
+
+        if self.browser is not None:
+            self.browser.close()
+
+# Pilotes disponibles, par nom (cf. driver_class)
+DRIVERS: dict[str, type[Driver]] = {
+    "auto": AutoDriver,
+    "http": HttpDriver,
+    "selenium": SeleniumDriver
+}
+
+def driver_class(name: str) -> type[Driver]:
+    """ Classe du pilote : nom (auto, http, selenium) ou "module:Classe" """
+    if name in DRIVERS:
+        return DRIVERS[name]
+
+    module, sep, attr = name.partition(":")
+
+    if not sep:
+        raise ValueError(f"Pilote GUN inconnu : {name} (disponibles : {', '.join(DRIVERS)}, ou module:Classe)")
+
+    return getattr(importlib.import_module(module), attr)
+
+def extract_situation_administrative(gun_id: str, config: JewelConfig, driver: Optional[str] = None) -> list[dict[str, str]]:
+    """ Extrait la situation administrative d'un AIOT (une session ouverte pour l'occasion) """
+    session = driver_class(driver or config.driver).from_config(config)
+
+    try:
+        return session.extract(gun_id)
+    finally:
+        session.close()
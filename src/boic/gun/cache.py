@@ -0,0 +1,156 @@
+""" Cache des situations administratives extraites du GUN (répertoire des index)
+
+Chaque entrée, par identifiant GUN, garde la situation extraite, l'instant de l'extraction et
+l'empreinte (sha256) de la situation. Une entrée est fraîche pendant gun.ttl secondes :
+sync:aiot ne ré-extrait pas un AIOT dont l'entrée est fraîche (sauf --force). Une situation
+identique à celle du Shard n'y est pas réécrite : ni le mtime du Shard, ni les index ne changent.
+
+Les vues de l'application affichent le Shard immédiatement ; si son entrée est périmée, elle
+est revalidée en arrière-plan (stale-while-revalidate, cf. Revalidator), et la page suivante
+montre la situation à jour.
+"""
+from __future__ import annotations
+from typing import Optional, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+if TYPE_CHECKING:
+    from boic.jewel import Jewel, JewelPath
+
+_logger = logging.getLogger(__name__)
+
+def digest(situation: list[dict[str, str]]) -> str:
+    """ Empreinte de la situation administrative """
+    return hashlib.sha256(json.dumps(situation, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+class CacheEntry:
+    """ Situation administrative extraite """
+    def __init__(self, situation: list[dict[str, str]], fetched: float, hash: Optional[str] = None):
+        self.situation = situation
+        # Instant de l'extraction (secondes depuis l'époque)
+        self.fetched = fetched
+        self.hash = hash or digest(situation)
+
+    def age(self) -> float:
+        return time.time() - self.fetched
+
+class SituationCache:
+    """ Situations administratives extraites, par identifiant GUN, persistées dans le répertoire des index """
+    def __init__(self, jewel: Jewel, ttl: Optional[float] = None):
+        self.jewel = jewel
+        self.ttl = float(jewel.config.gun.ttl if ttl is None else ttl)
+        self.entries: Optional[dict[str, CacheEntry]] = None
+        self.dirty = False
+        self.lock = threading.RLock()
+
+    def location(self) -> JewelPath:
+        return self.jewel.path(self.jewel.config.indexes.dir, "gun.json")
+
+    def load(self) -> dict[str, CacheEntry]:
+        with self.lock:
+            if self.entries is None:
+                self.entries = {}
+
+                if self.location().exists():
+                    with self.location().open(mode="r") as file:
+                        for gun_id, entry in json.load(file).items():
+                            self.entries[gun_id] = CacheEntry(entry["situation"], entry["fetched"], entry["hash"])
+
+            return self.entries
+
+    def get(self, gun_id: str) -> Optional[CacheEntry]:
+        with self.lock:
+            return self.load().get(gun_id)
+
+    def fresh(self, entry: Optional[CacheEntry]) -> bool:
+        return entry is not None and entry.age() < self.ttl
+
+    def put(self, gun_id: str, situation: list[dict[str, str]]) -> CacheEntry:
+        entry = CacheEntry(situation, fetched=time.time())
+
+        with self.lock:
+            self.load()[gun_id] = entry
+            self.dirty = True
+
+        return entry
+
+    def flush(self):
+        """ Ecrit le cache (fichier temporaire, puis renommage), s'il a été modifié """
+        with self.lock:
+            if not self.dirty:
+                return
+
+            values = {gun_id: {"situation": entry.situation, "fetched": entry.fetched, "hash": entry.hash} for gun_id, entry in self.entries.items()}
+            self.dirty = False
+
+        target = self.location().canonicalize()
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+        try:
+            with open(tmp, mode="w", encoding="utf-8") as file:
+                json.dump(values, file, ensure_ascii=False)
+
+            os.replace(tmp, target)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+def cache(jewel: Jewel) -> SituationCache:
+    """ Retourne le cache des situations administratives du Jewel """
+    if jewel.gun_cache is None:
+        jewel.gun_cache = SituationCache(jewel)
+
+    return jewel.gun_cache
+
+class Revalidator:
+    """ Revalide en arrière-plan les situations périmées (stale-while-revalidate) """
+    def __init__(self, jewel: Jewel):
+        self.jewel = jewel
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="boic-gun")
+        # AIOTs dont la revalidation est planifiée
+        self.pending: set[str] = set()
+        self.lock = threading.Lock()
+
+    def situation(self, id: str, gun_id: str) -> Optional[CacheEntry]:
+        """ Retourne l'entrée en cache (même périmée), et planifie sa revalidation si elle est périmée """
+        situations = cache(self.jewel)
+        entry = situations.get(gun_id)
+
+        if situations.fresh(entry) or not self.jewel.config.gun.url:
+            return entry
+
+        with self.lock:
+            if gun_id in self.pending:
+                return entry
+
+            self.pending.add(gun_id)
+
+        self.executor.submit(self._revalidate, id, gun_id)
+        return entry
+
+    def _revalidate(self, id: str, gun_id: str):
+        from boic import gun
+        from .sync import Synchronizer
+
+        config = self.jewel.config.gun
+
+        try:
+            synchronizer = Synchronizer(self.jewel, driver=gun.driver_class(config.driver), sessions=1, rate=config.rate, retries=config.retries)
+
+            for result in synchronizer.run([(id, gun_id)]):
+                if not result.ok():
+                    _logger.warning(f"Revalidation de la situation de {id} ({gun_id}): {result.error}")
+        except Exception:
+            _logger.exception(f"Echec de la revalidation de la situation de {id} ({gun_id})")
+        finally:
+            with self.lock:
+                self.pending.discard(gun_id)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
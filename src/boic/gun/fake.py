@@ -0,0 +1,183 @@
+""" Serveur GUN factice, pour tester la synchronisation sans accès au GUN
+
+Usage : python -m boic.gun.fake [--port 8800] [--latency 0.05] [--failure-rate 0.1] [--javascript-rate 0.1] [--fixtures DIR]
+
+Sert la page de la situation administrative de tout AIOT (/aiot/{gun}/situation-administrative) :
+la page enregistrée DIR/{gun}.html si elle existe, sinon une page générée (les rubriques sont
+déterminées par l'identifiant GUN). Une page absente des enregistrements donne une 404 si
+les pages ne sont pas générées (--fixtures-only).
+
+Pour synchroniser un Jewel contre ce serveur :
+    python -m boic.cli -j JEWEL sync:aiot --all --driver http --url http://127.0.0.1:8800
+
+Les erreurs passagères (503) sont injectées avec la probabilité --failure-rate, et chaque
+réponse est retardée de --latency secondes. Une part des AIOTs (--javascript-rate, toujours
+les mêmes) n'a qu'une page rendue par JavaScript : le tableau n'est pas dans le HTML servi.
+"""
+from __future__ import annotations
+from typing import Optional
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from html import escape
+from urllib.parse import unquote
+import argparse
+import hashlib
+import json
+import pathlib
+import random
+import re
+import threading
+import time
+
+_PAGE = re.compile(r"^/aiot/(?P<gun>[^/]+)/situation-administrative/?$")
+
+COLUMNS = ["Rubrique", "Alinéa", "Régime", "Libellé", "Volume"]
+
+_ACTIVITES = [
+    ("1510", "2", "E", "Entrepôts couverts", "{n} 000 m3"),
+    ("2910", "A", "DC", "Combustion", "{n} MW"),
+    ("4331", "2", "E", "Liquides inflammables", "{n} t"),
+    ("2716", "1", "E", "Déchets non dangereux", "{n} m3"),
+    ("3110", "", "A", "Combustion (IED)", "{n}0 MW"),
+    ("2921", "a", "E", "Tours aéroréfrigérantes", "{n} 000 kW"),
+]
+
+def _seed(gun_id: str) -> int:
+    return int.from_bytes(hashlib.sha256(gun_id.encode("utf-8")).digest()[:8], "big")
+
+def situation(gun_id: str) -> list[list[str]]:
+    """ Rubriques générées (toujours les mêmes pour un identifiant GUN donné) """
+    rand = random.Random(_seed(gun_id))
+    rows = rand.sample(_ACTIVITES, k=rand.randint(1, 4))
+    return [[rubrique, alinea, regime, libelle, volume.format(n=rand.randint(1, 99))] for rubrique, alinea, regime, libelle, volume in rows]
+
+def page(gun_id: str, rows: list[list[str]]) -> str:
+    """ Page de la situation administrative """
+    header = "".join(f"<th>{escape(column)}</th>" for column in COLUMNS)
+    body = "".join("<tr>" + "".join(f"<td>{escape(cell)}</td>" for cell in row) + "</tr>\n" for row in rows)
+    return (
+        "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>GUN - Situation administrative</title></head>\n"
+        f"<body><h1>AIOT {escape(gun_id)}</h1>\n"
+        f"<table id=\"situation-administrative\">\n<thead><tr>{header}</tr></thead>\n<tbody>\n{body}</tbody>\n</table>\n"
+        "</body></html>\n"
+    )
+
+def javascript_page(gun_id: str, rows: list[list[str]]) -> str:
+    """ Page dont le tableau est construit par JavaScript """
+    data = json.dumps({"columns": COLUMNS, "rows": rows}).replace("</", "<\\/")
+    return (
+        "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>GUN - Situation administrative</title></head>\n"
+        f"<body><h1>AIOT {escape(gun_id)}</h1>\n<div id=\"app\"></div>\n"
+        "<script>\n"
+        f"const data = {data};\n"
+        "const table = document.createElement('table'); table.id = 'situation-administrative';\n"
+        "const head = table.createTHead().insertRow(); data.columns.forEach(c => head.appendChild(document.createElement('th')).textContent = c);\n"
+        "const body = table.createTBody(); data.rows.forEach(r => { const tr = body.insertRow(); r.forEach(c => tr.insertCell().textContent = c); });\n"
+        "document.getElementById('app').appendChild(table);\n"
+        "</script>\n</body></html>\n"
+    )
+
+class FakeGun(ThreadingHTTPServer):
+    """ Serveur GUN factice """
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], fixtures: Optional[pathlib.Path] = None, generate: bool = True, latency: float = 0.0, failure_rate: float = 0.0, javascript_rate: float = 0.0):
+        super().__init__(address, _Handler)
+        self.fixtures = pathlib.Path(fixtures) if fixtures else None
+        self.generate = generate
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.javascript_rate = javascript_rate
+        # Nombre de requêtes reçues, par identifiant GUN
+        self.requests: dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def render(self, gun_id: str) -> Optional[str]:
+        if self.fixtures is not None:
+            fixture = self.fixtures / f"{gun_id}.html"
+
+            if fixture.is_file():
+                return fixture.read_text(encoding="utf-8")
+
+        if not self.generate:
+            return None
+
+        if random.Random(_seed(gun_id) ^ 1).random() < self.javascript_rate:
+            return javascript_page(gun_id, situation(gun_id))
+
+        return page(gun_id, situation(gun_id))
+
+    def start(self) -> threading.Thread:
+        """ Sert les requêtes dans un fil (ex: tests) ; arrêter par shutdown() """
+        thread = threading.Thread(target=self.serve_forever, name="boic-fake-gun", daemon=True)
+        thread.start()
+        return thread
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeGun
+    protocol_version = "HTTP/1.1"
+    # L'en-tête et le corps sont écrits séparément : sans cela, une connexion persistante attend l'acquittement retardé.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        match = _PAGE.match(self.path.split("?")[0])
+
+        if match is None:
+            return self.reply(404, "Page introuvable")
+
+        gun_id = unquote(match.group("gun"))
+
+        with self.server.lock:
+            self.server.requests[gun_id] = self.server.requests.get(gun_id, 0) + 1
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if random.random() < self.server.failure_rate:
+            return self.reply(503, "Service indisponible")
+
+        html = self.server.render(gun_id)
+
+        if html is None:
+            return self.reply(404, f"AIOT {gun_id} introuvable")
+
+        self.reply(200, html, content_type="text/html; charset=utf-8")
+
+    def reply(self, status: int, body: str, content_type: str = "text/plain; charset=utf-8"):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args):
+        pass
+
+def main(args: Optional[list[str]] = None):
+    parser = argparse.ArgumentParser(description="Serveur GUN factice (tests de la synchronisation des AIOTs)")
+    parser.add_argument("--host", dest="host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", dest="port", type=int, default=8800)
+    parser.add_argument("--fixtures", dest="fixtures", type=pathlib.Path, default=None, help="Répertoire des pages enregistrées ({gun}.html)")
+    parser.add_argument("--fixtures-only", dest="generate", action="store_false", help="Ne sert que les pages enregistrées")
+    parser.add_argument("--latency", dest="latency", type=float, default=0.0, help="Délai de chaque réponse (secondes)")
+    parser.add_argument("--failure-rate", dest="failure_rate", type=float, default=0.0, help="Probabilité d'une erreur 503")
+    parser.add_argument("--javascript-rate", dest="javascript_rate", type=float, default=0.0, help="Part des AIOTs dont la page est rendue par JavaScript")
+    args = parser.parse_args(args)
+
+    server = FakeGun((args.host, args.port), fixtures=args.fixtures, generate=args.generate, latency=args.latency, failure_rate=args.failure_rate, javascript_rate=args.javascript_rate)
+    print(f"GUN factice sur {server.url} (Ctrl+C pour arrêter)")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+""" Synchronisation des AIOTs avec le GUN (sync:aiot --all)
+
+Les extractions sont réalisées en parallèle par un pool de fils, qui se partagent un pool
+de sessions (SessionPool) : une session (ex: un navigateur) est ouverte au premier besoin,
+puis réutilisée d'un AIOT à l'autre ; une session en erreur est fermée et remplacée. Les
+requêtes vers un même hôte sont espacées (RateLimiter), et une erreur passagère (délai,
+indisponibilité) est retentée après une attente croissante.
+
+Un AIOT dont la situation a été extraite depuis moins de gun.ttl secondes n'est pas
+ré-extrait (cf. boic.gun.cache). Les situations qui ont changé sont écrites dans les Shards
+des AIOTs (situation_administrative, et gun_sync : date de la dernière modification) en une
+seule fois (cf. boic.shards.writer) : les index sont mis à jour une seule fois, à la fin de
+la synchronisation, et les Shards inchangés ne sont pas réécrits.
+"""
+from __future__ import annotations
+from typing import Optional, Callable, TYPE_CHECKING
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime
+from urllib.parse import urlsplit
+import logging
+import queue
+import random
+import threading
+import time
+
+from . import Driver, ExtractionError
+from .cache import SituationCache, cache as situation_cache
+
+if TYPE_CHECKING:
+    from boic.jewel import Jewel
+
+_logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """ Espace les requêtes vers un même hôte (au plus *rate* requêtes par seconde) """
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        # Hôte -> instant de la prochaine requête autorisée
+        self.slots: dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    def wait(self, host: str):
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.slots.get(host, now))
+            self.slots[host] = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+class SessionPool:
+    """ Sessions d'extraction (au plus *size*), ouvertes au premier besoin et réutilisées """
+    def __init__(self, factory: Callable[[], Driver], size: int):
+        self.factory = factory
+        self.size = size
+        self.idle: queue.LifoQueue[Driver] = queue.LifoQueue()
+        self.opened = 0
+        self.lock = threading.Lock()
+        self.sessions: list[Driver] = []
+
+    @contextmanager
+    def session(self) -> Iterator[Driver]:
+        """ Emprunte une session ; après une erreur passagère, elle est fermée (une nouvelle sera ouverte) """
+        session = self._acquire()
+
+        try:
+            yield session
+        except ExtractionError as e:
+            if e.retry:
+                self._discard(session)
+            else:
+                self.idle.put(session)
+
+            raise
+        except BaseException:
+            self._discard(session)
+            raise
+        else:
+            self.idle.put(session)
+
+    def _acquire(self) -> Driver:
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self.lock:
+            create = self.opened < self.size
+
+            if create:
+                self.opened += 1
+
+        if not create:
+            return self.idle.get()
+
+        try:
+            session = self.factory()
+        except BaseException:
+            with self.lock:
+                self.opened -= 1
+
+            raise
+
+        with self.lock:
+            self.sessions.append(session)
+
+        return session
+
+    def _discard(self, session: Driver):
+        with self.lock:
+            self.opened -= 1
+            self.sessions.remove(session)
+
+        _close(session)
+
+    def close(self):
+        with self.lock:
+            sessions, self.sessions = (self.sessions, [])
+            self.opened = 0
+
+        for session in sessions:
+            _close(session)
+
+def _close(session: Driver):
+    try:
+        session.close()
+    except Exception:
+        _logger.debug("Echec de la fermeture de la session", exc_info=True)
+
+class SyncResult:
+    """ Résultat de la synchronisation d'un AIOT """
+    def __init__(self, id: str, gun: str):
+        self.id = id
+        self.gun = gun
+        self.situation: Optional[list[dict[str, str]]] = None
+        self.error: Optional[str] = None
+        self.attempts = 0
+        self.seconds = 0.0
+        # Situation lue dans le cache (entrée fraîche), sans extraction
+        self.cached = False
+        # Situation écrite dans le Shard (elle a changé)
+        self.changed = False
+
+    def ok(self) -> bool:
+        return self.error is None
+
+class Synchronizer:
+    """ Synchronise les AIOTs avec le GUN, par un pool de sessions """
+    def __init__(self, jewel: Jewel, driver: type[Driver], sessions: int = 4, rate: float = 2.0, retries: int = 3, backoff: float = 1.0, force: bool = False, cache: Optional[SituationCache] = None, **options):
+        self.jewel = jewel
+        self.cache = cache or situation_cache(jewel)
+        # Ré-extrait les situations, même fraîches
+        self.force = force
+        self.factory = lambda: driver.from_config(jewel.config.gun, **options)
+        self.workers = max(1, sessions)
+        self.pool = SessionPool(self.factory, size=self.workers)
+        self.limiter = RateLimiter(rate)
+        self.retries = retries
+        self.backoff = backoff
+
+    def extract(self, result: SyncResult) -> SyncResult:
+        """ Extrait la situation administrative de l'AIOT (sauf entrée fraîche), en retentant les erreurs passagères """
+        start = time.perf_counter()
+        entry = None if self.force else self.cache.get(result.gun)
+
+        if self.cache.fresh(entry):
+            result.situation, result.cached = (entry.situation, True)
+            return result
+
+        while True:
+            result.attempts += 1
+
+            try:
+                with self.pool.session() as session:
+                    self.limiter.wait(urlsplit(session.page_url(result.gun)).netloc)
+                    result.situation = session.extract(result.gun)
+                    result.error = None
+
+                self.cache.put(result.gun, result.situation)
+                break
+            except ExtractionError as e:
+                result.error = str(e)
+
+                if not e.retry or result.attempts > self.retries:
+                    break
+            except Exception as e:
+                _logger.debug(f"Echec de l'extraction de {result.gun}", exc_info=True)
+                result.error = f"{type(e).__name__}: {e}"
+                break
+
+            # Attente croissante (avec gigue) avant la tentative suivante
+            delay = self.backoff * 2 ** (result.attempts - 1) * random.uniform(0.5, 1.5)
+            _logger.info(f"{result.gun}: {result.error}, nouvelle tentative dans {delay:.1f} s")
+            time.sleep(delay)
+
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def run(self, aiots: list[tuple[str, str]], write: bool = True) -> Iterator[SyncResult]:
+        """ Synchronise les AIOTs (identifiant du Shard, identifiant GUN), dans l'ordre de leur achèvement.
+
+            Les situations extraites sont écrites dans les Shards une fois toutes les extractions terminées.
+        """
+        results = []
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="boic-gun") as executor:
+                futures = [executor.submit(self.extract, SyncResult(id, gun)) for id, gun in aiots]
+
+                for future in as_completed(futures):
+                    results.append(future.result())
+                    yield results[-1]
+        finally:
+            self.pool.close()
+            self.cache.flush()
+
+            if write:
+                self.write(results)
+
+    def write(self, results: list[SyncResult]):
+        """ Ecrit les situations administratives qui ont changé dans les Shards des AIOTs, en une seule fois """
+        from boic import shards
+        from boic.jewel import JewelPath
+        from boic.shards.writer import ShardWriter
+
+        writer = ShardWriter(self.jewel)
+        now = datetime.now().replace(microsecond=0)
+
+        for result in results:
+            if not result.ok():
+                continue
+
+            try:
+                path = JewelPath.from_str(self.jewel, result.id)
+                shard = shards.load(path)
+                current = shard["situation_administrative"].value if "situation_administrative" in shard else None
+
+                if current == result.situation:
+                    continue
+
+                writer.update(path, {
+                    "situation_administrative": result.situation,
+                    "gun_sync": now
+                })
+                result.changed = True
+            except (OSError, ValueError) as e:
+                result.error = f"{type(e).__name__}: {e}"
+
+        writer.commit()
+
+def aiots(jewel: Jewel, query: Optional[str] = None, max_depth=None) -> list[tuple[str, str]]:
+    """ AIOTs (identifiant du Shard, identifiant GUN) à synchroniser : ceux qui ont un identifiant GUN """
+    from boic import sql
+
+    selected = []
+
+    for row in sql.execute(jewel, query or "SELECT id, gun FROM aiot", max_depth=max_depth):
+        if "id" not in row or "gun" not in row:
+            raise ValueError("La requête doit retourner les colonnes id et gun (ex: SELECT id, gun FROM aiot WHERE ...).")
+
+        gun = row["gun"]
+        gun = str(getattr(gun, "value", gun) or "").strip()
+
+        if gun:
+            selected.append((str(row["id"]), gun))
+
+    return selected
@@ -0,0 +1,161 @@
+""" Fichiers .jewelignore
+
+Syntaxe reprise de gitignore :
+- une ligne par motif, les lignes vides et commençant par # sont ignorées ;
+- un motif sans / (hors / final) s'applique à tous les niveaux sous le répertoire du fichier ;
+- un motif contenant un / est ancré au répertoire du fichier ;
+- un / final restreint le motif aux répertoires ;
+- ! inverse le motif (ré-inclut), le dernier motif correspondant l'emporte ;
+- *, ? et ** (n'importe quel nombre de répertoires) sont supportés.
+
+Les règles sont hiérarchiques : celles d'un répertoire s'appliquent à toute sa descendance,
+et les fichiers plus profonds priment. Elles sont mises en cache par répertoire.
+"""
+from __future__ import annotations
+from typing import Optional, TYPE_CHECKING
+import os
+import re
+import logging
+
+if TYPE_CHECKING:
+    from boic.jewel import Jewel, JewelPath
+
+_logger = logging.getLogger(__name__)
+
+IGNORE_FILE = ".jewelignore"
+
+class Rule:
+    """ Motif d'un fichier .jewelignore """
+    def __init__(self, pattern: str):
+        self.negate = pattern.startswith("!")
+        pattern = pattern[1:] if self.negate else pattern
+
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+
+        self.regex = re.compile(("" if anchored else "(?:.*/)?") + _translate(pattern))
+
+    def matches(self, rel: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+
+        return self.regex.fullmatch(rel) is not None
+
+def _translate(pattern: str) -> str:
+    """ Traduit un motif glob en expression régulière """
+    regex, i = ([], 0)
+
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            regex.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            regex.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            regex.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 1:]:
+            end = pattern.index("]", i + 1)
+            regex.append("[" + pattern[i + 1:end].replace("!", "^", 1) + "]")
+            i = end + 1
+        else:
+            regex.append(re.escape(pattern[i]))
+            i += 1
+
+    return "".join(regex)
+
+def parse(lines: list[str]) -> list[Rule]:
+    """ Analyse le contenu d'un fichier .jewelignore """
+    rules = []
+
+    for line in lines:
+        line = line.rstrip("\n").rstrip()
+
+        if not line or line.startswith("#"):
+            continue
+
+        rules.append(Rule(line))
+
+    return rules
+
+# Chaîne des règles applicables à un répertoire : [(profondeur du répertoire du fichier, règles), ...]
+Chain = tuple[tuple[int, tuple[Rule, ...]], ...]
+
+class JewelIgnore:
+    """ Règles d'exclusion du Jewel (configuration ignore + fichiers .jewelignore) """
+    def __init__(self, jewel: Jewel):
+        self.jewel = jewel
+        # Cache des règles par répertoire : chemin canonique -> (mtime_ns, règles)
+        self.cache: dict[str, tuple[int, tuple[Rule, ...]]] = {}
+
+    def root(self) -> Chain:
+        """ Règles de la configuration, ancrées à la racine du Jewel (le répertoire des index est toujours exclu) """
+        rules = tuple(parse([*self.jewel.config.ignore, f"/{self.jewel.config.indexes.dir}/"]))
+        return ((1, rules),)
+
+    def load(self, directory: str) -> tuple[Rule, ...]:
+        """ Charge (ou récupère du cache) les règles du fichier .jewelignore du répertoire """
+        path = os.path.join(directory, IGNORE_FILE)
+
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self.cache.pop(directory, None)
+            return ()
+
+        cached = self.cache.get(directory)
+
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        _logger.debug(f"Chargement des règles d'exclusion: {path}")
+
+        with open(path, encoding="utf8") as file:
+            rules = tuple(parse(file.readlines()))
+
+        self.cache[directory] = (mtime, rules)
+        return rules
+
+    def extend(self, chain: Chain, path: JewelPath, names: Optional[list[str]] = None) -> Chain:
+        """ Ajoute à la chaîne les règles du répertoire.
+
+            *names* (le contenu du répertoire, s'il a déjà été listé) évite un accès disque
+            lorsque le répertoire ne contient pas de fichier .jewelignore.
+        """
+        if names is not None and IGNORE_FILE not in names:
+            return chain
+
+        rules = self.load(os.fspath(path.canonicalize()))
+        return chain + ((len(path.segments), rules),) if rules else chain
+
+    def chain(self, path: JewelPath) -> Chain:
+        """ Chaîne des règles héritées des ancêtres du répertoire (exclu) """
+        from boic.jewel import JewelPath
+
+        chain = self.root()
+
+        for depth in range(1, len(path.segments)):
+            chain = self.extend(chain, JewelPath(path.jewel, path.segments[:depth]))
+
+        return chain
+
+    @staticmethod
+    def ignored(chain: Chain, segments: list[str], name: str, is_dir: bool) -> bool:
+        """ Vérifie si l'entrée *name* du répertoire *segments* est exclue """
+        ignored = False
+
+        for depth, rules in chain:
+            rel = "/".join([*segments[depth:], name])
+
+            for rule in rules:
+                if rule.matches(rel, is_dir):
+                    ignored = not rule.negate
+
+        return ignored
@@ -0,0 +1,208 @@
+""" Import en masse d'AIOTs (import:aiots)
+
+Chaque ligne d'un fichier CSV (séparateur détecté : virgule, point-virgule ou tabulation)
+ou JSON (liste d'objets, ou un objet par ligne) décrit un AIOT :
+
+    nom, chemin, commune, inspecteur, numero.aiot, numero.dossier, numero.gup, ...
+
+Les colonnes pointées (numero.aiot) sont regroupées (numero: {aiot: ...}) ; les colonnes
+supplémentaires sont transmises au modèle. L'inspecteur est l'abréviation d'un Shard du
+répertoire de l'équipe, chargé une seule fois pour toutes les lignes.
+
+Le modèle de Fiche est compilé une fois (cf. boic.templates.environment). Les répertoires
+sont créés, puis les Fiches rendues et écrites, par un pool de fils ; une Fiche existante
+n'est jamais écrasée. L'arbre des répertoires est marqué en une seule écriture du journal,
+et les index sont mis à jour une seule fois, à la fin de l'import.
+"""
+from __future__ import annotations
+from typing import Optional, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+import csv
+import json
+import logging
+import pathlib
+
+if TYPE_CHECKING:
+    from boic.jewel import Jewel, JewelPath
+    from boic.shards import Shard
+
+_logger = logging.getLogger(__name__)
+
+class AiotRow:
+    """ AIOT à créer (une ligne du fichier) """
+    def __init__(self, line: int, values: dict[str, any]):
+        self.line = line
+        self.values = values
+        self.nom = str(values.get("nom") or "").strip()
+        self.chemin = str(values.get("chemin") or "").strip()
+        self.error: Optional[str] = None
+        self.fiche: Optional[JewelPath] = None
+
+def _nest(values: dict[str, any]) -> dict[str, any]:
+    """ Regroupe les colonnes pointées (numero.aiot -> numero: {aiot: ...}) """
+    nested = {}
+
+    for key, value in values.items():
+        if key is None:
+            continue
+
+        parts = key.strip().split(".")
+        target = nested
+
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+
+        target[parts[-1]] = value.strip() if isinstance(value, str) else value
+
+    return nested
+
+def read_rows(path: pathlib.Path) -> list[AiotRow]:
+    """ Lit les AIOTs du fichier CSV ou JSON """
+    path = pathlib.Path(path)
+
+    with path.open(mode="r", encoding="utf-8-sig", newline="") as file:
+        if path.suffix.lower() in (".json", ".jsonl", ".ndjson"):
+            text = file.read()
+
+            try:
+                records = json.loads(text)
+            except json.JSONDecodeError:
+                records = [json.loads(line) for line in text.splitlines() if line.strip()]
+
+            if isinstance(records, dict):
+                records = records.get("aiots", [records])
+
+            return [AiotRow(line, _nest(record)) for line, record in enumerate(records, start=1)]
+
+        sample = file.read(64 * 1024)
+        file.seek(0)
+
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+
+        # La ligne 1 est l'en-tête.
+        return [AiotRow(line, _nest(record)) for line, record in enumerate(csv.DictReader(file, dialect=dialect), start=2)]
+
+class Importer:
+    """ Crée les AIOTs (répertoires et Fiche.md) """
+    def __init__(self, jewel: Jewel, create_dirs: bool = False, workers: int = 8):
+        self.jewel = jewel
+        self.create_dirs = create_dirs
+        self.workers = workers
+        self.inspecteurs: dict[str, Optional[Shard]] = {}
+
+    def inspecteur(self, abbreviation: str) -> Shard:
+        """ Shard de l'inspecteur, chargé une seule fois par abréviation """
+        from boic import shards
+
+        if abbreviation not in self.inspecteurs:
+            path = self.jewel.path(self.jewel.config.equipe.dir).join(f"{abbreviation}.md")
+
+            try:
+                self.inspecteurs[abbreviation] = shards.load(path)
+            except FileNotFoundError:
+                self.inspecteurs[abbreviation] = None
+
+        if self.inspecteurs[abbreviation] is None:
+            raise ValueError(f"Inspecteur {abbreviation} introuvable dans {self.jewel.config.equipe.dir}.")
+
+        return self.inspecteurs[abbreviation]
+
+    def prepare(self, rows: list[AiotRow]) -> list[AiotRow]:
+        """ Valide les lignes, et retourne celles à créer """
+        from boic import jewel as J
+
+        seen = set()
+        valid = []
+
+        for row in rows:
+            try:
+                if not row.nom or not row.chemin:
+                    raise ValueError("Les colonnes nom et chemin sont obligatoires.")
+
+                # Le chemin ne peut pas sortir du Jewel (cf. jewel.split_path).
+                row.fiche = self.jewel.path(*J.split_path(row.chemin), "Fiche.md")
+                id = "/".join(row.fiche.segments)
+
+                if id in seen:
+                    raise ValueError(f"Chemin en double dans le fichier : {row.chemin}")
+
+                if row.fiche.exists():
+                    raise ValueError(f"La Fiche existe déjà : {row.fiche}")
+
+                seen.add(id)
+                inspecteur = str(row.values.get("inspecteur") or "").strip()
+                row.values["inspecteur"] = self.inspecteur(inspecteur) if inspecteur else None
+                row.values.setdefault("numero", {})
+                valid.append(row)
+            except ValueError as e:
+                row.error = str(e)
+
+        return valid
+
+    def directories(self, rows: list[AiotRow]) -> list[JewelPath]:
+        """ Répertoires à créer, sans doublon """
+        dirs = {}
+
+        for row in rows:
+            paths = [row.fiche.parent()]
+
+            if self.create_dirs:
+                paths += [row.fiche.parent().join(dirname) for _, dirname in self.jewel.config.aiot.dir.items()]
+
+            for path in paths:
+                dirs.setdefault("/".join(path.segments), path)
+
+        return [dirs[id] for id in sorted(dirs)]
+
+    def run(self, rows: list[AiotRow]) -> list[AiotRow]:
+        """ Crée les AIOTs, et retourne ceux qui ont été créés """
+        from boic import templates
+
+        valid = self.prepare(rows)
+
+        if not valid:
+            return []
+
+        # Compilé une seule fois, partagé par les fils (le rendu d'un modèle Jinja est sûr entre fils).
+        template = templates.environment(self.jewel).get_template(f"{self.jewel.config.templates.aiot}.md.tpl")
+
+        def write(row: AiotRow):
+            try:
+                content = template.render(**row.values)
+
+                # Création exclusive : une Fiche créée entre-temps n'est pas écrasée.
+                with row.fiche.open(mode="x") as file:
+                    file.write(content)
+            except Exception as e:
+                _logger.debug(f"Echec de la création de {row.fiche}", exc_info=True)
+                row.error = f"{type(e).__name__}: {e}"
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="boic-import") as pool:
+            list(pool.map(lambda path: path.mkdir(), self.directories(valid)))
+            list(pool.map(write, valid))
+
+        created = [row for row in valid if row.error is None]
+        self.update(created)
+        return created
+
+    def update(self, created: list[AiotRow]):
+        """ Marque les Fiches créées, puis met à jour les index (une seule fois) """
+        from boic import shards
+
+        if not created:
+            return
+
+        self.jewel.tree.invalidate_many([row.fiche for row in created])
+
+        if shards.get_primary_index(self.jewel) is not None:
+            _logger.info("Mise à jour des index...")
+            shards.build_indexes(self.jewel, incremental=True)
+
+def import_aiots(jewel: Jewel, path: pathlib.Path, create_dirs: bool = False, workers: int = 8) -> tuple[list[AiotRow], list[AiotRow]]:
+    """ Importe les AIOTs du fichier : retourne (lignes lues, AIOTs créés) """
+    rows = read_rows(path)
+    created = Importer(jewel, create_dirs=create_dirs, workers=workers).run(rows)
+    return (rows, created)
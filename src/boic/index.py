@@ -1,25 +1,59 @@
-from collections.abc import Iterator, Literal
+from __future__ import annotations
+from typing import Literal, Optional, TYPE_CHECKING
+from collections.abc import Iterator
+import bisect
 import json
-from boic.jewel import Jewel
 
-IndexType = Literal["flatten"]
+if TYPE_CHECKING:
+    from boic.jewel import Jewel, JewelPath
+    from boic.shards import Shard
+
+IndexType = Literal["flatten", "inverted", "range"]
 
 class Schema:
     """ Schéma d'un index. """
-    def __init__(self, name: str, type: IndexType, columns):
+    def __init__(self, name: str, type: IndexType, columns: list[str]):
         self.name = name
         self.type = type
         self.columns = columns
 
 class Index:
-    def __init__(self, schema: Schema):
-        self.shema = schema
+    def __init__(self, jewel: Jewel, schema: Schema):
+        self.jewel = jewel
+        self.schema = schema
+
+    def location(self) -> JewelPath:
+        """ Chemin vers le fichier de l'index """
+        return self.jewel.path(self.jewel.config.indexes.dir, self.schema.name)
+
+    def exists(self) -> bool:
+        """ Vérifie si l'index a été construit """
+        return self.location().exists()
+
+    def covers(self, column: str) -> bool:
+        return column in self.schema.columns
 
     def __iter__(self) -> Iterator[IndexCursor]:
         raise NotImplementedError("L'index doit implémenter __iter__ pour être scanné en intégralité.")
 
+    def clear(self):
+        """ Vide l'index avant sa reconstruction """
+        raise NotImplementedError("L'index doit implémenter clear pour être reconstruit.")
+
+    def add(self, shard: Shard):
+        """ Ajoute le Shard à l'index """
+        raise NotImplementedError("L'index doit implémenter add pour être reconstruit.")
+
+    def remove(self, id: str):
+        """ Retire le Shard de l'index """
+        raise NotImplementedError("L'index doit implémenter remove pour être mis à jour incrémentalement.")
+
+    def flush(self):
+        """ Ecris l'index sur le disque """
+        raise NotImplementedError("L'index doit implémenter flush pour être reconstruit.")
+
 class IndexCursor:
-    def __init__(self, columns: list[str], values: list[any])
+    def __init__(self, columns: list[str], values: list[any]):
         self.columns = columns
         self.values = values
 
@@ -27,77 +61,322 @@ class IndexCursor:
         col_id = self.columns.index(alias)
         return self.values[col_id]
 
-class Flatten(Index):   
-    """ Liste plate """
+def _values(shard: Shard, column: str) -> Iterator[str]:
+    """ Itère sur les valeurs scalaires d'une colonne, éventuellement multivaluée, d'un Shard. """
+    if column not in shard:
+        return
+
+    value = shard[column]
+    value = getattr(value, "value", value)
+
+    if value is None:
+        return
+
+    if not isinstance(value, list):
+        value = [value]
+
+    for item in value:
+        if item is not None and not isinstance(item, (dict, list)):
+            yield str(item)
+
+class Flatten(Index):
+    """ Liste plate (une ligne par Shard, préfixée par son identifiant) """
     def __init__(self, jewel: Jewel, schema: Schema):
-        super().__init__(schema=schema)
-        self.jewel = jewel
-        self.stream = stream
-    
-    def __iter__(self) -> Iterator[IndexCursor]
-        with self.jewel.path(jewel.config.index.dir, self.schema.name).open(mode="r") as file:
-            for line in file:
-                yield IndexCursor(columns=self.columns, values=line.split(";"))
+        super().__init__(jewel=jewel, schema=schema)
+        self.rows: Optional[dict[str, list[str]]] = None
+
+    def load(self) -> dict[str, list[str]]:
+        if self.rows is None:
+            self.rows = {}
+
+            if self.exists():
+                with self.location().open(mode="r") as file:
+                    for line in file:
+                        id, *values = line.rstrip("\n").split(";")
+                        self.rows[id] = values
+
+        return self.rows
+
+    def __iter__(self) -> Iterator[IndexCursor]:
+        for id, values in self.load().items():
+            yield IndexCursor(columns=["id", *self.schema.columns], values=[id, *values])
+
+    def clear(self):
+        self.rows = {}
+
+    def add(self, shard: Shard):
+        self.load()[shard["id"]] = [",".join(_values(shard, col)) for col in self.schema.columns]
+
+    def remove(self, id: str):
+        self.load().pop(id, None)
+
+    def flush(self):
+        rows = self.load()
+        self.location().parent().mkdir()
+        with self.location().open_atomic() as file:
+            for id, values in rows.items():
+                file.write(";".join([id, *values]) + "\n")
+
+class Inverted(Index):
+    """ Index inversé
+
+        Associe chaque valeur d'une colonne multivaluée (ex: tags) à la liste
+        des identifiants des Shards qui la portent (liste de postage).
+    """
+    def __init__(self, jewel: Jewel, schema: Schema):
+        super().__init__(jewel=jewel, schema=schema)
+        self.postings: Optional[dict[str, set[str]]] = None
+        self.removed: set[str] = set()
+
+    def load(self) -> dict[str, set[str]]:
+        """ Charge les listes de postage depuis le disque (une seule fois), et applique les retraits en attente """
+        if self.postings is None:
+            self.postings = {}
+
+            if self.exists():
+                with self.location().open(mode="r") as file:
+                    self.postings = {key: set(ids) for key, ids in json.load(file).items()}
+
+        if self.removed:
+            for key in list(self.postings):
+                self.postings[key] -= self.removed
+
+                if not self.postings[key]:
+                    del self.postings[key]
+
+            self.removed = set()
+
+        return self.postings
+
+    def __iter__(self) -> Iterator[IndexCursor]:
+        for key, ids in self.load().items():
+            for id in ids:
+                yield IndexCursor(columns=["key", "id"], values=[key, id])
+
+    def lookup(self, key: any) -> set[str]:
+        """ Retourne les identifiants des Shards portant la valeur """
+        return self.load().get(str(key), set())
+
+    def clear(self):
+        self.postings, self.removed = ({}, set())
+
+    def add(self, shard: Shard):
+        postings = self.load()
+
+        for col in self.schema.columns:
+            for key in _values(shard, col):
+                postings.setdefault(key, set()).add(shard["id"])
+
+    def remove(self, id: str):
+        # Les retraits sont appliqués en un seul passage, au prochain chargement (cf. load).
+        self.removed.add(id)
+
+    def flush(self):
+        postings = self.load()
+        self.location().parent().mkdir()
+        with self.location().open_atomic() as file:
+            json.dump({key: sorted(ids) for key, ids in postings.items()}, file)
+
+class Range(Index):
+    """ Index de plage
+
+        Liste triée de couples (clé, identifiant du Shard). Les clés sont converties 
+        dans le type déclaré de la colonne (config.columns, ex: date) pour que l'ordre 
+        lexicographique des clés suive l'ordre des valeurs. Répond aux requêtes 
+        BETWEEN, <, <=, >, >=, = par recherche dichotomique.
+
+        La colonne doit avoir un type déclaré : l'ordre des autres valeurs (ex: "10" < "9") 
+        ne suivrait pas celui du filtre. Sans type, l'index reste vide et n'est pas utilisé.
+    """
+    def __init__(self, jewel: Jewel, schema: Schema):
+        super().__init__(jewel=jewel, schema=schema)
+        self.entries: Optional[list[tuple[str, str]]] = None
+        self.keys: Optional[list[str]] = None
+        self.removed: set[str] = set()
+
+    def column_type(self) -> Optional[str]:
+        """ Type déclaré de la colonne, s'il donne un ordre des clés (date, datetime) """
+        types = self.jewel.config.columns
+        column = self.schema.columns[0]
+        typ = types[column] if column in types.keys() else None
+        return typ if typ in ("date", "datetime") else None
+
+    def covers(self, column: str) -> bool:
+        return super().covers(column) and self.column_type() is not None
+
+    def key(self, value: any) -> Optional[str]:
+        """ Convertit la valeur en clé de l'index """
+        from boic.sql.eval import coerce
+
+        typ = self.column_type()
+
+        if typ is None:
+            return None
+
+        value = coerce(value, typ)
+
+        if value is None:
+            return None
+
+        return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+    def load(self) -> list[tuple[str, str]]:
+        if self.entries is None:
+            self.entries = []
+
+            if self.exists():
+                with self.location().open(mode="r") as file:
+                    self.entries = [tuple(entry) for entry in json.load(file)]
+
+        if self.removed:
+            self.entries = [entry for entry in self.entries if entry[1] not in self.removed]
+            self.removed, self.keys = (set(), None)
+
+        if self.keys is None:
+            self.entries.sort()
+            self.keys = [key for key, _ in self.entries]
+
+        return self.entries
+
+    def __iter__(self) -> Iterator[IndexCursor]:
+        for key, id in self.load():
+            yield IndexCursor(columns=["key", "id"], values=[key, id])
+
+    def lookup_range(self, low: any = None, high: any = None, low_inclusive: bool = True, high_inclusive: bool = True) -> set[str]:
+        """ Retourne les identifiants des Shards dont la valeur est comprise dans la plage """
+        entries = self.load()
+        start, end = (0, len(entries))
+
+        if low is not None:
+            low = self.key(low)
+
+            if low is None:
+                return set()
+
+            start = (bisect.bisect_left if low_inclusive else bisect.bisect_right)(self.keys, low)
+
+        if high is not None:
+            high = self.key(high)
+
+            if high is None:
+                return set()
+
+            end = (bisect.bisect_right if high_inclusive else bisect.bisect_left)(self.keys, high)
+
+        return {id for _, id in entries[start:end]}
+
+    def clear(self):
+        self.entries, self.keys, self.removed = ([], None, set())
+
+    def add(self, shard: Shard):
+        entries = self.load()
+
+        for col in self.schema.columns:
+            for value in _values(shard, col):
+                key = self.key(value)
+
+                if key is not None:
+                    entries.append((key, shard["id"]))
+
+        self.keys = None
+
+    def remove(self, id: str):
+        # Les retraits sont appliqués en un seul passage, au prochain chargement (cf. load).
+        self.removed.add(id)
+
+    def flush(self):
+        entries = self.load()
+        self.location().parent().mkdir()
+        with self.location().open_atomic() as file:
+            json.dump(entries, file)
 
 class IndexManager:
+    """ Gestionnaire des index secondaires du Jewel.
+
+        Les index sont déclarés dans la configuration (indexes.schemas) ou
+        créés via IndexManager.new (et persistés dans le fichier "schemas").
+    """
     def __init__(self, jewel: Jewel):
         self.jewel = jewel
-        self.schema = self.load_schemas()
+        self.indexes = self.load_schemas()
 
-    def __iter__(self) -> Iterator[Schema]:
-        return self.schema.values()
+    def __iter__(self) -> Iterator[Index]:
+        return iter(self.indexes.values())
 
-    def load_schemas(self) -> dict[str, Schema]:
-        schemas_loc = self.jewel.path(jewel.config.index.dir, "schemas")
-        
-        if not schemas_loc.exists():
-            return {}
+    def _schemas_loc(self) -> JewelPath:
+        return self.jewel.path(self.jewel.config.indexes.dir, "schemas")
 
-        with schemas_loc.open(mode="r") as file:
-            ser_schemas = json.load()
-        
-        schemas = {}
+    def load_schemas(self) -> dict[str, Index]:
+        ser_schemas = {
+            name: dict(ser_schema, name=name)
+            for name, ser_schema in self.jewel.config.indexes.schemas.items()
+        }
 
-        for _, ser_schema in
-            schema = Schema(id=ser_schema["id"], type=ser_schema["type"], columns=ser_schema["columns"])
-            schemas[schema.id] = self.load_index_from_schema(schema)
+        schemas_loc = self._schemas_loc()
 
-        return schemas
+        if schemas_loc.exists():
+            with schemas_loc.open(mode="r") as file:
+                ser_schemas.update(json.load(file))
+
+        indexes = {}
+
+        for ser_schema in ser_schemas.values():
+            schema = Schema(name=ser_schema["name"], type=ser_schema["type"], columns=ser_schema["columns"])
+            indexes[schema.name] = self.load_index_from_schema(schema)
+
+        return indexes
 
     def load_index_from_schema(self, schema: Schema) -> Index:
         if schema.type == "flatten":
-            return Flatten(schema)
+            return Flatten(jewel=self.jewel, schema=schema)
+        elif schema.type == "inverted":
+            return Inverted(jewel=self.jewel, schema=schema)
+        elif schema.type == "range":
+            return Range(jewel=self.jewel, schema=schema)
         else:
             raise ValueError(f"Type d'index {schema.type} inconnu.")
 
     def flush_schemas(self):
         schemas = {}
+        declared = self.jewel.config.indexes.schemas.keys()
 
-        for schema in self.schema.values():
-            schemas[schema.name] = {
-                'id': schema.id,
-                'type': schema.type,
-                'columns': schema.columns
-            }
+        for index in self.indexes.values():
+            if index.schema.name in declared:
+                continue
 
-        with self.jewel.path(jewel.config.index.dir, "schemas").open(mode="w") as file:
-            file.write(json.dumps(schema))
+            schemas[index.schema.name] = {
+                'name': index.schema.name,
+                'type': index.schema.type,
+                'columns': index.schema.columns
+            }
 
-    def new(id: str, type: IndexType, columns: list[str]):
-        if id in self.schemas:
-            raise ValueError(f"Un index avec l'identifiant {id} existe déjà.")
+        self._schemas_loc().parent().mkdir()
+        with self._schemas_loc().open_atomic() as file:
+            file.write(json.dumps(schemas))
 
-    def _index_loc(self, index_name: str) -> JewelPath:
-        return self.jewel.path(self.jewel.config.index.dir, index_name)
+    def new(self, name: str, type: IndexType, columns: list[str]) -> Index:
+        if name in self.indexes:
+            raise ValueError(f"Un index avec l'identifiant {name} existe déjà.")
 
-    def __contains__(self, id: str) -> bool:
-        return id in self.schemas
+        index = self.load_index_from_schema(Schema(name=name, type=type, columns=columns))
 
-    def __getitem__(self, id: str) -> Optional[Index]
-        return self.schemas[id]
-        
+        if isinstance(index, Range) and index.column_type() is None:
+            raise ValueError(f"La colonne {columns[0]} n'a pas de type déclaré (config.columns) : elle ne peut pas porter un index de plage.")
 
+        self.indexes[name] = index
+        self.flush_schemas()
+        return index
 
+    def find(self, type: IndexType, column: str) -> Optional[Index]:
+        """ Retourne un index construit, du type demandé, couvrant la colonne. """
+        for index in self.indexes.values():
+            if index.schema.type == type and index.covers(column) and index.exists():
+                return index
 
+        return None
 
+    def __contains__(self, name: str) -> bool:
+        return name in self.indexes
 
+    def __getitem__(self, name: str) -> Index:
+        return self.indexes[name]
@@ -1,12 +1,22 @@
 from __future__ import annotations
-from collections.abc import Iterator
-from .index import IndexManager
+from collections.abc import Iterator, Callable, Generator
+from typing import Optional, TYPE_CHECKING
+from functools import cached_property
+from contextlib import contextmanager
 
+import copy
 import itertools
+import threading
 import pathlib
 import os
 import logging
 
+if TYPE_CHECKING:
+    from .index import IndexManager
+    from .partition import PartitionManager
+    from .ignore import JewelIgnore
+    from .tree import DirectoryTree
+
 _logger = logging.getLogger(__name__)
 
 class JewelConfig:
@@ -30,56 +40,146 @@ class JewelConfig:
     def __getattr__(self, key: str) -> JewelConfig | any:
         return self[key]
 
+# Configuration par défaut, complétée par le fichier jewel.yml de la racine du Jewel
+DEFAULT_CONFIG = {
+    'templates': {
+        "dir": {
+            'shards': "Modèles/Shards",
+            'documents': "Modèles/Documents"
+        },
+        "inspection": "INSPECTION-0.0.1",
+        "aiot": "AIOT-0.0.1"
+    },
+    # Motifs exclus du parcours (syntaxe .jewelignore), ancrés à la racine du Jewel
+    'ignore': [
+        '.git/'
+    ],
+    'indexes': {
+        'dir': 'Indexes',
+        # Index secondaires construits par build:index
+        'schemas': {
+            'tags': {'type': 'inverted', 'columns': ['tags']},
+            'date_inspection': {'type': 'range', 'columns': ['date_inspection']}
+        }
+    },
+    # Types déclarés des colonnes des Shards (date, datetime)
+    'columns': {
+        'date_inspection': 'date'
+    },
+    'equipe': {
+        # Chemin vers le répertoire de l'équipe.
+        'dir': "Equipe"
+    },
+    'gun': {
+        # Adresse du GUN, et page de la situation administrative d'un AIOT ({gun} : identifiant interne)
+        'url': None,
+        'page': '/aiot/{gun}/situation-administrative',
+        # Identifiant du tableau des rubriques dans la page
+        'table': 'situation-administrative',
+        # Pilote d'extraction (cf. boic.gun.DRIVERS)
+        'driver': 'auto',
+        # Synchronisation (sync:aiot --all) : sessions simultanées, requêtes par seconde et par hôte, tentatives
+        'sessions': 4,
+        'rate': 2.0,
+        'retries': 3,
+        'timeout': 30,
+        # Durée de fraîcheur d'une situation extraite, en secondes (cf. boic.gun.cache)
+        'ttl': 86400
+    },
+    'aiot': {
+        # Structure du dossier AIOT
+        'dir': {
+            'archive': '00_archives',
+            'reglementation': '01_réglementation',
+            'inspection': '02_inspections',
+            'sanctions': '03_sanctions_contentieux',
+            'concertation': '04_concertation',
+            'urbanisme': '05_urbanisme',
+            'exploitant': '06_docs_exploitant',
+            'presentation': '07_presentations',
+            'workflow': '08_RVAT',
+            'misc': '09_Autres'
+        },
+        # Répertoires de la structure pouvant contenir chaque type de Shard, 
+        # et colonnes portées par les composantes du chemin sous ces répertoires.
+        'partitions': {
+            'aiot': {
+                'dirs': []
+            },
+            'inspection': {
+                'dirs': ['inspection'],
+                'components': [{'column': 'date_inspection', 'format': '%Y'}]
+            }
+        }
+    }
+}
+
 class Jewel:
     def __init__(self, root: str):
         if root is None:
             raise ValueError("Le chemin vers le jewel n'est pas définie.")
         self._root = pathlib.Path(root)
-        self.config = JewelConfig(**{
-            'templates': {
-                "dir": {
-                    'shards': "Modèles/Shards",
-                    'documents': "Modèles/Documents"
-                },
-                "inspection": "INSPECTION-0.0.1",
-                "aiot": "AIOT-0.0.1"
-            },
-            'indexes': {
-                'dir': 'Indexes'
-            },
-            'equipe': {
-                # Chemin vers le répertoire de l'équipe.
-                'dir': "Equipe"
-            },
-            'aiot': {
-                # Structure du dossier AIOT
-                'dir': {
-                    'archive': '00_archives',
-                    'reglementation': '01_réglementation',
-                    'inspection': '02_inspections',
-                    'sanctions': '03_sanctions_contentieux',
-                    'concertation': '04_concertation',
-                    'urbanisme': '05_urbanisme',
-                    'exploitant': '06_docs_exploitant',
-                    'presentation': '07_presentations',
-                    'workflow': '08_RVAT',
-                    'misc': '09_Autres'
-                }
-            }
-        })
-
-        self.load_configuration()
-        self.index = IndexManager(jewel=self)
+        # La configuration et les gestionnaires (index, partitions...) sont chargés au premier accès.
+        self._config: Optional[JewelConfig] = None
+        # Cache des Shards chargés (cf. boic.shards.cache)
+        self.shard_cache = None
+        # Cache des plans d'exécution (cf. boic.sql.plan_cache)
+        self.plan_cache = None
+        # Environnement Jinja des modèles de Shards (cf. boic.templates.environment)
+        self.template_env = None
+        # Cache des situations administratives extraites du GUN (cf. boic.gun.cache)
+        self.gun_cache = None
+        # Génération du Jewel, incrémentée à chaque modification des fichiers ou des index (cf. touch)
+        self.generation = 0
+        self._generation_lock = threading.Lock()
     
-    def load_configuration(self):
-        from yaml import load, dump
-        from mergedeep import merge
+    @property
+    def config(self) -> JewelConfig:
+        if self._config is None:
+            self._config = self.load_configuration()
 
+        return self._config
+
+    def load_configuration(self) -> JewelConfig:
+        """ Charge la configuration par défaut, complétée par le fichier jewel.yml """
+        values = copy.deepcopy(DEFAULT_CONFIG)
         conf = self.path("jewel.yml")
+
         if conf.exists():
-            conf = loads(conf.open(mode="r"))
-            self.config = JewelConfig(**merge({}, self.config, conf))
-            
+            import yaml
+            from mergedeep import merge
+
+            with conf.open(mode="r") as file:
+                merge(values, yaml.safe_load(file) or {})
+
+        return JewelConfig(**values)
+
+    @cached_property
+    def index(self) -> IndexManager:
+        from .index import IndexManager
+        return IndexManager(jewel=self)
+
+    @cached_property
+    def partitions(self) -> PartitionManager:
+        from .partition import PartitionManager
+        return PartitionManager(jewel=self)
+
+    @cached_property
+    def ignore(self) -> JewelIgnore:
+        from .ignore import JewelIgnore
+        return JewelIgnore(jewel=self)
+
+    @cached_property
+    def tree(self) -> DirectoryTree:
+        from .tree import DirectoryTree
+        return DirectoryTree(jewel=self)
+
+    def touch(self) -> int:
+        """ Signale une modification du Jewel : les caches associés à une génération antérieure sont périmés """
+        with self._generation_lock:
+            self.generation += 1
+            return self.generation
+
     def root(self) -> JewelPath:
         """ Lien vers la racine du Jewel """
         return JewelPath(self, [''])
@@ -118,7 +218,7 @@ class JewelPath:
     def ensure(jewel: Jewel, path: str | JewelPath) -> JewelPath:
         if isinstance(path, str):
             return JewelPath.from_str(jewel, path)
-        if isinstance(path, JewlePath):
+        if isinstance(path, JewelPath):
             return path
         
         raise TypeError(f"Type incompatible pour être un jewel path ({type(path)})")
@@ -208,10 +308,24 @@ class JewelPath:
     def parent(self) -> JewelPath:
         return JewelPath(self.jewel, self.segments[:-1])
 
-    def walk(self, max_depth=None) -> Generator[JewelPath, None, None]:
-        stack = [(self, 0, None)]
+    def walk(self, max_depth=None, prune: Optional[Callable[[JewelPath], bool]] = None, suffixes: Optional[tuple[str, ...]] = None, ignore: bool = True) -> Generator[JewelPath, None, None]:
+        """ Parcourt l'arborescence.
+
+            Si *prune* est défini, les répertoires pour lesquels la fonction retourne True 
+            ne sont pas parcourus.
+
+            Si *suffixes* est défini, seuls les fichiers portant l'un des suffixes (et les liens .jlnk) 
+            sont retournés ; le filtre est appliqué sur le nom de l'entrée, avant de construire le JewelPath.
+
+            Si *ignore* est vrai, les entrées exclues par la configuration (ignore) 
+            et les fichiers .jewelignore ne sont pas parcourues.
+        """
+        rules = self.jewel.ignore if ignore else None
+        keep = (*suffixes, ".jlnk") if suffixes else None
+
+        stack = [(self, 0, None, rules.chain(self) if rules else ())]
         while stack:
-            p, d,typ = stack.pop(-1)
+            p, d, typ, chain = stack.pop(-1)
 
             _logger.debug(f"Walking : {p}")
 
@@ -225,37 +339,84 @@ class JewelPath:
                     typ = "dir"
             
             if typ == "symlink":
-                stack += [(p.follow(), d, None)]
+                stack += [(p.follow(), d, None, chain)]
                 continue
             
+            if typ == "dir" and prune and prune(p):
+                _logger.debug(f"Pruning : {p}")
+                continue
+
             if typ == "dir":
                 root = p
                 dirs = []
                 files = []
                 
                 try:
-                    for entry in os.scandir(p.canonicalize()):
-                        c = p.join(entry.name)
+                    with os.scandir(p.canonicalize()) as it:
+                        entries = list(it)
+
+                    if rules:
+                        chain = rules.extend(chain, p, names=[entry.name for entry in entries])
+
+                    for entry in entries:
+                        is_dir = entry.is_dir()
+
+                        if not is_dir and keep and not entry.name.endswith(keep):
+                            continue
+
+                        if chain and rules.ignored(chain, p.segments, entry.name, is_dir):
+                            continue
+
+                        c = JewelPath(p.jewel, [*p.segments, entry.name])
                         c.canon = pathlib.Path(entry.path)
 
-                        if entry.is_file() and c.suffix == ".jlnk":
-                            stack += [(c, d + 1, "symlink")]
+                        if is_dir:
+                            stack += [(c, d + 1, "dir", chain)]
+                            dirs.append(c)
+
+                        elif entry.is_file() and c.suffix == ".jlnk":
+                            stack += [(c, d + 1, "symlink", chain)]
                             files.append(c)
                         
                         elif entry.is_file():
                             files.append(c)
 
-                        elif entry.is_dir():
-                            stack += [(c, d + 1, "dir")]
-                            dirs.append(c)
-                    
-                    yield (root, dirs, files)
-                except Exception as e:
+                except OSError as e:
+                    # Répertoire illisible ou supprimé pendant le parcours
                     _logger.debug(f"ERROR: {e} ({p})")
+                    continue
 
+                yield (root, dirs, files)
 
     def open(self, **kwargs):
         return self.canonicalize().open(encoding="utf8", **kwargs)
 
+    @contextmanager
+    def open_atomic(self):
+        """ Ouvre le fichier en écriture : le contenu est écrit dans un fichier temporaire du même 
+            répertoire, qui remplace le fichier à la fermeture. Un lecteur voit l'ancien ou le 
+            nouveau contenu, jamais un fichier tronqué.
+        """
+        target = self.canonicalize()
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+        try:
+            with tmp.open(mode="w", encoding="utf8") as file:
+                yield file
+
+            os.replace(tmp, target)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+def split_path(location: str) -> list[str]:
+    """ Segments d'un chemin relatif à la racine du Jewel (ou jewel://), qui ne peut pas en sortir """
+    segments = location.removeprefix("jewel://").strip("/").split("/")
+
+    if any(segment in ("", ".", "..") or "\\" in segment or "\0" in segment for segment in segments):
+        raise ValueError(f"Chemin invalide : {location}")
+
+    return segments
+
 def open(path: pathlib.Path) -> Jewel:
     return Jewel(path)
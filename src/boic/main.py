@@ -4,10 +4,15 @@ import logging
 import sys
 import platform
 import argparse
-import io
+import os
+import pathlib
+import threading
+from collections import deque
+from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor
 
 from boic import __version__
-from boic.app import App
+from boic.app import App, RequestCancelled
 
 from cefpython3 import cefpython as cef
 
@@ -31,6 +36,25 @@ def parse_args(args):
         version=f"boic {__version__}",
     )
 
+    parser.add_argument(
+        "-j",
+        "--jewel",
+        dest="root",
+        help="La racine du dossier de l'inspection, par défaut la valeur est celle de la variable d'environnement JEWEL_PATH",
+        type=pathlib.Path,
+        metavar="JEWEL_PATH",
+        default=pathlib.Path(os.environ['JEWEL_PATH']) if 'JEWEL_PATH' in os.environ else None,
+    )
+
+    parser.add_argument(
+        "-w",
+        "--workers",
+        dest="workers",
+        help="nombre de fils traitant les requêtes applicatives",
+        type=int,
+        default=4,
+    )
+
     parser.add_argument(
         "-v",
         "--verbose",
@@ -65,8 +89,10 @@ def setup_logging(loglevel):
 class ClientHandler:
     """ Gestionnaire du client (interface avec le Browser) """
     
-    def __init__(self, app: App):
+    def __init__(self, app: App, workers: Optional[ThreadPoolExecutor] = None):
         self.app = app
+        # Les requêtes applicatives sont traitées hors du fil IO de CEF.
+        self.workers = workers or ThreadPoolExecutor(max_workers=4, thread_name_prefix="boic-app")
         self.res_refs = []
         
     def GetResourceHandler(self, browser, frame, request) -> Optional[cef.ResourceHandler]:
@@ -79,7 +105,10 @@ class ClientHandler:
         _logger.info(f"Requête demandée : {uri}")
         
         if uri.startswith("https://app"):
-            appResourceHandler = AppResourceHandler(app=self.app)
+            # Libère les gestionnaires des requêtes terminées.
+            self.res_refs = [ref for ref in self.res_refs if not ref.done()]
+
+            appResourceHandler = AppResourceHandler(app=self.app, workers=self.workers)
             self.res_refs.append(appResourceHandler)
             return appResourceHandler
 
@@ -93,14 +122,32 @@ class AppRequestContext:
     def uri(self) -> str:
         return self.resource_handler.request.GetUrl().removeprefix("https://app")
 
+    def method(self) -> str:
+        return self.resource_handler.request.GetMethod() or "GET"
+
+    def header(self, name: str) -> Optional[str]:
+        """ Retourne l'en-tête de la requête (insensible à la casse) """
+        headers = self.resource_handler.request.GetHeaderMap() or {}
+        return next((value for key, value in headers.items() if key.lower() == name.lower()), None)
+
+    def cancelled(self) -> bool:
+        """ Vérifie si la requête a été annulée (les traitements longs peuvent s'interrompre) """
+        return self.resource_handler.cancelled.is_set()
+
     def response(self, status) -> AppResponseBuilder:
         return AppResponseBuilder(resource_handler=self.resource_handler, status=status)
 
+def _status_text(status: int) -> str:
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return "Unknown"
+
 class AppResponseBuilder:
     def __init__(self, resource_handler: AppResourceHandler, status: int = 200):
         self.resource_handler = resource_handler
         self.status = status
-        self.status_text = "Unknown"
+        self.status_text = _status_text(status)
         self.headers = {}
     
     def set_header(self, key: str, value: any) -> AppResponseBuilder:
@@ -109,13 +156,21 @@ class AppResponseBuilder:
 
     def build(self) -> AppResponse:
         resp = AppResponse(resource_handler=self.resource_handler, status=self.status, headers=self.headers)
+        resp.status_text = self.status_text
         self.resource_handler.response = resp
+        # Les en-têtes sont disponibles : CEF peut appeler GetResponseHeaders.
+        self.resource_handler.resume()
         return resp
 
 class AppResponse:
-    """ Représente une réponse applicative """
-    def __init__(self, resource_handler: AppResourceHandler, status: int, headers):
-        self.stream = io.BytesIO()
+    """ Représente une réponse applicative 
+    
+        Le corps est une file bornée de morceaux : les écritures sont regroupées jusqu'à
+        *chunk_size* octets, puis le morceau est publié et CEF relancé, sans attendre la
+        fin du traitement. Lorsque *max_chunks* morceaux attendent d'être lus, l'écriture
+        est bloquée (contre-pression) : la mémoire de la réponse reste bornée.
+    """
+    def __init__(self, resource_handler: AppResourceHandler, status: int, headers, chunk_size: int = 64 * 1024, max_chunks: int = 16):
         self.closed = False
         
         self.status = status
@@ -125,38 +180,148 @@ class AppResponse:
 
         self.resource_handler = resource_handler
 
-        self._written = 0
-        self._read = 0
+        self.chunk_size = chunk_size
+        self.max_chunks = max_chunks
+        # Morceaux publiés, et position de lecture dans le premier morceau.
+        self.chunks: deque[memoryview] = deque()
+        self._offset = 0
+        # Ecritures en attente de publication.
+        self.buffer = bytearray()
+        # Ecrite par le fil de travail, lue par le fil IO de CEF.
+        self.cond = threading.Condition()
     
     def write(self, b: bytes) -> int:
-        self.stream.seek(self._written)
-        written = self.stream.write(b)
-        self._written += written
-        return written
-
-    def read(self, size: int =-1) -> bytes:
-        self.stream.seek(self._read)
-        chunk = self.stream.read(size)
-        self._read += len(chunk)
-        return chunk
+        with self.cond:
+            self._check_cancelled()
+
+            if not self.buffer and isinstance(b, bytes) and len(b) >= self.chunk_size:
+                # Gros fragment immuable (ex: un asset) : publié tel quel, sans copie.
+                self.buffer = b
+            else:
+                self.buffer += b
+
+            publish = len(self.buffer) >= self.chunk_size
+
+            if publish:
+                self._publish()
+
+        if publish:
+            self.resource_handler.resume()
+
+        return len(b)
+
+    def _check_cancelled(self):
+        if self.resource_handler.cancelled.is_set():
+            raise RequestCancelled()
+
+    def _publish(self):
+        """ Publie le tampon d'écriture comme un morceau (le verrou est tenu) """
+        if not self.buffer:
+            return
+
+        while len(self.chunks) >= self.max_chunks:
+            self._check_cancelled()
+            self.cond.wait(timeout=0.5)
+
+        self._check_cancelled()
+
+        # Le tampon est cédé à la file (pas de copie), un nouveau tampon est alloué.
+        self.chunks.append(memoryview(self.buffer))
+        self.buffer = bytearray()
+
+    def read(self, size: int = -1, callback=None) -> memoryview:
+        """ Lit au plus *size* octets du premier morceau publié (tranche, sans copie).
+
+            Si aucun morceau n'est disponible, la *callback* de CEF est conservée et
+            sera relancée à la prochaine publication.
+        """
+        with self.cond:
+            if not self.chunks:
+                if callback is not None and not self.closed:
+                    self.resource_handler.wait(callback)
+
+                return memoryview(b"")
+
+            chunk = self.chunks[0]
+            end = len(chunk) if size < 0 else min(len(chunk), self._offset + size)
+            view = chunk[self._offset:end]
+            self._offset = end
+
+            if self._offset >= len(chunk):
+                self.chunks.popleft()
+                self._offset = 0
+                # Libère un écrivain bloqué par la contre-pression.
+                self.cond.notify_all()
+
+            return view
     
+    def pending(self) -> bool:
+        """ Vérifie s'il reste des données à lire """
+        with self.cond:
+            return bool(self.chunks or self.buffer)
+
+    def abort(self):
+        """ Réveille un écrivain bloqué (requête annulée) """
+        with self.cond:
+            self.cond.notify_all()
+
     def flush(self):
+        """ Publie les écritures en attente, et relance CEF """
+        with self.cond:
+            self._publish()
+
         self.resource_handler.resume()
 
     def close(self):
         """ Ferme le flux de réponse """
-        self.closed = True
-        self.flush()
+        with self.cond:
+            if not self.resource_handler.cancelled.is_set():
+                self._publish()
+
+            self.closed = True
+
+        self.resource_handler.resume()
 
 class AppResourceHandler:
-    """ Gère la resource applicative """
-    def __init__(self, app: App):
+    """ Gère la resource applicative 
+    
+        La requête est traitée par un fil du pool de travail : ProcessRequest retourne
+        immédiatement, et CEF est relancé (callback.Continue) dès que les en-têtes,
+        puis les données, sont disponibles.
+    """
+    def __init__(self, app: App, workers: ThreadPoolExecutor):
         _logger.info("Requête applicative détectée")
         self.app = app
+        self.workers = workers
+        self.request = None
+        self.response: Optional[AppResponse] = None
+        self.future = None
+        self.cancelled = threading.Event()
+
+        # Callback de CEF en attente d'un Continue (en-têtes ou données)
+        self.lock = threading.Lock()
+        self.callback = None
+        self.waiting = False
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done() and (self.response is None or self.response.closed)
+
+    def wait(self, callback):
+        """ Conserve la callback de CEF, relancée au prochain resume """
+        with self.lock:
+            self.callback = callback
+            self.waiting = True
 
     def resume(self):
         """ Poursuit la gestion de la ressource """
-        self.callback.Continue()
+        with self.lock:
+            if not self.waiting:
+                return
+
+            self.waiting = False
+            callback = self.callback
+
+        callback.Continue()
 
     def ProcessRequest(self, request, callback) -> bool:
         """
@@ -172,14 +337,35 @@ class AppResourceHandler:
         _logger.info(f"Démarre le traitement de la requête applicative {request.GetUrl()}")
 
         self.request = request
-        self.callback = callback
-
-        self.app.process(
-            AppRequestContext(resource_handler=self)
-        )
+        self.wait(callback)
+        self.future = self.workers.submit(self._process)
 
         return True
 
+    def _process(self):
+        """ Traite la requête (fil du pool de travail) """
+        ctx = AppRequestContext(resource_handler=self)
+
+        try:
+            self.app.process(ctx)
+
+        except RequestCancelled:
+            _logger.info(f"Requête annulée: {ctx.uri()}")
+
+        except Exception as e:
+            _logger.exception(e)
+
+            if self.response is None:
+                resp = ctx.response(status=500).set_header("Content-Type", "text/plain").build()
+                resp.write(f"Erreur: {e}".encode("utf8"))
+
+        finally:
+            if self.response is None:
+                ctx.response(status=204).build()
+
+            if not self.response.closed:
+                self.response.close()
+
     def GetResponseHeaders(self, response: cef.Response, responseLengthOut: list[int], redirectUrlOut: list[str]):
         """
             Retrieve response header information. 
@@ -210,7 +396,7 @@ class AppResourceHandler:
             response.SetMimeType("text/plain")
   
         if "Content-Length" in resp.headers:
-            responseLengthOut[0] = resp.headers['Content-Length']
+            responseLengthOut[0] = int(resp.headers['Content-Length'])
         else:
             responseLengthOut[0] = -1
 
@@ -226,20 +412,24 @@ class AppResourceHandler:
             
             To indicate response completion return false.
         """       
-        # Redonne le nouvelle callback pour la suite de l'écriture dans le flux.
-        self.callback = callback
-
         # On a de la donnée à envoyer dans le flux. 
-        chunk = self.response.read(size=bytes_to_read)
-
-        data_out[0] = chunk
-        bytes_read_out[0] = len(chunk)
+        # Sinon, la callback est conservée pour la suite de l'écriture dans le flux.
+        chunk = self.response.read(size=bytes_to_read, callback=callback)
 
         if chunk:
+            # CEF attend un objet bytes : seule copie du corps de la réponse.
+            data_out[0] = chunk.tobytes()
+            bytes_read_out[0] = len(chunk)
             return True
 
+        bytes_read_out[0] = 0
+
         # Le flux de la réponse est fermée
-        return not self.response.closed
+        if self.response.closed and not self.response.pending():
+            return False
+
+        # Pas encore de données : CEF attend la prochaine publication.
+        return True
 
     def CanGetCookie(self, cookie):
         # Return true if the specified cookie can be sent
@@ -255,7 +445,17 @@ class AppResourceHandler:
 
     def Cancel(self):
         # Request processing has been canceled.
-        pass
+        _logger.info("Annulation de la requête applicative")
+        self.cancelled.set()
+
+        with self.lock:
+            self.waiting = False
+
+        if self.response is not None:
+            self.response.abort()
+
+        if self.future is not None:
+            self.future.cancel()
 
 class AppRequestHandler:
     """ Gère la vie de la requête vers l'application """
@@ -291,10 +491,22 @@ class AppRequestHandler:
 def init(args):
     sys.excepthook = cef.ExceptHook
 
-    app = App()
+    jewel, watcher = (None, None)
+
+    if args.root:
+        from boic import jewel as J
+        from boic.watcher import Watcher
+
+        jewel = J.open(args.root)
+        # Maintient les index à jour : chaque modification incrémente la génération du Jewel (cache des pages).
+        watcher = Watcher(jewel)
+        watcher.start()
+
+    app = App(jewel=jewel)
 
     _logger.info("Création de l'interface client avec CEF")
-    client_handler = ClientHandler(app=app)
+    workers = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="boic-app")
+    client_handler = ClientHandler(app=app, workers=workers)
 
     _logger.info("Initialise CEF")
     cef.Initialize()
@@ -308,6 +520,12 @@ def init(args):
 
     del browser
 
+    if watcher:
+        watcher.stop()
+
+    _logger.info("Arrête les fils de travail")
+    workers.shutdown(wait=False, cancel_futures=True)
+
     _logger.info("Arrête CEF")
     cef.Shutdown()
 
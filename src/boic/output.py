@@ -0,0 +1,110 @@
+""" Ecriture des résultats d'une requête (boic execute --format)
+
+Les lignes sont données par un itérateur de (colonnes, valeurs) : les colonnes sont celles
+de la première ligne, une colonne absente d'une ligne a la valeur MISSING (cf. sql.stream).
+
+Formats :
+- csv, tsv : une ligne d'en-tête, puis une ligne par résultat (valeur absente : vide) ;
+- jsonl : un objet JSON par ligne (les colonnes absentes sont omises) ;
+- table : tableau aligné (lu en entier avant d'être affiché).
+
+Les formats csv, tsv et jsonl sont écrits ligne à ligne : la mémoire ne dépend pas du
+nombre de lignes, et la première ligne sort dès qu'elle est lue.
+"""
+from __future__ import annotations
+from typing import TextIO
+from collections.abc import Iterable
+import csv
+import json
+
+FORMATS = ("table", "csv", "tsv", "jsonl")
+
+class _Missing:
+    """ Valeur d'une colonne absente de la ligne """
+    def __repr__(self) -> str:
+        return "MISSING"
+
+MISSING = _Missing()
+
+def plain(value: any) -> any:
+    """ Valeur sérialisable en JSON (les ShardValue sont déballées) """
+    value = getattr(value, "value", value)
+
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+
+    if isinstance(value, (list, tuple)):
+        return [plain(item) for item in value]
+
+    if isinstance(value, dict):
+        return {str(key): plain(item) for key, item in value.items()}
+
+    return str(value)
+
+def text(value: any) -> str:
+    """ Valeur d'une cellule CSV/TSV (listes et dictionnaires en JSON) """
+    if value is MISSING:
+        return ""
+
+    value = plain(value)
+
+    if value is None:
+        return ""
+
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+
+    return str(value)
+
+def write(rows: Iterable[tuple[list[str], list[any]]], format: str, file: TextIO) -> int:
+    """ Ecrit les lignes dans le format donné, retourne le nombre de lignes """
+    if format not in FORMATS:
+        raise ValueError(f"Format inconnu : {format} (disponibles : {', '.join(FORMATS)})")
+
+    if format == "table":
+        return _write_table(rows, file)
+
+    count = 0
+    writer = None
+
+    if format in ("csv", "tsv"):
+        writer = csv.writer(file, delimiter="\t" if format == "tsv" else ",", lineterminator="\n")
+
+    for columns, values in rows:
+        if writer is None:
+            record = {column: plain(value) for column, value in zip(columns, values) if value is not MISSING}
+            file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        else:
+            if count == 0:
+                writer.writerow(columns)
+
+            writer.writerow([text(value) for value in values])
+
+        count += 1
+
+    return count
+
+def _cell(value: any) -> str:
+    if value is MISSING:
+        return "N/D"
+
+    # Les ShardValue s'affichent en YAML ; les valeurs déjà déballées (ex: lues du démon) en JSON.
+    return str(value) if hasattr(value, "value") else text(value)
+
+def _write_table(rows: Iterable[tuple[list[str], list[any]]], file: TextIO) -> int:
+    from prettytable import PrettyTable
+
+    table = PrettyTable()
+    table.align = "l"
+    table.preserve_internal_border = True
+
+    for columns, values in rows:
+        if not table.field_names:
+            table.field_names = columns
+
+        table.add_row([_cell(value) for value in values])
+
+    if table.field_names:
+        print(table, file=file)
+
+    return len(table.rows)
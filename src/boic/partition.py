@@ -0,0 +1,128 @@
+""" Partitionnement des Shards selon la structure du dossier AIOT (config.aiot.dir)
+
+Chaque type de Shard est associé aux répertoires de la structure qui peuvent le
+contenir, et les composantes du chemin sous ces répertoires sont associées à des
+colonnes (ex: 02_inspections/<YYYY>/... porte l'année de date_inspection).
+
+Cela permet d'élaguer le parcours du Jewel (JewelPath.walk) avant de descendre
+dans des répertoires qui ne peuvent pas contenir de Shards répondant à la requête.
+"""
+from __future__ import annotations
+from typing import Optional, Callable, TYPE_CHECKING
+from datetime import datetime
+
+if TYPE_CHECKING:
+    from boic.jewel import Jewel, JewelPath
+
+# Borne d'une colonne : (colonne, min, max, min inclus, max inclus)
+Bound = tuple[str, any, any, bool, bool]
+
+# Unité de la période couverte par une composante, selon la directive la plus fine du format.
+_PERIODS = [("%d", "DAY"), ("%m", "MONTH"), ("%Y", "YEAR"), ("%y", "YEAR")]
+
+class Component:
+    """ Composante du chemin portant la valeur d'une colonne (ex: l'année) """
+    def __init__(self, column: str, format: Optional[str] = None):
+        self.column = column
+        self.format = format
+        self.unit = next((unit for directive, unit in _PERIODS if format and directive in format), None)
+
+    def span(self, segment: str) -> Optional[tuple[any, any]]:
+        """ Retourne la plage [début, fin] de valeurs couverte par le répertoire, ou None si inconnue """
+        if not self.format:
+            return (segment, segment)
+
+        from boic.sql.eval import shift
+
+        try:
+            start = datetime.strptime(segment, self.format).date()
+        except ValueError:
+            return None
+
+        end = shift(shift(start, 1, self.unit), -1, "DAY") if self.unit else start
+        return (start, end)
+
+class Partition:
+    """ Répertoires de la structure AIOT pouvant contenir un type de Shard """
+    def __init__(self, jewel: Jewel, type: str, dirs: list[str], components: list[dict]):
+        self.jewel = jewel
+        self.type = type
+
+        layout = jewel.config.aiot.dir
+        self.layout = {dirname for _, dirname in layout.items()}
+        self.dirs = {layout[key] for key in dirs}
+        self.components = [Component(**spec) for spec in components]
+
+    def columns(self) -> list[str]:
+        return [component.column for component in self.components]
+
+    def pruner(self, bounds: Optional[list[Bound]] = None) -> Callable[[JewelPath], bool]:
+        """ Génère la fonction d'élagage du parcours.
+
+            La fonction retourne True si le répertoire ne peut pas contenir de Shard
+            du type de la partition respectant l'ensemble des bornes (conjonction).
+        """
+        from boic.sql.eval import coerce
+
+        types = self.jewel.config.columns
+        restricted = [[] for _ in self.components]
+
+        for column, low, high, _, _ in bounds or []:
+            typ = types[column] if column in types.keys() else None
+
+            for rank, component in enumerate(self.components):
+                if component.column == column:
+                    restricted[rank].append((coerce(low, typ), coerce(high, typ)))
+
+        def prune(path: JewelPath) -> bool:
+            segments = path.segments
+
+            # Premier répertoire de la structure AIOT dans le chemin.
+            rank = next((i for i, segment in enumerate(segments) if segment in self.layout), None)
+
+            if rank is None:
+                return False
+
+            if segments[rank] not in self.dirs:
+                return True
+
+            for segment, component, bounds in zip(segments[rank + 1:], self.components, restricted):
+                span = component.span(segment) if bounds else None
+
+                if span is None:
+                    continue
+
+                start, end = span
+
+                for low, high in bounds:
+                    try:
+                        if (low is not None and end < low) or (high is not None and start > high):
+                            return True
+                    except TypeError:
+                        continue
+
+            return False
+
+        return prune
+
+class PartitionManager:
+    """ Gestionnaire des partitions déclarées dans la configuration (aiot.partitions) """
+    def __init__(self, jewel: Jewel):
+        self.jewel = jewel
+        self.partitions = {
+            type.lower(): Partition(
+                jewel=jewel,
+                type=type,
+                dirs=spec.get("dirs", []),
+                components=spec.get("components", [])
+            )
+            for type, spec in jewel.config.aiot.partitions.items()
+        }
+
+    def find(self, type: Optional[str]) -> Optional[Partition]:
+        """ Retourne la partition du type de Shard (le type est un préfixe, cf. Shard.is_type) """
+        if not type:
+            return None
+
+        type = type.lower()
+        return next((p for t, p in self.partitions.items() if type.startswith(t)), None)
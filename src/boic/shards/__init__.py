@@ -1,14 +1,35 @@
 from __future__ import annotations
+from collections.abc import Iterator, Iterable, Callable
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
 import json
-import markdown
+import os
+import threading
 import frontmatter
 from boic.jewel import Jewel, JewelPath
+from boic.tree import Changes
 from enum import Enum
 
 import logging
 
 _logger = logging.getLogger(__name__)
 
+# Identifiants des Shards déréférencés (liens jewel://) dans le contexte courant (cf. record_dereferences)
+_dereferences: ContextVar[Optional[set[str]]] = ContextVar("dereferences", default=None)
+
+@contextmanager
+def record_dereferences() -> Iterator[set[str]]:
+    """ Enregistre les Shards déréférencés (liens jewel://) dans le bloc, ex: pendant un rendu """
+    ids = set()
+    token = _dereferences.set(ids)
+
+    try:
+        yield ids
+    finally:
+        _dereferences.reset(token)
+
 class ShardType(Enum):
     AIOT = "AIOT"
 
@@ -24,9 +45,7 @@ class ShardValue:
         elif isinstance(self.value, list):
             return ShardValue(jewel=self.jewel, value=self.value[key])
         elif self.is_shard_uri():
-            if not self.cached_shard:
-                self.cached_shard = self.get_shard()
-            return self.cached_shard[key]
+            return self.shard()[key]
         else:
             raise ValueError(f"Not a shard or a dictionnary to access property {key}")
     
@@ -34,19 +53,15 @@ class ShardValue:
         if isinstance(self.value, dict):
             return key in self.value
         elif self.is_shard_uri():
-            if not self.cached_shard:
-                self.cached_shard = self.get_shard()
-            return key in self.cached_shard
+            return key in self.shard()
         else:
             raise ValueError("Not a shard or a dictionnary")
 
     def keys(self):
         if isinstance(self.value, dict):
             return self.value.keys()
-        elif self.is_shard_uri(self):
-            if not self.cached_shard:
-                self.cached_shard = self.get_shard()
-            return self.cached_shard.keys()   
+        elif self.is_shard_uri():
+            return self.shard().keys()
         else:
             raise ValueError("Not a shard or a dictionnary")
 
@@ -56,6 +71,19 @@ class ShardValue:
     def upper(self):
         return self.value.upper()
 
+    def shard(self) -> Shard:
+        """ Retourne le Shard référencé, chargé au premier accès """
+        if not self.cached_shard:
+            self.cached_shard = self.get_shard()
+
+        recorded = _dereferences.get()
+
+        if recorded is not None:
+            # jewel.path(jewel://...) garde le segment de la racine : l'identifiant est normalisé.
+            recorded.add("/" + "/".join(filter(None, self.cached_shard.path.segments)))
+
+        return self.cached_shard
+
     def get_shard(self) -> Shard:
         """ Charge le Shard si la valeur est un chemin absolu ou un Jewel URI"""
         path = self.jewel.path(self.value)
@@ -97,7 +125,7 @@ class Shard:
         return self[key]
 
     def __contains__(self, key: str) -> bool:
-        return key in self.meta
+        return key in self.meta or key in ("path", "id")
 
     def __setitem__(self, key: str, value: any):
         self.meta[key] = value
@@ -112,8 +140,6 @@ class Shard:
         with path.open(mode="r") as file:
             content = file.read()
             meta, content = frontmatter.parse(content)
-            md = markdown.Markdown(extensions = ['meta'])
-            md.convert(content)
             return Shard(path, content, meta)
 
     def keys(self):
@@ -129,50 +155,210 @@ class Shard:
             
         return "type" in self.keys() and self["type"].lower().startswith(typ.lower())
 
-def build_primary_index(jewel: Jewel, max_depth=None):
-    """ Construit l'index primaire des Shards"""
-    with jewel.path('/', jewel.config.indexes.dir, 'primary').open(mode='w') as file:
-        for shard in scan_shards(jewel, max_depth=max_depth):
-            _logger.info(f"Indexing: {shard}")
-            file.write(f"{shard.path}\n")
+class ShardCache:
+    """ Cache des Shards chargés (métadonnées et contenu)
 
-def get_primary_index(jewel: Jewel) -> BPlusTree:
-    """ Récupère un index à partir de son nom """
-    
-    return None
+        Chaque entrée est validée par l'empreinte du fichier (mtime, taille) avant d'être 
+        resservie ; le watcher invalide explicitement les Shards modifiés.
+    """
+    def __init__(self, capacity: int = 4096):
+        self.capacity = capacity
+        self.entries: OrderedDict[str, tuple[tuple[int, int], Shard]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def load(self, path: JewelPath) -> Shard:
+        id = "/".join(path.segments)
+        st = os.stat(path.canonicalize())
+        fingerprint = (st.st_mtime_ns, st.st_size)
+
+        with self.lock:
+            cached = self.entries.get(id)
+
+            if cached and cached[0] == fingerprint:
+                self.entries.move_to_end(id)
+                return cached[1]
+
+        shard = Shard.load(path)
+
+        with self.lock:
+            self.entries[id] = (fingerprint, shard)
+            self.entries.move_to_end(id)
+
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+        return shard
+
+    def invalidate(self, id: str):
+        with self.lock:
+            self.entries.pop(id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+def cache(jewel: Jewel) -> ShardCache:
+    """ Retourne le cache des Shards du Jewel """
+    if jewel.shard_cache is None:
+        jewel.shard_cache = ShardCache()
+
+    return jewel.shard_cache
+
+def build_indexes(jewel: Jewel, max_depth=None, incremental=False, deep=False):
+    """ Construit l'index primaire et les index secondaires des Shards en un seul parcours.
+
+        En mode incrémental, seuls les Shards ajoutés, modifiés ou supprimés depuis la 
+        dernière construction (cf. boic.tree) sont ré-indexés.
+    """
+    if not incremental:
+        jewel.tree.reset()
+
+        for index in jewel.index:
+            index.clear()
+
+    changes = jewel.tree.refresh(deep=deep or not incremental, max_depth=max_depth)
+    _logger.info(f"Modifications détectées: {changes!r}")
+
+    update_indexes(jewel, changes, full=not incremental)
+    jewel.tree.flush()
+
+def update_indexes(jewel: Jewel, changes: Changes, full=False):
+    """ Applique les modifications à l'index primaire et aux index secondaires """
+    primary = jewel.path(jewel.config.indexes.dir, 'primary')
+    ids = set()
+
+    if not full and primary.exists():
+        with primary.open(mode='r') as file:
+            ids = {line.strip().removeprefix("jewel://") for line in file if line.strip()}
+
+    indexes = list(jewel.index)
+    shard_cache = cache(jewel)
+
+    for id in changes.removed | changes.modified:
+        ids.discard(id)
+        shard_cache.invalidate(id)
+
+        for index in indexes:
+            index.remove(id)
+
+    for shard in iter_by_ids(jewel, sorted(changes.added | changes.modified)):
+        _logger.info(f"Indexing: {shard}")
+        ids.add(shard["id"])
+
+        for index in indexes:
+            index.add(shard)
+
+    jewel.path(jewel.config.indexes.dir).mkdir()
+
+    with primary.open_atomic() as file:
+        file.write("".join(f"jewel://{id}\n" for id in sorted(ids)))
+
+    for index in indexes:
+        _logger.info(f"Ecriture de l'index: {index.schema.name}")
+        index.flush()
+
+    jewel.touch()
+
+def indexes_current(jewel: Jewel) -> bool:
+    """ Retourne True si les index reflètent le Jewel : un watcher les maintient à jour (cf. boic.watcher)
+        et aucune modification marquée n'attend d'être appliquée.
+
+        Sinon, les requêtes parcourent le Jewel : un Shard créé depuis la dernière construction
+        des index (build:index) en serait absent.
+    """
+    return jewel.tree.watched() and not jewel.tree.pending()
+
+def within_depth(id: str, max_depth=None) -> bool:
+    """ Retourne True si le Shard est à la profondeur maximale au plus (cf. JewelPath.walk) """
+    return not max_depth or id.count("/") - 1 <= max_depth
+
+def get_primary_index(jewel: Jewel) -> Optional[list[str]]:
+    """ Récupère l'index primaire (identifiants des Shards), s'il a été construit """
+    primary = jewel.path(jewel.config.indexes.dir, 'primary')
+
+    if not primary.exists():
+        return None
+
+    with primary.open(mode='r') as file:
+        return [line.strip().removeprefix("jewel://") for line in file if line.strip()]
     
-def scan_shards(jewel: Jewel, max_depth=None):
-    """ Itère en parcourant l'ensemble du Jewel """
-    for _root, _dirs, files in jewel.root().walk(max_depth=max_depth):
+def scan_shards(jewel: Jewel, max_depth=None, prune: Optional[Callable[[JewelPath], bool]] = None, after: Optional[str] = None):
+    """ Itère en parcourant l'ensemble du Jewel (hors répertoires élagués) """
+    shard_cache = cache(jewel)
+    files = (
+        file
+        for _root, _dirs, files in jewel.root().walk(max_depth=max_depth, prune=prune, suffixes=(".md",))
+        for file in files
+        if file.suffixes and file.suffixes[-1] == ".md"
+    )
+
+    # Ordre des identifiants : seuls les chemins sont gardés en mémoire, les Shards sont chargés au fil de l'eau.
+    if after is not None:
+        files = sorted(
+            (file for file in files if "/".join(file.segments) > after),
+            key=lambda file: "/".join(file.segments)
+        )
+
+    for file in files:
+        yield shard_cache.load(file)
+
+def iter_ids(jewel: Jewel, max_depth=None) -> Iterator[str]:
+    """ Itère sur les identifiants des Shards, sans les charger (index primaire à jour, ou parcours) """
+    index = get_primary_index(jewel) if indexes_current(jewel) else None
+
+    if index is not None:
+        yield from (id for id in index if within_depth(id, max_depth))
+        return
+
+    for _root, _dirs, files in jewel.root().walk(max_depth=max_depth, suffixes=(".md",)):
         for file in files:
             if file.suffixes and file.suffixes[-1] == ".md":
-                shard = Shard.load(file)
-                yield shard
+                yield "/".join(file.segments)
 
-def iter_by_primary_index(jewel: Jewel, max_depth=None):
-    """ Itère en partant de l'index primaire de Shards """
-    index = get_primary_index(jewel)
+def iter_by_primary_index(jewel: Jewel, max_depth=None, prune: Optional[Callable[[JewelPath], bool]] = None, after: Optional[str] = None):
+    """ Itère en partant de l'index primaire de Shards, s'il est à jour """
+    index = get_primary_index(jewel) if indexes_current(jewel) else None
     
     # Par défaut, on replie sur une itération brute.
     if index is None:
-        yield from scan_shards(jewel, max_depth=max_depth)
+        yield from scan_shards(jewel, max_depth=max_depth, prune=prune, after=after)
         return
 
-    for path in index.values():
-        shard_path = jewel.path(path.decode())
-        yield Shard.load(shard_path)
+    if max_depth:
+        index = [id for id in index if within_depth(id, max_depth)]
+
+    if after is not None:
+        index = sorted(id for id in index if id > after)
 
-    indexes.close()
+    if prune:
+        index = filter(lambda id: not prune(JewelPath.from_str(jewel, id).parent()), index)
 
-def iter(jewel: Jewel, max_depth=None, skip_indexes=False) -> Iterator[Shard]:
+    yield from iter_by_ids(jewel, index)
+
+def iter(jewel: Jewel, max_depth=None, skip_indexes=False, prune: Optional[Callable[[JewelPath], bool]] = None, after: Optional[str] = None) -> Iterator[Shard]:
     """Itère sur l'ensemble des fragments en partant de la racine.
+
+        *prune* permet d'élaguer les répertoires qui ne peuvent pas contenir les Shards recherchés.
+        *after* (pagination par clé) itère par identifiant croissant, à partir du Shard suivant 
+        l'identifiant donné ("" pour partir du début).
     """
     if skip_indexes:
-        yield from scan_shards(jewel, max_depth=max_depth)
+        yield from scan_shards(jewel, max_depth=max_depth, prune=prune, after=after)
+        return
     
-    yield from iter_by_primary_index(jewel, max_depth=max_depth)
+    yield from iter_by_primary_index(jewel, max_depth=max_depth, prune=prune, after=after)
+
+def iter_by_ids(jewel: Jewel, ids: Iterable[str]) -> Iterator[Shard]:
+    """ Itère sur les Shards à partir de leurs identifiants (ex: retournés par un index secondaire) """
+    shard_cache = cache(jewel)
+
+    for id in ids:
+        try:
+            yield shard_cache.load(JewelPath.from_str(jewel, id))
+        except FileNotFoundError:
+            _logger.debug(f"Shard indexé introuvable: {id}")
     
 
 def load(path: JewelPath) -> Shard:
     """ Charge un Shard à partir de son chemin """
-    return Shard.load(path)
+    return cache(path.jewel).load(path)
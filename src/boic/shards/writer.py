@@ -0,0 +1,285 @@
+""" Ecriture des Shards (requêtes ShQL INSERT et UPDATE)
+
+Une mise à jour ne réécrit que le bloc frontmatter : le corps du Shard est conservé à
+l'octet près, fins de ligne comprises. Les clés modifiées sont remplacées à leur place, les
+nouvelles ajoutées à la fin du bloc ; le reste du bloc (ordre, commentaires, style) n'est
+pas touché. Si le bloc ne peut pas être modifié ligne à ligne (ex: style de flux, clés en
+double), il est entièrement réécrit.
+
+Les écritures d'une requête sont groupées (ShardWriter) : chaque Shard est écrit et synchronisé
+(fsync) dans un fichier temporaire de son répertoire ; une fois tous les fichiers écrits, ils
+sont renommés (atomiquement) à la place des Shards, puis les répertoires sont synchronisés.
+Un arrêt brutal laisse chaque Shard dans son ancien ou son nouvel état, jamais tronqué. La
+requête n'est en revanche pas atomique dans son ensemble : un échec pendant les renommages
+laisse les Shards déjà renommés dans leur nouvel état. L'arbre des répertoires et les index
+sont ensuite mis à jour une seule fois.
+"""
+from __future__ import annotations
+from typing import Optional, TYPE_CHECKING
+import logging
+import os
+import pathlib
+import re
+
+import yaml
+
+if TYPE_CHECKING:
+    from boic.jewel import Jewel, JewelPath
+
+try:
+    from yaml import CSafeLoader as _Loader, CSafeDumper as _Dumper
+except ImportError:
+    from yaml import SafeLoader as _Loader, SafeDumper as _Dumper
+
+_logger = logging.getLogger(__name__)
+
+# Délimiteur du bloc frontmatter (cf. frontmatter.YAMLHandler.FM_BOUNDARY)
+_BOUNDARY = re.compile(r"-{3,}\s*")
+
+# Clé de premier niveau : "clé", 'clé' ou clé, suivie de ":" (et d'une valeur, ou de la fin de ligne, LF ou CRLF)
+_KEY = re.compile(r"""(?:"(?P<double>[^"\\]*)"|'(?P<single>[^']*)'|(?P<plain>[^\s#'"\-\[\]{}?:][^#]*?|-[^\s#][^#]*?))[ \t]*:(?:[ \t]|\r?$)""")
+
+def dump(values: dict[str, any], newline: str = "\n") -> str:
+    """ Sérialise les valeurs en YAML (bloc), avec les fins de ligne du Shard """
+    if not values:
+        return ""
+
+    text = yaml.dump(values, Dumper=_Dumper, allow_unicode=True, default_flow_style=False, sort_keys=False)
+    return text.replace("\n", newline) if newline != "\n" else text
+
+def split(text: str) -> Optional[tuple[str, str, str]]:
+    """ Découpe le Shard en (ouverture, bloc frontmatter, fermeture et corps), ou None s'il n'a pas de frontmatter """
+    lines = text.splitlines(keepends=True)
+
+    if not lines or not _BOUNDARY.fullmatch(lines[0].lstrip("\ufeff")):
+        return None
+
+    for i in range(1, len(lines)):
+        if _BOUNDARY.fullmatch(lines[i]):
+            return (lines[0], "".join(lines[1:i]), "".join(lines[i:]))
+
+    return None
+
+def _key(line: str) -> Optional[str]:
+    """ Clé de premier niveau définie par la ligne, ou None """
+    match = _KEY.match(line)
+
+    if match is None:
+        return None
+
+    return next(group for group in match.group("double", "single", "plain") if group is not None)
+
+def _blocks(lines: list[str]) -> dict[str, tuple[int, int]]:
+    """ Lignes [début, fin[ de chaque clé de premier niveau.
+
+        Une clé s'étend sur les lignes indentées qui la suivent (et les éléments de liste "- ") ;
+        les lignes vides et les commentaires qui la terminent n'en font pas partie.
+    """
+    blocks = {}
+    current, end = (None, 0)
+
+    for i, line in enumerate(lines):
+        if current is not None and line.strip() and (line[0] in " \t" or line.startswith("-")):
+            end = i + 1
+            continue
+
+        key = _key(line)
+
+        if key is not None or (line.strip() and not line.startswith("#")):
+            if current is not None:
+                if current in blocks:
+                    raise ValueError(f"Clé en double dans le frontmatter : {current}")
+
+                blocks[current] = (start, end)
+
+            current, start, end = (key, i, i + 1)
+
+    if current is not None:
+        if current in blocks:
+            raise ValueError(f"Clé en double dans le frontmatter : {current}")
+
+        blocks[current] = (start, end)
+
+    if None in blocks:
+        raise ValueError("Le frontmatter ne peut pas être modifié ligne à ligne.")
+
+    return blocks
+
+def patch(block: str, values: dict[str, any], newline: str = "\n") -> str:
+    """ Remplace (ou ajoute) les clés dans le bloc frontmatter, sans toucher aux autres lignes """
+    lines = block.splitlines(keepends=True)
+    blocks = _blocks(lines)
+    replacements = {}
+    appended = {}
+
+    for key, value in values.items():
+        if key in blocks:
+            replacements[blocks[key][0]] = (blocks[key][1], dump({key: value}, newline))
+        else:
+            appended[key] = value
+
+    patched = []
+    i = 0
+
+    while i < len(lines):
+        if i in replacements:
+            i, text = replacements[i]
+            patched.append(text)
+        else:
+            patched.append(lines[i])
+            i += 1
+
+    if patched and not patched[-1].endswith(("\n", "\r")):
+        patched.append(newline)
+
+    patched.append(dump(appended, newline))
+    patched = "".join(patched)
+
+    # Les fins de ligne du Shard (ex: CRLF) sont conservées : un bloc homogène le reste.
+    if all(line.endswith(newline) for line in lines) and any(not line.endswith(newline) for line in patched.splitlines(keepends=True)):
+        raise ValueError("Le frontmatter modifié mêle des fins de ligne différentes.")
+
+    # Le bloc modifié doit se relire avec les mêmes clés, et les nouvelles valeurs.
+    meta = yaml.load(patched, Loader=_Loader)
+
+    if not isinstance(meta, dict) or meta.keys() != blocks.keys() | values.keys() or any(meta[key] != value for key, value in values.items()):
+        raise ValueError("Le frontmatter modifié ne correspond pas aux valeurs attendues.")
+
+    return patched
+
+def update_frontmatter(text: str, values: dict[str, any]) -> str:
+    """ Met à jour les valeurs du frontmatter du Shard ; le corps est conservé à l'identique """
+    parts = split(text)
+
+    if parts is None:
+        newline = "\r\n" if "\r\n" in text[:text.find("\n") + 1] else "\n"
+        return f"---{newline}{dump(values, newline)}---{newline}{text}"
+
+    opening, block, rest = parts
+    newline = opening[len(opening.rstrip("\r\n")):] or "\n"
+
+    try:
+        patched = patch(block, values, newline)
+    except (ValueError, yaml.YAMLError) as e:
+        # Le bloc est entièrement réécrit.
+        _logger.debug(f"Réécriture complète du frontmatter: {e}")
+        meta = yaml.load(block, Loader=_Loader) or {}
+
+        if not isinstance(meta, dict):
+            raise ValueError("Le frontmatter du Shard n'est pas un dictionnaire.")
+
+        patched = dump({**meta, **values}, newline)
+
+    return opening + patched + rest
+
+def create_frontmatter(values: dict[str, any], content: str = "") -> str:
+    """ Contenu d'un nouveau Shard """
+    return f"---\n{dump(values)}---\n{content}"
+
+def _fsync_dir(directory: pathlib.Path):
+    """ Rend durables les entrées du répertoire (renommages) ; sans effet sous Windows """
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class ShardWriter:
+    """ Écritures groupées des Shards d'une requête """
+    def __init__(self, jewel: Jewel):
+        self.jewel = jewel
+        # Identifiant -> (Shard, contenu, création)
+        self.pending: dict[str, tuple[JewelPath, bytes, bool]] = {}
+
+    def create(self, path: JewelPath, values: dict[str, any], content: str = ""):
+        """ Ajoute un nouveau Shard """
+        id = "/".join(path.segments)
+
+        if id in self.pending or path.exists():
+            raise ValueError(f"Le Shard existe déjà : {path}")
+
+        self.pending[id] = (path, create_frontmatter(values, content).encode("utf-8"), True)
+
+    def update(self, path: JewelPath, values: dict[str, any]) -> bool:
+        """ Met à jour le frontmatter du Shard ; retourne False s'il est inchangé """
+        id = "/".join(path.segments)
+
+        if id in self.pending:
+            _, data, created = self.pending[id]
+        else:
+            data, created = (path.canonicalize().read_bytes(), False)
+
+        text = data.decode("utf-8")
+        updated = update_frontmatter(text, values)
+
+        if updated == text:
+            return False
+
+        self.pending[id] = (path, updated.encode("utf-8"), created)
+        return True
+
+    def commit(self) -> list[JewelPath]:
+        """ Ecrit les Shards (fichiers temporaires synchronisés, renommages, synchronisation des répertoires), 
+            et met à jour les index 
+        """
+        pending = list(self.pending.values())
+        self.pending = {}
+
+        if not pending:
+            return []
+
+        staged = []
+
+        try:
+            for path, data, created in pending:
+                target = path.canonicalize()
+
+                if created:
+                    target.parent.mkdir(parents=True, exist_ok=True)
+
+                tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+                staged.append((tmp, target, created))
+
+                with open(tmp, mode="wb") as file:
+                    file.write(data)
+                    file.flush()
+                    os.fsync(file.fileno())
+
+            # Vérifié avant le premier renommage, pour ne pas laisser la requête à moitié appliquée.
+            for tmp, target, created in staged:
+                if created and target.exists():
+                    raise FileExistsError(f"Le Shard a été créé entre-temps : {target}")
+
+            for tmp, target, created in staged:
+                os.replace(tmp, target)
+
+            for directory in sorted({target.parent for _, target, _ in staged}):
+                _fsync_dir(directory)
+        except BaseException:
+            for tmp, _, _ in staged:
+                tmp.unlink(missing_ok=True)
+
+            raise
+
+        paths = [path for path, _, _ in pending]
+        self.update_indexes(paths)
+        return paths
+
+    def update_indexes(self, paths: list[JewelPath]):
+        """ Marque les Shards écrits, puis met à jour les index (une seule fois) """
+        from boic import shards
+
+        shard_cache = shards.cache(self.jewel)
+
+        for path in paths:
+            shard_cache.invalidate("/".join(path.segments))
+
+        self.jewel.tree.invalidate_many(paths)
+
+        if shards.get_primary_index(self.jewel) is not None:
+            _logger.info("Mise à jour des index...")
+            shards.build_indexes(self.jewel, incremental=True)
@@ -1,29 +1,125 @@
-from typing import Generator
+from typing import Generator, Optional
+from collections.abc import Iterator
+from collections import OrderedDict
 import re
 import logging
+import threading
 
 from sqlglot import parse_one, exp
+from sqlglot.errors import OptimizeError
 from sqlglot.planner import Plan, Scan, Aggregate, Join, Sort, SetOperation
 from sqlglot.optimizer import optimize
 
 from boic.shards import Shard
+from boic.output import MISSING
 from boic import shards, jewel as J
 
 from .filter import filter_cursor
+from . import plan as P
 from .plan import generate_plan
-from .execution import execute_plan
+from .execution import execute_plan, Cursor
 
 logging.getLogger(__name__)
 
-def execute(jewel: J.Jewel, query: str, max_depth=None):
-    """ Execute la requête ShQL (Shard Query Language, un sous-ensemble du SQL), et retourne un curseur. """
+class PlanCache:
+    """ Cache des plans d'exécution, par requête.
+
+        Le plan dépend des index construits (cf. IndexManager.find) : ils font partie de la clé.
+        Les bornes des index et les filtres sont évalués à l'exécution, un plan peut donc être réutilisé.
+    """
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.entries: OrderedDict[tuple, P.Plan] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[P.Plan]:
+        with self.lock:
+            plan = self.entries.get(key)
+
+            if plan is not None:
+                self.entries.move_to_end(key)
+
+            return plan
+
+    def put(self, key: tuple, plan: P.Plan):
+        with self.lock:
+            self.entries[key] = plan
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+def plan_cache(jewel: J.Jewel) -> PlanCache:
+    """ Retourne le cache des plans d'exécution du Jewel """
+    if jewel.plan_cache is None:
+        jewel.plan_cache = PlanCache()
+
+    return jewel.plan_cache
+
+def prepare(jewel: J.Jewel, query: str) -> P.Plan:
+    """ Planifie la requête ShQL (ou récupère le plan du cache) """
+    key = (query.strip(), frozenset(index.schema.name for index in jewel.index if index.exists()))
+    cache = plan_cache(jewel)
+    cached = cache.get(key)
+
+    if cached is not None:
+        logging.debug(f"Plan d'exécution en cache: {query}")
+        return cached
+
     ast = parse_one(query)
-    optimized = optimize(ast)
+
+    try:
+        optimized = optimize(ast)
+    except OptimizeError:
+        # Les Shards n'ont pas de schéma : les colonnes ne peuvent pas toujours être résolues.
+        optimized = ast
 
     logging.debug(f"Requête: {query}")
     logging.debug(f"AST: {repr(optimized)}")
-    plan = generate_plan(optimized)
-    logging.debug(f"Plan d'exécution: {repr(plan)}")
-    return execute_plan(jewel, plan, max_depth=max_depth)
+    generated = generate_plan(optimized, indexes=jewel.index, partitions=jewel.partitions)
+    logging.debug(f"Plan d'exécution: {repr(generated)}")
+    cache.put(key, generated)
+    return generated
+
+def execute(jewel: J.Jewel, query: str, max_depth=None, after: Optional[str] = None) -> Cursor:
+    """ Execute la requête ShQL (Shard Query Language, un sous-ensemble du SQL), et retourne un curseur.
+
+        *after* (pagination par clé) : les Shards sont lus par identifiant croissant, 
+        à partir de celui qui suit l'identifiant donné ("" pour partir du début).
+    """
+    return execute_plan(jewel, prepare(jewel, query), max_depth=max_depth, after=after)
+
+def stream(cursor: Cursor) -> Iterator[tuple[list[str], list[any]]]:
+    """ Itère sur les lignes du curseur : (colonnes, valeurs), sans les garder en mémoire.
+
+        Les colonnes sont celles de la première ligne ; une colonne absente d'une ligne
+        (ex: SELECT * sur des Shards hétérogènes) a la valeur MISSING.
+    """
+    columns = None
+
+    for row_cursor in cursor:
+        keys = row_cursor.keys()
+
+        if columns is None:
+            columns = keys
+
+        if keys == columns:
+            yield (columns, list(row_cursor.row))
+        else:
+            values = dict(zip(keys, row_cursor.row))
+            yield (columns, [values.get(col, MISSING) for col in columns])
+
+def tabulate(cursor: Cursor) -> tuple[list[str], list[list[str]]]:
+    """ Lit le curseur de lignes en un tableau (colonnes, lignes), les valeurs absentes sont notées N/D. """
+    columns, rows = ([], [])
+
+    for columns, values in stream(cursor):
+        rows.append(["N/D" if value is MISSING else str(value) for value in values])
+
+    return (columns, rows)
 
 
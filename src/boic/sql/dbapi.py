@@ -0,0 +1,258 @@
+""" Interface DB-API 2.0 (PEP 249) des requêtes ShQL
+
+    from boic.sql import dbapi
+
+    with dbapi.connect("/chemin/du/jewel") as connection:
+        cursor = connection.cursor()
+        cursor.execute("SELECT nom, gun FROM aiot WHERE commune = ?", ("Lyon",))
+        columns = [d[0] for d in cursor.description]
+
+        while rows := cursor.fetchmany(500):
+            ...
+
+Les lignes sont des tuples, lus à la demande (fetchone, fetchmany, fetchall ou itération) :
+les valeurs sont déballées (pas de ShardValue), les listes deviennent des tuples et les
+dictionnaires sont copiés, une ligne lue ne change donc plus. Les colonnes (description)
+sont celles de la première ligne ; une colonne absente d'une ligne vaut None.
+
+Les paramètres (? et une séquence, ou :nom et un dictionnaire) sont liés dans l'arbre
+syntaxique de la requête, sous forme de littéraux : une valeur ne peut pas changer la requête.
+Les écritures (INSERT, UPDATE) sont validées à l'exécution (cf. boic.shards.writer) :
+rowcount donne le nombre de Shards écrits, commit est sans effet et rollback n'est pas supporté.
+"""
+from __future__ import annotations
+from typing import Optional, Union, TYPE_CHECKING
+from collections.abc import Iterator, Mapping, Sequence
+from datetime import date, datetime
+import itertools
+import pathlib
+
+from sqlglot import exp, parse_one
+from sqlglot.errors import SqlglotError
+
+if TYPE_CHECKING:
+    from boic.jewel import Jewel
+
+apilevel = "2.0"
+# Le module peut être partagé entre fils, pas les connexions.
+threadsafety = 1
+paramstyle = "qmark"
+
+class Error(Exception):
+    pass
+
+class Warning(Exception):
+    pass
+
+class InterfaceError(Error):
+    pass
+
+class DatabaseError(Error):
+    pass
+
+class ProgrammingError(DatabaseError, ValueError):
+    pass
+
+class NotSupportedError(DatabaseError):
+    pass
+
+def literal(value: any) -> exp.Expression:
+    """ Littéral ShQL de la valeur d'un paramètre """
+    if isinstance(value, datetime):
+        return exp.cast(exp.Literal.string(value.isoformat()), "timestamp")
+
+    if isinstance(value, date):
+        return exp.cast(exp.Literal.string(value.isoformat()), "date")
+
+    if isinstance(value, (list, tuple)):
+        return exp.Array(expressions=[literal(item) for item in value])
+
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return exp.convert(value)
+
+    raise ProgrammingError(f"Type de paramètre non supporté : {type(value).__name__}")
+
+def bind(operation: str, parameters: Optional[Union[Sequence, Mapping]] = None) -> str:
+    """ Lie les paramètres (? ou :nom) de la requête """
+    if not parameters and "?" not in operation and ":" not in operation:
+        return operation
+
+    parameters = parameters or ()
+
+    try:
+        ast = parse_one(operation)
+    except SqlglotError as e:
+        raise ProgrammingError(f"Requête invalide : {e}") from e
+
+    placeholders = list(ast.find_all(exp.Placeholder))
+
+    if not placeholders and not parameters:
+        return operation
+
+    if isinstance(parameters, Mapping):
+        for placeholder in placeholders:
+            if not placeholder.this or placeholder.this not in parameters:
+                raise ProgrammingError(f"Paramètre manquant : {placeholder.sql()}")
+
+            placeholder.replace(literal(parameters[placeholder.this]))
+    else:
+        if any(placeholder.this for placeholder in placeholders) or len(placeholders) != len(parameters):
+            raise ProgrammingError(f"La requête attend {len(placeholders)} paramètre(s) (?), {len(parameters)} donné(s).")
+
+        for placeholder, value in zip(placeholders, parameters):
+            placeholder.replace(literal(value))
+
+    return ast.sql()
+
+def _value(value: any) -> any:
+    value = getattr(value, "value", value)
+
+    if isinstance(value, list):
+        return tuple(_value(item) for item in value)
+
+    if isinstance(value, dict):
+        return {key: _value(item) for key, item in value.items()}
+
+    return value
+
+class Cursor:
+    """ Curseur DB-API : exécute une requête et lit ses lignes par lots """
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self.arraysize = 1
+        self.description: Optional[tuple[tuple, ...]] = None
+        self.rowcount = -1
+        self.rows: Optional[Iterator[tuple]] = None
+        self.closed = False
+
+    def execute(self, operation: str, parameters: Optional[Union[Sequence, Mapping]] = None) -> Cursor:
+        from boic import output, sql
+        from .execution import CountCursor
+
+        self._check()
+        query = bind(operation, parameters)
+        self.description, self.rowcount, self.rows = (None, -1, None)
+
+        try:
+            cursor = sql.execute(self.connection.jewel, query, max_depth=self.connection.max_depth)
+        except ProgrammingError:
+            raise
+        except (ValueError, SqlglotError) as e:
+            raise ProgrammingError(str(e)) from e
+
+        if isinstance(cursor, CountCursor):
+            self.rowcount = cursor.count
+            return self
+
+        if not cursor.is_row_cursor():
+            return self
+
+        stream = sql.stream(cursor)
+        first = next(stream, None)
+
+        if first is None:
+            self.description, self.rows = ((), iter(()))
+            return self
+
+        missing = output.MISSING
+        self.description = tuple((column, None, None, None, None, None, None) for column in first[0])
+        self.rows = (
+            tuple(None if value is missing else _value(value) for value in values)
+            for _, values in itertools.chain((first,), stream)
+        )
+        return self
+
+    def executemany(self, operation: str, seq_of_parameters: Sequence[Union[Sequence, Mapping]]):
+        rowcount = 0
+
+        for parameters in seq_of_parameters:
+            self.execute(operation, parameters)
+            rowcount += max(self.rowcount, 0)
+
+        self.rowcount = rowcount
+
+    def fetchone(self) -> Optional[tuple]:
+        return next(self._rows(), None)
+
+    def fetchmany(self, size: Optional[int] = None) -> list[tuple]:
+        return list(itertools.islice(self._rows(), self.arraysize if size is None else size))
+
+    def fetchall(self) -> list[tuple]:
+        return list(self._rows())
+
+    def __iter__(self) -> Iterator[tuple]:
+        return self._rows()
+
+    def _rows(self) -> Iterator[tuple]:
+        self._check()
+
+        if self.rows is None:
+            raise ProgrammingError("Aucun résultat : la requête n'a pas retourné de lignes.")
+
+        return self.rows
+
+    def _check(self):
+        if self.closed or self.connection.closed:
+            raise InterfaceError("Le curseur est fermé.")
+
+    def setinputsizes(self, sizes):
+        pass
+
+    def setoutputsize(self, size, column=None):
+        pass
+
+    def close(self):
+        self.closed, self.rows = (True, None)
+
+    def __enter__(self) -> Cursor:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class Connection:
+    """ Connexion DB-API à un Jewel """
+    Error = Error
+    InterfaceError = InterfaceError
+    DatabaseError = DatabaseError
+    ProgrammingError = ProgrammingError
+    NotSupportedError = NotSupportedError
+
+    def __init__(self, jewel: Jewel, max_depth: Optional[int] = None):
+        self.jewel = jewel
+        self.max_depth = max_depth
+        self.closed = False
+
+    def cursor(self) -> Cursor:
+        if self.closed:
+            raise InterfaceError("La connexion est fermée.")
+
+        return Cursor(self)
+
+    def execute(self, operation: str, parameters: Optional[Union[Sequence, Mapping]] = None) -> Cursor:
+        """ Raccourci : ouvre un curseur et exécute la requête """
+        return self.cursor().execute(operation, parameters)
+
+    def commit(self):
+        """ Sans effet : les écritures sont validées à l'exécution """
+
+    def rollback(self):
+        raise NotSupportedError("Les écritures sont validées à l'exécution, elles ne peuvent pas être annulées.")
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self) -> Connection:
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def connect(jewel: Union[str, pathlib.Path, Jewel], max_depth: Optional[int] = None) -> Connection:
+    """ Ouvre une connexion au Jewel (racine, ou Jewel déjà ouvert) """
+    from boic import jewel as J
+
+    if isinstance(jewel, (str, pathlib.Path)):
+        jewel = J.open(pathlib.Path(jewel))
+
+    return Connection(jewel, max_depth=max_depth)
@@ -1,21 +1,158 @@
+from typing import Optional
+from datetime import date, datetime, timedelta
+import calendar
 from sqlglot import exp
 
+# Formats acceptés pour les dates (le premier qui correspond l'emporte).
+DATE_FORMATS = ["%Y-%m-%d", "%y%m%d", "%Y%m%d", "%d/%m/%Y", "%d/%m/%y"]
+
+ColumnTypes = dict[str, str]
+
+def coerce(value: any, typ: Optional[str]) -> any:
+    """ Convertit la valeur dans le type déclaré (date, datetime).
+
+        Retourne None si la valeur ne peut pas être convertie.
+    """
+    value = getattr(value, "value", value)
+
+    if typ not in ("date", "datetime") or value is None:
+        return value
+
+    if isinstance(value, datetime):
+        return value.date() if typ == "date" else value
+
+    if isinstance(value, date):
+        return value if typ == "date" else datetime(value.year, value.month, value.day)
+
+    value = str(value).strip()
+
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        parsed = None
+
+    for fmt in DATE_FORMATS:
+        if parsed:
+            break
+
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+
+    if parsed is None:
+        return None
+
+    return parsed.date() if typ == "date" else parsed
+
+def typeof(value: any) -> Optional[str]:
+    """ Retourne le type temporel de la valeur, s'il y en a un. """
+    value = getattr(value, "value", value)
+
+    if isinstance(value, datetime):
+        return "datetime"
+
+    if isinstance(value, date):
+        return "date"
+
+    return None
+
+def column_type(expr: exp.Expression, types: Optional[ColumnTypes]) -> Optional[str]:
+    """ Retourne le type déclaré de la colonne, si l'expression en est une. """
+    if types and isinstance(expr, exp.Column):
+        return types.get(expr.name)
+
+    return None
+
+def shift(value: date, amount: int, unit: str) -> date:
+    """ Décale la date (ou datetime) de *amount* unités (DAY, WEEK, MONTH, YEAR) """
+    unit = unit.upper().rstrip("S")
+
+    if unit == "DAY":
+        return value + timedelta(days=amount)
+
+    if unit == "WEEK":
+        return value + timedelta(weeks=amount)
+
+    if unit in ("MONTH", "YEAR"):
+        months = value.year * 12 + value.month - 1 + (amount * 12 if unit == "YEAR" else amount)
+        year, month = divmod(months, 12)
+        day = min(value.day, calendar.monthrange(year, month + 1)[1])
+        return value.replace(year=year, month=month + 1, day=day)
+
+    raise ValueError(f"Unité d'intervalle {unit} non supportée.")
+
 def eval_expr(row: dict, expr: exp.Expression) -> any:
     """ Evalue une expression et retourne une valeur. """
 
     if isinstance(expr, exp.Column):
         key = eval_expr(row, expr.this)
-        
+
         if key not in row:
             return None
 
         return row[eval_expr(row, expr.this)]
-    
+
     elif isinstance(expr, exp.Identifier):
         return expr.this
-    
+
     elif isinstance(expr, exp.Literal):
         return expr.this
 
+    elif isinstance(expr, exp.Paren):
+        return eval_expr(row, expr.this)
+
+    elif isinstance(expr, exp.CurrentDate):
+        return date.today()
+
+    elif isinstance(expr, exp.CurrentTimestamp):
+        return datetime.now()
+
+    elif isinstance(expr, exp.Cast) and expr.to.this in (exp.DataType.Type.DATE, exp.DataType.Type.DATETIME, exp.DataType.Type.TIMESTAMP):
+        typ = "date" if expr.to.this == exp.DataType.Type.DATE else "datetime"
+        return coerce(eval_expr(row, expr.this), typ)
+
+    elif isinstance(expr, (exp.Add, exp.Sub)) and isinstance(expr.expression, exp.Interval):
+        value = eval_expr(row, expr.this)
+        value = coerce(value, typeof(value) or "date")
+
+        if value is None:
+            return None
+
+        amount = int(eval_expr(row, expr.expression.this))
+        sign = -1 if isinstance(expr, exp.Sub) else 1
+        return shift(value, sign * amount, expr.expression.unit.name)
+
     else:
-        raise ValueError(f"Unimplemented type: {type(expr)} for value evaluation.")
\ No newline at end of file
+        raise ValueError(f"Unimplemented type: {type(expr)} for value evaluation.")
+
+def eval_value(row: dict, expr: exp.Expression) -> any:
+    """ Evalue la valeur à écrire dans un Shard (INSERT, UPDATE).
+
+        Contrairement à eval_expr, les littéraux numériques, booléens, NULL et les tableaux sont typés.
+    """
+    if isinstance(expr, exp.Literal) and not expr.is_string:
+        text = str(expr.this)
+
+        try:
+            return int(text)
+        except ValueError:
+            return float(text)
+
+    elif isinstance(expr, exp.Neg):
+        return -eval_value(row, expr.this)
+
+    elif isinstance(expr, exp.Boolean):
+        return bool(expr.this)
+
+    elif isinstance(expr, exp.Null):
+        return None
+
+    elif isinstance(expr, exp.Array):
+        return [eval_value(row, item) for item in expr.expressions]
+
+    elif isinstance(expr, exp.Paren):
+        return eval_value(row, expr.this)
+
+    value = eval_expr(row, expr)
+    return getattr(value, "value", value)
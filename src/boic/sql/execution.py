@@ -9,6 +9,7 @@ from boic import jewel as J, shards
 
 from . import plan as P
 from .filter import filter_cursor, generate_filter_func
+from .eval import eval_expr, eval_value
 
 logger = logging.getLogger(__name__)
 
@@ -106,12 +107,36 @@ class FilterCursor(RowCursor):
         
         return self
 
+class CountCursor(RowCursor):
+    """ Curseur d'une seule ligne : le nombre de Shards écrits par la requête (INSERT, UPDATE) """
+    def __init__(self, alias: str, count: int):
+        super().__init__(columns=[P.ColumnProjection(rank=0, alias=alias)])
+        self.count = count
+
+    def __next__(self):
+        if self.row is not None:
+            raise StopIteration
+
+        self.row = [self.count]
+        return self
+
 class Execution:
     def __init__(self):
         self.cursors = {}
+        self.indexes: Optional[bool] = None
+
+    def use_indexes(self, jewel: J.Jewel) -> bool:
+        """ Retourne True si les index sont à jour (cf. shards.indexes_current), vérifié une fois par exécution """
+        if self.indexes is None:
+            self.indexes = shards.indexes_current(jewel)
 
-def execute_plan(jewel: J.Jewel, plan: P.Plan, max_depth: Optional[int] = None) -> Cursor:
-    """ Execute le plan d'exécution, retourne un curseur à itérer. """
+        return self.indexes
+
+def execute_plan(jewel: J.Jewel, plan: P.Plan, max_depth: Optional[int] = None, after: Optional[str] = None) -> Cursor:
+    """ Execute le plan d'exécution, retourne un curseur à itérer.
+
+        *after* : les Shards sont lus par identifiant croissant, à partir du suivant (cf. shards.iter).
+    """
     execution = Execution()
 
     queue = set(plan.leaves())
@@ -121,13 +146,47 @@ def execute_plan(jewel: J.Jewel, plan: P.Plan, max_depth: Optional[int] = None)
 
         # Ouvre un curseur vers les Shards.
         if isinstance(step, P.OpenShardCursor):
-            execution.cursors[step] = _open_shard_cursor(jewel, step, max_depth=max_depth)
+            execution.cursors[step] = _open_shard_cursor(jewel, execution, step, max_depth=max_depth, after=after)
 
         elif isinstance(step, P.Scan):
             execution.cursors[step] = _scan(jewel, execution, step)
 
-        # Enfile les étapes dépendantes de celui qui vient d'être executé.
-        queue.update(step.dependants)
+        # Index périmés : les recherches ne sont pas faites, le Jewel sera parcouru (cf. _open_shard_cursor).
+        elif isinstance(step, (P.FetchIndex, P.FetchIndexRange, P.IntersectIndexes, P.UnionIndexes)) and not execution.use_indexes(jewel):
+            execution.cursors[step] = None
+
+        elif isinstance(step, P.FetchIndex):
+            execution.cursors[step] = jewel.index[step.index].lookup(step.key)
+
+        elif isinstance(step, P.FetchIndexRange):
+            execution.cursors[step] = jewel.index[step.index].lookup_range(
+                low=eval_expr({}, step.low) if step.low else None,
+                high=eval_expr({}, step.high) if step.high else None,
+                low_inclusive=step.low_inclusive,
+                high_inclusive=step.high_inclusive
+            )
+
+        elif isinstance(step, P.IntersectIndexes):
+            execution.cursors[step] = set.intersection(*[execution.cursors[dep] for dep in step.dependencies])
+
+        elif isinstance(step, P.UnionIndexes):
+            execution.cursors[step] = set.union(*[execution.cursors[dep] for dep in step.dependencies])
+
+        # Les écritures sont réalisées dès l'exécution de l'étape.
+        elif isinstance(step, P.WriteNewShard):
+            execution.cursors[step] = _write_new_shards(jewel, step)
+
+        elif isinstance(step, P.UpdateShards):
+            execution.cursors[step] = _update_shards(jewel, execution, step)
+
+        # Enfile les étapes dépendantes de celui qui vient d'être executé, 
+        # dès lors que toutes leurs dépendances ont été exécutées.
+        queue.update(
+            filter(
+                lambda dependant: all(dep in execution.cursors for dep in dependant.dependencies), 
+                step.dependants
+            )
+        )
 
     # Récupère l'étape racine
     root = plan.root
@@ -135,13 +194,35 @@ def execute_plan(jewel: J.Jewel, plan: P.Plan, max_depth: Optional[int] = None)
     # Retourne le curseur d'exécution.
     return execution.cursors[root]
 
-def _open_shard_cursor(jewel: J.Jewel, step: P.OpenShardCursor, max_depth=None):
+def _open_shard_cursor(jewel: J.Jewel, execution: Execution, step: P.OpenShardCursor, max_depth=None, after: Optional[str] = None):
     """ Ouvre un curseur scannant l'ensemble des Shards.
 
         Si shard_type est défini, réalise un pré-filtre sur le paramètre "type" du Shard.
+        Si une recherche dans les index est définie, seuls les Shards retournés par celle-ci sont chargés.
+        Sinon le parcours est élagué selon la partition du type de Shard.
     """
+    prune = None
+
+    if step.partition:
+        prune = step.partition.pruner([
+            (column, eval_expr({}, low) if low else None, eval_expr({}, high) if high else None, *inclusive)
+            for column, low, high, *inclusive in step.bounds
+        ])
+
+    # Des index périmés omettraient des Shards : le Jewel est alors parcouru (la condition est évaluée par le scan).
+    if step.lookup and execution.use_indexes(jewel):
+        ids = (id for id in execution.cursors[step.lookup] if (after is None or id > after) and shards.within_depth(id, max_depth))
+
+        # Les Shards retournés par les index sont restreints à la partition, comme le parcours.
+        if prune:
+            ids = (id for id in ids if not prune(J.JewelPath.from_str(jewel, id).parent()))
+
+        source = shards.iter_by_ids(jewel, sorted(ids))
+    else:
+        source = shards.iter(jewel, max_depth=max_depth, prune=prune, after=after)
+
     def cursor():
-        for shard in shards.iter(jewel, max_depth=max_depth):
+        for shard in source:
             if step.type:
                 if shard.is_type(step.type):
                     yield shard
@@ -156,14 +237,61 @@ def _scan(jewel: J.Jewel, execution: Execution, step: P.Scan) -> RowCursor:
     # Récupère le curseur de la source.
     cursor = execution.cursors[step.source]
 
+    # Filtre le curseur (avant la projection : la condition porte sur les colonnes de la source)
+    if step.condition:
+        filter = generate_filter_func(step.condition, types=dict(jewel.config.columns.items()))
+        cursor = FilterCursor(filter=filter, cursor=cursor)
+
     # Génère une fonction de projection de l'entrée.
     if step.project:
         cursor = ProjectCursor(columns=step.project.columns, cursor=cursor)
-        
-    # Filtre le curseur
-    if step.condition:
-        filter = generate_filter_func(step.condition)
-        cursor = FilterCursor(filter=filter, cursor=cursor)
 
     return cursor
 
+def _shard_path(jewel: J.Jewel, location: any) -> J.JewelPath:
+    """ Chemin du nouveau Shard (relatif à la racine du Jewel, ou jewel://) """
+    segments = J.split_path(str(getattr(location, "value", location)))
+
+    if not segments[-1].endswith(".md"):
+        raise ValueError(f"Un Shard doit avoir l'extension .md : {location}")
+
+    return jewel.path(*segments)
+
+def _write_new_shards(jewel: J.Jewel, step: P.WriteNewShard) -> RowCursor:
+    """ Ecrit les nouveaux Shards, en une seule fois """
+    from boic.shards.writer import ShardWriter
+
+    writer = ShardWriter(jewel)
+
+    for row in step.rows:
+        values = {column: eval_value({}, expr) for column, expr in zip(step.columns, row)}
+        path = _shard_path(jewel, values.pop("path"))
+
+        if step.type != "shard":
+            values.setdefault("type", step.type)
+
+        writer.create(path, values)
+
+    written = writer.commit()
+    return CountCursor(alias="inserted", count=len(written))
+
+def _update_shards(jewel: J.Jewel, execution: Execution, step: P.UpdateShards) -> RowCursor:
+    """ Met à jour le frontmatter des Shards retournés par la source, en une seule fois.
+
+        Le nombre retourné est celui des Shards sélectionnés ; ceux dont les valeurs sont 
+        inchangées ne sont pas réécrits.
+    """
+    from boic.shards.writer import ShardWriter
+
+    writer = ShardWriter(jewel)
+    count = 0
+
+    # Les Shards sont tous lus (et les nouvelles valeurs calculées) avant la première écriture.
+    for row in execution.cursors[step.source]:
+        values = {column: eval_value(row, expr) for column, expr in step.assignments}
+        writer.update(J.JewelPath.from_str(jewel, row["id"]), values)
+        count += 1
+
+    writer.commit()
+    return CountCursor(alias="updated", count=count)
+
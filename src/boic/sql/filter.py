@@ -1,5 +1,6 @@
 from typing import Generator, Callable, TypeVar, Optional
 from collections.abc import Iterator
+import operator
 import re
 
 from sqlglot import parse_one, exp
@@ -9,7 +10,7 @@ from sqlglot.optimizer import optimize
 from boic.shards import Shard, ShardValue
 from boic import shards, jewel as J
 
-from .eval import eval_expr
+from .eval import eval_expr, coerce, typeof, column_type, ColumnTypes
 
 CursorFilterCallable = Callable[[dict], bool]
 
@@ -33,56 +34,154 @@ def _like(lhs: exp.Expression, rhs: exp.Expression) -> CursorFilterCallable:
 
     return func
 
-def _eq(lhs: exp.Expression, rhs: exp.Expression) -> CursorFilterCallable:
+_COMPARATORS = {
+    exp.EQ: operator.eq,
+    exp.NEQ: operator.ne,
+    exp.GT: operator.gt,
+    exp.GTE: operator.ge,
+    exp.LT: operator.lt,
+    exp.LTE: operator.le
+}
+
+def _operands(row: dict, types: Optional[ColumnTypes], *exprs: exp.Expression) -> list[any]:
+    """ Evalue les opérandes, et les convertit dans le type déclaré de la colonne comparée (date, datetime). """
+    values = [eval_expr(row, expr) for expr in exprs]
     
+    typ = next(filter(None, map(lambda expr: column_type(expr, types), exprs)), None)
+    typ = typ or next(filter(None, map(typeof, values)), None)
+
+    return [coerce(value, typ) for value in values]
+
+def _compare(op: Callable[[any, any], bool], lhs: exp.Expression, rhs: exp.Expression, types: Optional[ColumnTypes] = None) -> CursorFilterCallable:
+    """ Génère une fonction python executant l'opération LHS <op> RHS (=, <>, <, <=, >, >=) """
+
+    def func(row: dict) -> bool:
+        lh, rh = _operands(row, types, lhs, rhs)
+
+        # Comme en SQL, une comparaison avec NULL n'est jamais vraie (y compris = et <>).
+        if lh is None or rh is None:
+            return False
+
+        try:
+            return op(lh, rh)
+        except TypeError:
+            return False
+
+    return func
+
+def _between(this: exp.Expression, low: exp.Expression, high: exp.Expression, types: Optional[ColumnTypes] = None) -> CursorFilterCallable:
+    """ Génère une fonction python executant l'opération VALUE BETWEEN LOW AND HIGH """
+
+    def func(row: dict) -> bool:
+        value, lo, hi = _operands(row, types, this, low, high)
+
+        if value is None or lo is None or hi is None:
+            return False
+
+        try:
+            return lo <= value <= hi
+        except TypeError:
+            return False
+
+    return func
+
+def _is_null(this: exp.Expression, negate: bool = False) -> CursorFilterCallable:
+    """ Génère une fonction python executant l'opération VALUE IS [NOT] NULL """
+
+    def func(row: dict) -> bool:
+        value = eval_expr(row, this)
+
+        if isinstance(value, ShardValue):
+            value = value.value
+
+        return (value is None) != negate
+
+    return func
+
+def _array_contains(array: exp.Expression, needle: exp.Expression) -> CursorFilterCallable:
+    """ Génère une fonction python executant l'opération ARRAY_CONTAINS(ARRAY, VALUE) ou VALUE = ANY(ARRAY) """
+
     def func(row: dict) -> bool:
-        lh = eval_expr(row, lhs)
-        rh = eval_expr(row, rhs)
+        values = eval_expr(row, array)
+
+        if isinstance(values, ShardValue):
+            values = values.value
+
+        if values is None:
+            return False
+
+        if not isinstance(values, list):
+            values = [values]
 
-        return lh == rh
+        return eval_expr(row, needle) in values
 
     return func
 
-def _and(lhs: exp.Expression, rhs: exp.Expression) -> CursorFilterCallable:
-    lhs = _gen_filter_func(lhs)
-    rhs = _gen_filter_func(rhs)
+def _and(lhs: exp.Expression, rhs: exp.Expression, types: Optional[ColumnTypes] = None) -> CursorFilterCallable:
+    lhs = generate_filter_func(lhs, types=types)
+    rhs = generate_filter_func(rhs, types=types)
 
     def func(row: dict) -> bool:
         return lhs(row) and rhs(row)
 
     return func
 
-def _or(lhs: exp.Expression, rhs: exp.Expression) -> CursorFilterCallable:
-    lhs = _gen_filter_func(lhs)
-    rhs = _gen_filter_func(rhs)
+def _or(lhs: exp.Expression, rhs: exp.Expression, types: Optional[ColumnTypes] = None) -> CursorFilterCallable:
+    lhs = generate_filter_func(lhs, types=types)
+    rhs = generate_filter_func(rhs, types=types)
 
     def func(row: dict) -> bool:
         return lhs(row) or rhs(row)
 
     return func
 
-def generate_filter_func(expr: exp.Expression) -> CursorFilterCallable:
+def generate_filter_func(expr: exp.Expression, types: Optional[ColumnTypes] = None) -> CursorFilterCallable:
+    """ Génère la fonction de filtre. 
+    
+        *types* associe les colonnes à leur type déclaré (date, datetime) pour les comparaisons.
+    """
     if isinstance(expr, exp.Like):
         return _like(expr.this, expr.expression)
     
     elif isinstance(expr, exp.And):
-        return _and(expr.this, expr.expression)
+        return _and(expr.this, expr.expression, types=types)
 
     elif isinstance(expr, exp.Or):
-        return _and(expr.this, expr.expression)
+        return _or(expr.this, expr.expression, types=types)
+
+    elif isinstance(expr, exp.Paren):
+        return generate_filter_func(expr.this, types=types)
+
+    elif isinstance(expr, exp.ArrayContains):
+        return _array_contains(expr.this, expr.expression)
+
+    elif isinstance(expr, exp.EQ) and isinstance(expr.expression, exp.Any):
+        return _array_contains(expr.expression.this, expr.this)
+
+    elif isinstance(expr, exp.EQ) and isinstance(expr.this, exp.Any):
+        return _array_contains(expr.this.this, expr.expression)
+
+    elif isinstance(expr, exp.Between):
+        return _between(expr.this, expr.args["low"], expr.args["high"], types=types)
+
+    elif isinstance(expr, exp.Is) and isinstance(expr.expression, exp.Null):
+        return _is_null(expr.this)
+
+    elif isinstance(expr, exp.Not) and isinstance(expr.this, exp.Is) and isinstance(expr.this.expression, exp.Null):
+        return _is_null(expr.this.this, negate=True)
 
-    elif isinstance(expr, exp.EQ):
-        return _eq(expr.this, expr.expression)
+    elif type(expr) in _COMPARATORS:
+        return _compare(_COMPARATORS[type(expr)], expr.this, expr.expression, types=types)
 
     else:
         raise ValueError(f"Unimplemented type {type(expr)} for cursor filtering.")
 
 Row = TypeVar('Row')
 
-def filter_cursor(cursor: Iterator[Row], condition: Optional[exp.Expression]) -> Iterator[Row]:
+def filter_cursor(cursor: Iterator[Row], condition: Optional[exp.Expression], types: Optional[ColumnTypes] = None) -> Iterator[Row]:
     """ Filtre le curseur """
 
     if not condition:
         return cursor
 
-    return filter(generate_filter_func(condition), cursor)
\ No newline at end of file
+    return filter(generate_filter_func(condition, types=types), cursor)
\ No newline at end of file
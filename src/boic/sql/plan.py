@@ -6,11 +6,20 @@ from __future__ import annotations
 from sqlglot import exp
 from typing import Optional, Union
 from collections.abc import Iterator, Iterable
+import logging
 
 from boic.jewel import Jewel, JewelPath
+from boic.index import IndexManager
+from boic.partition import PartitionManager, Partition
+
+logger = logging.getLogger(__name__)
 
 class Plan:
-    def __init__(self):
+    def __init__(self, indexes: Optional[IndexManager] = None, partitions: Optional[PartitionManager] = None):
+        # Index secondaires disponibles pour accélérer la requête
+        self.indexes = indexes
+        # Partitions des Shards dans la structure des dossiers AIOT
+        self.partitions = partitions
         # Permet de lier une étape à une alias
         self.step_aliases = {}
         # Compteur des idenfiants de l'étape
@@ -37,6 +46,24 @@ class Plan:
     def open_shard_cursor(self, name: str, type = None):
         return OpenShardCursor(plan=self, type=type)
 
+    def fetch_index(self, index: str, key: any):
+        return FetchIndex(plan=self, index=index, key=key)
+
+    def fetch_index_range(self, index: str, low = None, high = None, low_inclusive = True, high_inclusive = True):
+        return FetchIndexRange(plan=self, index=index, low=low, high=high, low_inclusive=low_inclusive, high_inclusive=high_inclusive)
+
+    def intersect_indexes(self, deps: list[Step]):
+        return IntersectIndexes(plan=self, deps=deps)
+
+    def union_indexes(self, deps: list[Step]):
+        return UnionIndexes(plan=self, deps=deps)
+
+    def write_new_shard(self, type: str, columns: list[str], rows: list[list[exp.Expression]]):
+        return WriteNewShard(plan=self, type=type, columns=columns, rows=rows)
+
+    def update_shards(self, source: Step, assignments: list[tuple[str, exp.Expression]]):
+        return UpdateShards(plan=self, source=source, assignments=assignments)
+
     def leaves(self):
         """ Retourne les feuilles de l'arbre de planification """
         return filter(Step.is_leave, self.steps)
@@ -62,6 +89,11 @@ class Step:
 
     def explain_spec(self, ident: int) -> str:
         return ""
+
+    def depends_on(self, step: Step):
+        """ Ajoute une dépendance à l'étape """
+        self.dependencies.append(step)
+        step.dependants.append(self)
     
     def explain(self, ident: int = 0) -> str:
         space = "  " * ident
@@ -91,29 +123,121 @@ class Transform:
        pass
 
 class OpenShardCursor(Step):
-    """ Représente un curseur sur l'ensemble des Shards. """
+    """ Représente un curseur sur l'ensemble des Shards. 
+    
+        Si une recherche dans les index (lookup) est définie, seuls les Shards 
+        dont l'identifiant est retourné par celle-ci sont chargés.
+    """
     def __init__(self, plan: Plan, name: Optional[str] = None, type: Optional[str] = None):
         super().__init__(plan=plan, name=name)
         self.type = type
+        self.lookup = None
+        # Elagage du parcours selon la structure des dossiers AIOT
+        self.partition: Optional[Partition] = None
+        self.bounds: list[tuple] = []
+
+    def use_index(self, lookup: Step):
+        """ Restreint le curseur aux identifiants retournés par la recherche dans les index """
+        self.lookup = lookup
+        self.depends_on(lookup)
 
     def explain_spec(self, ident: int) -> str:
         space = "  " * ident
         return "".join([
             space + "type=",
             self.type,
-            '\n'
+            '\n',
+            (space + "lookup=" + self.lookup.explain(ident) + '\n') if self.lookup else "",
+            (space + f"partition={self.partition.type}, bounds=[{', '.join(map(_explain_bound, self.bounds))}]\n") if self.partition else ""
         ])
 
+def _explain_bound(bound: tuple) -> str:
+    column, low, high, _, _ = bound
+    return f"{column} in [{low.sql() if low else '-inf'}, {high.sql() if high else '+inf'}]"
+
+class FetchIndex(Step):
+    """ Récupère les identifiants des Shards associés à une clé dans un index secondaire. """
+    def __init__(self, plan: Plan, index: str, key: any):
+        super().__init__(plan=plan)
+        self.index = index
+        self.key = key
+
+    def explain_spec(self, ident: int) -> str:
+        space = "  " * ident
+        return space + f"index={self.index}, key={self.key!r}\n"
+
+class FetchIndexRange(Step):
+    """ Récupère les identifiants des Shards dont la valeur est comprise dans une plage d'un index de plage. 
+    
+        Les bornes sont des expressions constantes, évaluées à l'exécution (ex: CURRENT_DATE).
+    """
+    def __init__(self, plan: Plan, index: str, low: Optional[exp.Expression] = None, high: Optional[exp.Expression] = None, low_inclusive: bool = True, high_inclusive: bool = True):
+        super().__init__(plan=plan)
+        self.index = index
+        self.low = low
+        self.high = high
+        self.low_inclusive = low_inclusive
+        self.high_inclusive = high_inclusive
+
+    def explain_spec(self, ident: int) -> str:
+        space = "  " * ident
+        low = ("[" if self.low_inclusive else "]") + (self.low.sql() if self.low else "-inf")
+        high = (self.high.sql() if self.high else "+inf") + ("]" if self.high_inclusive else "[")
+        return space + f"index={self.index}, range={low}, {high}\n"
+
+class IntersectIndexes(Step):
+    """ Intersection des listes de postage (ET) """
+    def __init__(self, plan: Plan, deps: list[Step]):
+        super().__init__(plan=plan, deps=deps)
+
+class UnionIndexes(Step):
+    """ Union des listes de postage (OU) """
+    def __init__(self, plan: Plan, deps: list[Step]):
+        super().__init__(plan=plan, deps=deps)
+
 class WriteNewShard(Step):
-    """ Ecris un nouveau Shard dans le Jewel """
-    def __init__(self, path: JewelPath, columns, values):
-        self.path: JewelPath = values
-        self.columns = {}
-        
-        for k, v in zip(columns, values):
-            if k == "path":
-                continue
-            self.columns[k] = v
+    """ Ecris de nouveaux Shards dans le Jewel (INSERT INTO type (path, ...) VALUES (...), ...)
+
+        La colonne path (chemin du Shard dans le Jewel) est obligatoire. Le paramètre type
+        est celui de la table, sauf s'il est donné. Les valeurs sont des expressions 
+        constantes, évaluées à l'exécution (ex: CURRENT_DATE).
+    """
+    def __init__(self, plan: Plan, type: str, columns: list[str], rows: list[list[exp.Expression]]):
+        super().__init__(plan=plan)
+
+        if "path" not in columns:
+            raise ValueError("INSERT : la colonne path (chemin du Shard) est obligatoire.")
+
+        if "id" in columns:
+            raise ValueError("INSERT : la colonne id est déduite du chemin du Shard.")
+
+        if any(len(row) != len(columns) for row in rows):
+            raise ValueError("INSERT : le nombre de valeurs ne correspond pas au nombre de colonnes.")
+
+        self.type = type
+        self.columns = columns
+        self.rows = rows
+
+    def explain_spec(self, ident: int) -> str:
+        space = "  " * ident
+        return space + f"type={self.type}, columns=[{', '.join(self.columns)}], rows={len(self.rows)}\n"
+
+class UpdateShards(Step):
+    """ Met à jour les Shards retournés par la source (UPDATE type SET col = expr, ... WHERE ...)
+
+        Les valeurs sont évaluées sur chaque Shard ; seul le frontmatter est réécrit.
+    """
+    def __init__(self, plan: Plan, source: Step, assignments: list[tuple[str, exp.Expression]]):
+        super().__init__(plan=plan, deps=[source])
+        self.source = source
+        self.assignments = assignments
+
+    def explain_spec(self, ident: int) -> str:
+        space = "  " * ident
+        return "".join([
+            space + "source=" + self.source.explain(ident) + ',\n',
+            space + f"set=[{', '.join(f'{column} = {expr.sql()}' for column, expr in self.assignments)}]\n"
+        ])
 
 class Scan(Step):
     """ Scanne à partir d'un curseur sur une ligne, et applique des projections et/ou des filtres 
@@ -216,6 +340,9 @@ def _project(cols: list[exp.Expression]):
         if isinstance(expr, exp.Alias):
             alias = expr.alias
             expr = expr.this
+        elif expr.alias_or_name:
+            # Requête non optimisée (cf. OptimizeError) : la colonne garde son nom.
+            alias = expr.alias_or_name
         else:
             logger.warning("Aucun alias n'est définit pour la colonne.")
 
@@ -230,6 +357,165 @@ def contains_wildcard(exprs: Iterable[exp.Expression]):
     """ Vérifie si la liste d'expressions contient un wildcard "*" """
     return any(map(lambda expr: isinstance(expr, exp.Star), exprs))
 
+def _array_contains_key(expr: exp.Expression) -> Optional[tuple[str, any]]:
+    """ Reconnaît ARRAY_CONTAINS(col, 'x') et 'x' = ANY(col), et retourne (col, 'x') """
+    if isinstance(expr, exp.ArrayContains):
+        array, needle = expr.this, expr.expression
+    elif isinstance(expr, exp.EQ) and isinstance(expr.expression, exp.Any):
+        needle, array = expr.this, expr.expression.this
+    elif isinstance(expr, exp.EQ) and isinstance(expr.this, exp.Any):
+        array, needle = expr.this.this, expr.expression
+    else:
+        return None
+
+    while isinstance(array, exp.Paren):
+        array = array.this
+
+    if not isinstance(array, exp.Column) or not isinstance(needle, exp.Literal):
+        return None
+
+    return (array.name, needle.this)
+
+def _is_constant(expr: exp.Expression) -> bool:
+    """ Vérifie si l'expression peut être évaluée sans ligne (littéral, CURRENT_DATE, ...) """
+    return expr.find(exp.Column) is None
+
+# Comparaison inversée lorsque la colonne est à droite de l'opérateur.
+_FLIPPED = {exp.GT: exp.LT, exp.GTE: exp.LTE, exp.LT: exp.GT, exp.LTE: exp.GTE, exp.EQ: exp.EQ}
+
+def _range_bounds(expr: exp.Expression) -> Optional[tuple]:
+    """ Reconnaît col BETWEEN a AND b, col (<|<=|>|>=|=) a, et retourne (col, a, b, a inclus, b inclus) """
+    if isinstance(expr, exp.Between):
+        column, low, high = (expr.this, expr.args["low"], expr.args["high"])
+        
+        if isinstance(column, exp.Column) and _is_constant(low) and _is_constant(high):
+            return (column.name, low, high, True, True)
+        
+        return None
+
+    op = type(expr)
+
+    if op not in _FLIPPED:
+        return None
+
+    column, value = (expr.this, expr.expression)
+
+    if not isinstance(column, exp.Column):
+        column, value, op = (value, column, _FLIPPED[op])
+
+    if not isinstance(column, exp.Column) or not _is_constant(value) or isinstance(value, exp.Any):
+        return None
+
+    if op is exp.EQ:
+        return (column.name, value, value, True, True)
+    elif op in (exp.GT, exp.GTE):
+        return (column.name, value, None, op is exp.GTE, True)
+    else:
+        return (column.name, None, value, True, op is exp.LTE)
+
+def _conjuncts(expr: exp.Expression) -> Iterator[exp.Expression]:
+    """ Itère sur les termes de la conjonction (a AND b AND ...) """
+    while isinstance(expr, exp.Paren):
+        expr = expr.this
+
+    if isinstance(expr, exp.And):
+        yield from _conjuncts(expr.this)
+        yield from _conjuncts(expr.expression)
+    else:
+        yield expr
+
+def _partition_bounds(partition: Partition, expr: exp.Expression) -> list[tuple]:
+    """ Récupère les bornes de la condition portant sur les colonnes de la partition """
+    columns = partition.columns()
+    bounds = filter(None, map(_range_bounds, _conjuncts(expr)))
+    return [bound for bound in bounds if bound[0] in columns]
+
+def _index_lookup(plan: Plan, expr: exp.Expression) -> Optional[tuple]:
+    """ Détermine si la condition peut être résolue par les index secondaires.
+
+        Retourne un arbre ("key", index, clé) | ("range", index, a, b, a inclus, b inclus) 
+        | ("and", [...]) | ("or", [...]), ou None 
+        si la condition ne peut pas être restreinte par les index.
+    """
+    if isinstance(expr, exp.Paren):
+        return _index_lookup(plan, expr.this)
+
+    if isinstance(expr, exp.And):
+        lhs, rhs = (_index_lookup(plan, expr.this), _index_lookup(plan, expr.expression))
+        
+        if lhs and rhs:
+            return ("and", [lhs, rhs])
+        
+        # Un seul côté suffit à restreindre l'ensemble des candidats.
+        return lhs or rhs
+
+    if isinstance(expr, exp.Or):
+        lhs, rhs = (_index_lookup(plan, expr.this), _index_lookup(plan, expr.expression))
+        
+        if lhs and rhs:
+            return ("or", [lhs, rhs])
+
+        return None
+
+    key = _array_contains_key(expr)
+
+    if key:
+        column, value = key
+        index = plan.indexes.find(type="inverted", column=column)
+        
+        if index:
+            return ("key", index.schema.name, value)
+
+    bounds = _range_bounds(expr)
+
+    if bounds:
+        column, *bounds = bounds
+        index = plan.indexes.find(type="range", column=column)
+
+        if index:
+            return ("range", index.schema.name, *bounds)
+
+    return None
+
+def _lookup_step(plan: Plan, lookup: tuple) -> Step:
+    """ Génère les étapes de recherche dans les index """
+    op, *args = lookup
+
+    if op == "key":
+        return plan.fetch_index(index=args[0], key=args[1])
+
+    if op == "range":
+        index, low, high, low_inclusive, high_inclusive = args
+        return plan.fetch_index_range(index=index, low=low, high=high, low_inclusive=low_inclusive, high_inclusive=high_inclusive)
+
+    deps = [_lookup_step(plan, sub) for sub in args[0]]
+
+    if op == "and":
+        return plan.intersect_indexes(deps=deps)
+    
+    return plan.union_indexes(deps=deps)
+
+def _restrict(plan: Plan, source: Step, condition: Optional[exp.Expression]):
+    """ Restreint le parcours des Shards de la source par les index secondaires et la partition du type """
+    if not isinstance(source, OpenShardCursor):
+        return
+
+    # Résout tout ou partie de la condition par les index secondaires :
+    # OpenShardCursor(lookup=IntersectIndexes(...FetchIndex(per_idx_condition)))
+    # La condition complète reste évaluée lors du scan.
+    if condition is not None and plan.indexes is not None:
+        lookup = _index_lookup(plan, condition)
+        
+        if lookup:
+            source.use_index(_lookup_step(plan, lookup))
+
+    # Elague le parcours aux répertoires de la structure AIOT pouvant contenir le type de Shard.
+    if plan.partitions is not None:
+        source.partition = plan.partitions.find(source.type)
+
+        if source.partition and condition is not None:
+            source.bounds = _partition_bounds(source.partition, condition)
+
 def generate_step(plan: Plan, node: exp.Expression) -> Step:
     """ Génère une étape dans l'exécution de la requête """
     
@@ -237,7 +523,8 @@ def generate_step(plan: Plan, node: exp.Expression) -> Step:
         # Deux possibilités :
         # - Select sur une sous-requête, dans ce cas la dép doit fournir un curseur à itérer.
         # - Select sur une table (Shard)
-        _from = node.args.get("from")
+        # sqlglot>=26 renomme l'argument "from" en "from_"
+        _from = node.args.get("from") or node.args.get("from_")
 
         # Si on a pas passé de FROM, dans ce cas on ouvre un curseur sur l'ensemble des Shards par défaut.
         source = generate_step(plan, _from) if _from else plan.open_shard_cursor(name="shard", type="shard")
@@ -252,10 +539,9 @@ def generate_step(plan: Plan, node: exp.Expression) -> Step:
         where = node.args.get("where")
         
         if where:
-            # TODO: Implémenter la possibilité de shifter du 
-            # ScanShards -> FetchShards(condition=where, cursor=IntersectIndexes(...FetchIndex(per_idx_condition)))$
-            # Cette opération permettant de profiter des éventuels index crées pour accélérer la requête.
-            step.condition = where.this      
+            step.condition = where.this
+
+        _restrict(plan, source, where.this if where else None)
 
     elif isinstance(node, exp.From):
         if isinstance(node.this, exp.Table):
@@ -269,18 +555,53 @@ def generate_step(plan: Plan, node: exp.Expression) -> Step:
 
     elif isinstance(node, exp.Insert):
         schema = node.this
-        table = schema.this
-        columns = schema.expressions
-        values = node.expression.expressions
-        shard_type = table.this.this
+
+        if not isinstance(schema, exp.Schema):
+            raise ValueError("INSERT : la liste des colonnes est obligatoire (ex: INSERT INTO inspection (path, nom) VALUES (...)).")
+
+        if not isinstance(node.expression, exp.Values):
+            raise ValueError("INSERT : seules les valeurs (VALUES) sont supportées.")
+
+        columns = [column.name for column in schema.expressions]
+        rows = [row.expressions for row in node.expression.expressions]
+        step = plan.write_new_shard(type=schema.this.name, columns=columns, rows=rows)
+
+    elif isinstance(node, exp.Update):
+        table = node.this
+
+        if not isinstance(table, exp.Table):
+            raise ValueError(f"UPDATE : table invalide {table.sql()}")
+
+        source = plan.open_shard_cursor(name=table.alias, type=table.name)
+        scan = plan.scan(source=source, deps=[source])
+        where = node.args.get("where")
+
+        if where:
+            scan.condition = where.this
+
+        _restrict(plan, source, where.this if where else None)
+        assignments = []
+
+        for assignment in node.expressions:
+            if not isinstance(assignment, exp.EQ) or not isinstance(assignment.this, exp.Column):
+                raise ValueError(f"UPDATE : affectation invalide {assignment.sql()}")
+
+            column = assignment.this.name
+
+            if column in ("id", "path"):
+                raise ValueError(f"UPDATE : la colonne {column} ne peut pas être modifiée.")
+
+            assignments.append((column, assignment.expression))
+
+        step = plan.update_shards(source=scan, assignments=assignments)
 
     else:
         raise NotImplementedError(f"L'expression de type {type(node)} n'est pas implémentée pour la planification de l'execution de la requête")
 
     return step
 
-def generate_plan(node: exp.Expression):
+def generate_plan(node: exp.Expression, indexes: Optional[IndexManager] = None, partitions: Optional[PartitionManager] = None):
     """ Génère le plan d'exécution à partir de l'AST de la requête ShQL """
-    plan = Plan()
+    plan = Plan(indexes=indexes, partitions=partitions)
     plan.root = generate_step(plan, node)
     return plan
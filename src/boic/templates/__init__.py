@@ -1,20 +1,53 @@
-from docxtpl import DocxTemplate
+""" Modèles de Shards (Jinja) et de documents (docx)
+
+Les modèles de Shards sont chargés par un environnement Jinja propre au Jewel, enraciné
+dans le répertoire templates.dir.shards : un modèle n'est compilé qu'une fois par
+processus (il est recompilé si le fichier est modifié), et le bytecode compilé est gardé
+dans le répertoire des index, partagé entre les invocations de la CLI.
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
 from boic.jewel import JewelPath, Jewel
 from boic.shards import Shard
 
-from jinja2 import Template
+if TYPE_CHECKING:
+    from jinja2 import Environment
+    from docxtpl import DocxTemplate
+
+# Nombre de modèles compilés gardés en mémoire
+CACHE_SIZE = 64
+
+def environment(jewel: Jewel) -> Environment:
+    """ Retourne l'environnement Jinja des modèles de Shards du Jewel """
+    if jewel.template_env is None:
+        from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+
+        cache_dir = jewel.path(jewel.config.indexes.dir, "templates")
+        cache_dir.mkdir()
+
+        jewel.template_env = Environment(
+            loader=FileSystemLoader(jewel.path(jewel.config.templates.dir.shards).canonicalize()),
+            # Le modèle est recompilé si son fichier a été modifié.
+            auto_reload=True,
+            cache_size=CACHE_SIZE,
+            bytecode_cache=FileSystemBytecodeCache(str(cache_dir.canonicalize()))
+        )
+
+    return jewel.template_env
 
 def new_shard_template(jewel: Jewel, name: str, output: JewelPath, **args) -> Shard:
-    tpl_path = jewel.path(jewel.config.templates.dir.shards, f"{name}.md.tpl")
-    
-    with tpl_path.open() as file:
-        tpl = Template(file.read())
-        out = tpl.render(**args)
+    tpl = environment(jewel).get_template(f"{name}.md.tpl")
+    out = tpl.render(**args)
     
     with output.open(mode="w") as file:
         file.write(out)
 
+    jewel.tree.invalidate(output)
+
 def new_docx_template(jewel: Jewel, name: str, output: JewelPath, **args) -> DocxTemplate:
+    from docxtpl import DocxTemplate
+
     tpl_path = jewel.path(jewel.config.templates.dir.documents, f"{name}.docx").canonicalize()
     
     tpl = DocxTemplate(tpl_path)
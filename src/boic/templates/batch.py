@@ -0,0 +1,187 @@
+""" Génération de documents par lot (genere:doc --query)
+
+Les documents des Shards retournés par une requête ShQL sont générés par un pool de
+processus. Chaque processus ouvre le Jewel une fois, et garde chaque modèle docx en
+mémoire (re-validé par un simple stat) : un modèle n'est lu qu'une fois par processus,
+quel que soit le nombre de documents qui l'utilisent. Les documents sont écrits dans un
+fichier temporaire, puis renommés : un document interrompu ne remplace pas le précédent.
+
+Chaque résultat porte les empreintes (mtime, taille) des fichiers lus pour le rendu : le
+Shard, le modèle, et les Shards déréférencés (liens jewel://), cf. boic.templates.build.
+"""
+from __future__ import annotations
+from typing import Optional, TYPE_CHECKING
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import io
+import logging
+import os
+import pathlib
+import time
+
+if TYPE_CHECKING:
+    from docxtpl import DocxTemplate
+    from boic.jewel import Jewel, JewelPath
+
+_logger = logging.getLogger(__name__)
+
+class DocumentResult:
+    """ Résultat de la génération d'un document """
+    def __init__(self, id: str, output: Optional[str] = None, template: Optional[str] = None, seconds: float = 0.0, error: Optional[str] = None):
+        self.id = id
+        self.output = output
+        self.template = template
+        self.seconds = seconds
+        self.error = error
+        # Identifiant -> empreinte des fichiers dont dépend le document
+        self.dependencies: dict[str, Optional[list[int]]] = {}
+        self.output_fingerprint: Optional[list[int]] = None
+
+    def ok(self) -> bool:
+        return self.error is None
+
+def fingerprint(jewel: Jewel, id: str) -> Optional[list[int]]:
+    """ Empreinte (mtime, taille) du fichier, ou None s'il n'existe pas """
+    from boic.jewel import JewelPath
+
+    try:
+        st = os.stat(JewelPath.from_str(jewel, id).canonicalize())
+    except (OSError, ValueError):
+        return None
+
+    return [st.st_mtime_ns, st.st_size]
+
+def template_id(jewel: Jewel, name: str) -> str:
+    """ Identifiant du fichier du modèle docx """
+    return "/".join(jewel.path(jewel.config.templates.dir.documents, f"{name}.docx").segments)
+
+def document_path(shard_path: JewelPath) -> JewelPath:
+    """ Chemin du document généré à partir du Shard (à côté du Shard) """
+    return shard_path.parent().join(f"{shard_path.stem}.docx")
+
+def save_atomic(tpl: DocxTemplate, output: pathlib.Path):
+    """ Enregistre le document dans un fichier temporaire, puis le renomme """
+    tmp = output.with_name(f".{output.name}.{os.getpid()}.tmp")
+
+    try:
+        tpl.save(tmp)
+        os.replace(tmp, output)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+class TemplateCache:
+    """ Modèles docx d'un processus, gardés en mémoire """
+    def __init__(self, jewel: Jewel):
+        self.jewel = jewel
+        # Nom du modèle -> (mtime_ns du fichier, modèle)
+        self.templates: dict[str, tuple[int, DocxTemplate]] = {}
+
+    def get(self, name: str) -> DocxTemplate:
+        from docxtpl import DocxTemplate
+
+        path = self.jewel.path(self.jewel.config.templates.dir.documents, f"{name}.docx").canonicalize()
+        mtime_ns = os.stat(path).st_mtime_ns
+        cached = self.templates.get(name)
+
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+
+        _logger.debug(f"Chargement du modèle: {path}")
+        # Le modèle est relu depuis la mémoire à chaque rendu (DocxTemplate recharge le document).
+        tpl = DocxTemplate(io.BytesIO(path.read_bytes()))
+        self.templates[name] = (mtime_ns, tpl)
+        return tpl
+
+# État d'un processus du pool (cf. _init_worker)
+_jewel: Optional[Jewel] = None
+_templates: Optional[TemplateCache] = None
+
+def _init_worker(root: str):
+    global _jewel, _templates
+    from boic import jewel as J
+
+    _jewel = J.open(root)
+    _templates = TemplateCache(_jewel)
+
+def render_document(jewel: Jewel, templates: TemplateCache, id: str) -> DocumentResult:
+    """ Génère le document du Shard, à partir du modèle de son paramètre template """
+    from boic import shards
+    from boic.jewel import JewelPath
+
+    start = time.perf_counter()
+    result = DocumentResult(id=id)
+
+    try:
+        shard_path = JewelPath.from_str(jewel, id)
+        # Empreintes relevées avant la lecture : une modification pendant le rendu sera vue au prochain.
+        result.dependencies[id] = fingerprint(jewel, id)
+
+        with shards.record_dereferences() as dereferenced:
+            shard = shards.load(shard_path)
+
+            if "template" not in shard:
+                raise ValueError("Le Shard n'a pas de paramètre template.")
+
+            result.template = str(shard["template"])
+            output = document_path(shard_path)
+            result.output = str(output)
+
+            template = template_id(jewel, result.template)
+            result.dependencies[template] = fingerprint(jewel, template)
+            tpl = templates.get(result.template)
+            tpl.render(dict(**shard))
+
+        save_atomic(tpl, output.canonicalize())
+
+        for dependency in sorted(dereferenced - result.dependencies.keys()):
+            result.dependencies[dependency] = fingerprint(jewel, dependency)
+
+        result.output_fingerprint = fingerprint(jewel, "/".join(output.segments))
+    except Exception as e:
+        _logger.debug(f"Echec de la génération du document de {id}", exc_info=True)
+        result.error = f"{type(e).__name__}: {e}"
+
+    result.seconds = time.perf_counter() - start
+    return result
+
+def _render(id: str) -> DocumentResult:
+    return render_document(_jewel, _templates, id)
+
+def query_ids(jewel: Jewel, query: str, max_depth=None) -> list[str]:
+    """ Identifiants des Shards retournés par la requête """
+    from boic import sql
+
+    ids = []
+
+    for row in sql.execute(jewel, query, max_depth=max_depth):
+        if "id" not in row.keys():
+            raise ValueError("La requête doit retourner la colonne id (ex: SELECT id FROM inspection WHERE ...).")
+
+        ids.append(str(row["id"]))
+
+    return ids
+
+def render_documents(jewel: Jewel, ids: Iterable[str], workers: Optional[int] = None) -> Iterator[DocumentResult]:
+    """ Génère les documents des Shards par un pool de processus, dans l'ordre de leur achèvement """
+    ids = list(dict.fromkeys(ids))
+
+    if not ids:
+        return
+
+    # Un seul document (ou un seul processus) : inutile de démarrer un pool.
+    if workers == 1 or len(ids) == 1:
+        templates = TemplateCache(jewel)
+
+        for id in ids:
+            yield render_document(jewel, templates, id)
+
+        return
+
+    root = str(jewel.root().canonicalize())
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(root,)) as pool:
+        futures = [pool.submit(_render, id) for id in ids]
+
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,133 @@
+""" Reconstruction incrémentale des documents générés (à la manière de make)
+
+Le manifeste des documents (répertoire des index) garde, pour chaque Shard dont un
+document a été généré, les empreintes (mtime, taille) de ses dépendances : le Shard, le
+modèle docx, et chaque Shard déréférencé (lien jewel://) pendant le rendu ; ainsi que
+l'empreinte du document lui-même. Un document n'est régénéré que si l'une de ces
+empreintes a changé, ou si le document a été modifié ou supprimé.
+
+Les Shards sans paramètre template sont aussi retenus (avec leur empreinte) : sur un
+Jewel inchangé, genere:doc --all ne fait qu'un stat par fichier, sans lire les Shards.
+"""
+from __future__ import annotations
+from typing import Optional, TYPE_CHECKING
+from collections.abc import Iterable
+import json
+import logging
+
+from .batch import DocumentResult, document_path, fingerprint
+
+if TYPE_CHECKING:
+    from boic.jewel import Jewel, JewelPath
+
+_logger = logging.getLogger(__name__)
+
+class DocumentManifest:
+    """ Dépendances des documents générés, persistées dans le répertoire des index """
+    def __init__(self, jewel: Jewel):
+        self.jewel = jewel
+        # Shard -> {"output": document, "template": modèle, "dependencies": {id: empreinte}, "fingerprint": empreinte du document}
+        self.documents: Optional[dict[str, dict]] = None
+        # Shards sans paramètre template -> empreinte
+        self.plain: Optional[dict[str, list[int]]] = None
+
+    def location(self) -> JewelPath:
+        return self.jewel.path(self.jewel.config.indexes.dir, "documents")
+
+    def load(self) -> dict[str, dict]:
+        if self.documents is None:
+            self.documents, self.plain = ({}, {})
+
+            if self.location().exists():
+                with self.location().open(mode="r") as file:
+                    values = json.load(file)
+                    self.documents, self.plain = (values["documents"], values["plain"])
+
+        return self.documents
+
+    def flush(self):
+        self.load()
+        self.location().parent().mkdir()
+
+        with self.location().open(mode="w") as file:
+            json.dump({"documents": self.documents, "plain": self.plain}, file)
+
+    def up_to_date(self, id: str, plain: bool = False) -> bool:
+        """ Vérifie si le document du Shard est à jour (ou, si *plain*, si le Shard inchangé n'a pas de modèle) """
+        documents = self.load()
+
+        if id in self.plain:
+            return plain and self.plain[id] == fingerprint(self.jewel, id)
+
+        entry = documents.get(id)
+
+        if entry is None:
+            return False
+
+        if entry["fingerprint"] is None or entry["fingerprint"] != fingerprint(self.jewel, entry["output"]):
+            return False
+
+        return all(value == fingerprint(self.jewel, dependency) for dependency, value in entry["dependencies"].items())
+
+    def outdated(self, ids: Iterable[str], force: bool = False, plain: bool = False) -> list[str]:
+        """ Retourne les Shards dont le document doit être (re)généré.
+
+            Si *plain*, les Shards sans paramètre template sont écartés (et retenus), ex: genere:doc --all.
+        """
+        from boic import shards
+        from boic.jewel import JewelPath
+
+        self.load()
+        ids = list(dict.fromkeys(ids))
+        outdated = []
+
+        for id in ids:
+            if not force and self.up_to_date(id, plain=plain):
+                continue
+
+            if plain:
+                try:
+                    shard = shards.load(JewelPath.from_str(self.jewel, id))
+                except (OSError, ValueError) as e:
+                    _logger.debug(f"Shard illisible {id}: {e}")
+                    continue
+
+                if "template" not in shard:
+                    self.documents.pop(id, None)
+                    self.plain[id] = fingerprint(self.jewel, id)
+                    continue
+
+                self.plain.pop(id, None)
+
+            outdated.append(id)
+
+        return outdated
+
+    def forget(self, ids: Iterable[str]):
+        """ Oublie les Shards qui ne sont plus dans le Jewel """
+        self.load()
+        ids = set(ids)
+
+        for id in [id for id in self.documents if id not in ids]:
+            del self.documents[id]
+
+        for id in [id for id in self.plain if id not in ids]:
+            del self.plain[id]
+
+    def record(self, result: DocumentResult):
+        """ Retient les dépendances du document généré (un échec sera régénéré) """
+        from boic.jewel import JewelPath
+
+        documents = self.load()
+
+        if not result.ok():
+            documents.pop(result.id, None)
+            return
+
+        self.plain.pop(result.id, None)
+        documents[result.id] = {
+            "output": "/".join(document_path(JewelPath.from_str(self.jewel, result.id)).segments),
+            "template": result.template,
+            "dependencies": result.dependencies,
+            "fingerprint": result.output_fingerprint
+        }
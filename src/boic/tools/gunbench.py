@@ -0,0 +1,131 @@
+""" Banc d'essai des pilotes d'extraction du GUN, contre un serveur factice servant des pages enregistrées
+
+Usage : python -m boic.tools.gunbench [--fixtures DIR] [--record URL] [-n 200] [-s 4] [--driver http --driver auto ...]
+
+Les pages sont d'abord enregistrées dans DIR ({gun}.html) : depuis le GUN (--record URL, avec
+le pilote --record-driver, pour les identifiants du fichier --ids), ou générées par le serveur
+factice (boic.gun.fake) si DIR est vide. Elles sont ensuite servies par le serveur factice
+(enregistrements seuls, latence --latency), et chaque pilote extrait toutes les pages avec
+*s* sessions. Le rapport donne, par pilote, le temps d'ouverture des sessions, le débit
+(pages par seconde), les latences p50/p99/max, et la mémoire maximale du processus.
+"""
+from __future__ import annotations
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import pathlib
+import resource
+import sys
+import tempfile
+import time
+
+from boic import gun
+from boic.gun import fake
+from boic.gun.sync import SessionPool
+from boic.tools.loadgen import Measure
+
+def record(fixtures: pathlib.Path, ids: list[str], url: Optional[str] = None, driver: str = "selenium", options: Optional[dict] = None):
+    """ Enregistre les pages (du GUN si *url*, sinon du serveur factice) qui ne le sont pas encore """
+    fixtures.mkdir(parents=True, exist_ok=True)
+    missing = [id for id in ids if not (fixtures / f"{id}.html").is_file()]
+
+    if not missing:
+        return
+
+    if url is None:
+        for id in missing:
+            (fixtures / f"{id}.html").write_text(fake.page(id, fake.situation(id)), encoding="utf-8")
+
+        return
+
+    session = gun.driver_class(driver)(url=url, **(options or {}))
+
+    try:
+        for id in missing:
+            (fixtures / f"{id}.html").write_text(session.fetch(session.page_url(id)), encoding="utf-8")
+    finally:
+        session.close()
+
+def bench(driver: str, url: str, ids: list[str], sessions: int, options: Optional[dict] = None) -> tuple[Measure, float]:
+    """ Extrait les pages avec le pilote : (mesure, temps d'ouverture des sessions) """
+    cls = gun.driver_class(driver)
+    measure = Measure(driver)
+    opening = []
+
+    def factory():
+        start = time.perf_counter()
+        session = cls(url=url, **(options or {}))
+        opening.append(time.perf_counter() - start)
+        return session
+
+    pool = SessionPool(factory, size=sessions)
+
+    def extract(id: str):
+        start = time.perf_counter()
+
+        try:
+            with pool.session() as session:
+                session.extract(id)
+        except Exception:
+            measure.errors += 1
+            return
+
+        measure.latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            list(executor.map(extract, ids))
+    finally:
+        measure.elapsed = time.perf_counter() - start
+        pool.close()
+
+    return (measure, sum(opening))
+
+def report(measure: Measure, opening: float):
+    status = "OK" if measure.ok() else "ERREURS"
+    print(f"[{status}] {measure.route}")
+    print(f"    ouverture des sessions {opening:.2f} s, {len(measure.latencies)} pages en {measure.elapsed:.2f} s, {measure.throughput:.1f} pages/s")
+    print(f"    latence p50 {measure.percentile(50):.2f} ms, p99 {measure.percentile(99):.2f} ms, max {max(measure.latencies, default=0):.2f} ms, échecs {measure.errors}")
+    # ru_maxrss : Kio sous Linux (le navigateur, processus distinct, n'est pas compté)
+    print(f"    mémoire max du processus {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} Mio")
+
+def main(args: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare les pilotes d'extraction du GUN sur des pages enregistrées")
+    parser.add_argument("--fixtures", dest="fixtures", type=pathlib.Path, default=None, help="Répertoire des pages enregistrées (par défaut, un répertoire temporaire)")
+    parser.add_argument("--ids", dest="ids", type=pathlib.Path, default=None, help="Fichier des identifiants GUN (un par ligne), par défaut -n identifiants générés")
+    parser.add_argument("-n", dest="count", type=int, default=200, help="Nombre d'identifiants générés")
+    parser.add_argument("--record", dest="record", metavar="URL", default=None, help="Enregistre les pages manquantes depuis le GUN")
+    parser.add_argument("--record-driver", dest="record_driver", default="selenium", help="Pilote de l'enregistrement")
+    parser.add_argument("-s", "--sessions", dest="sessions", type=int, default=4, help="Nombre de sessions simultanées")
+    parser.add_argument("--latency", dest="latency", type=float, default=0.0, help="Délai de chaque réponse du serveur factice (secondes)")
+    parser.add_argument("--driver", dest="drivers", action="append", default=[], help="Pilote comparé (répétable), par défaut http et auto")
+    args = parser.parse_args(args)
+
+    if args.ids:
+        ids = [line.strip() for line in args.ids.read_text(encoding="utf-8").splitlines() if line.strip()]
+    else:
+        ids = [f"{i:010d}" for i in range(args.count)]
+
+    with tempfile.TemporaryDirectory(prefix="boic-gunbench-") as tmp:
+        fixtures = args.fixtures or pathlib.Path(tmp)
+        record(fixtures, ids, url=args.record, driver=args.record_driver)
+
+        server = fake.FakeGun(("127.0.0.1", 0), fixtures=fixtures, generate=False, latency=args.latency)
+        server.start()
+        failed = False
+
+        try:
+            for driver in args.drivers or ["http", "auto"]:
+                measure, opening = bench(driver, server.url, ids, args.sessions)
+                report(measure, opening)
+                failed = failed or not measure.ok()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
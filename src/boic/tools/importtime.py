@@ -0,0 +1,162 @@
+""" Mesure du temps de démarrage de la CLI (python -X importtime)
+
+Usage : python -m boic.tools.importtime [-j JEWEL_PATH] [--budget SCENARIO=MS ...]
+
+Chaque scénario lance la CLI dans un nouveau processus avec -X importtime, et vérifie :
+- que le temps d'import cumulé (modules de l'interpréteur compris : site, encodings...)
+  reste sous le budget du scénario (en millisecondes) ;
+- qu'aucun des modules lourds interdits pour le scénario n'est importé.
+
+Le code de sortie est non nul si un budget est dépassé (utilisable en intégration continue).
+Le scénario liste:aiots n'est mesuré que si un Jewel est fourni (-j ou JEWEL_PATH). Le scénario
+import:aiots est lancé dans un Jewel temporaire (modèle de Fiche minimal, un AIOT à importer) :
+il rend un modèle Jinja, sans charger les modules des documents (docxtpl, docx).
+"""
+from __future__ import annotations
+from typing import Optional
+import argparse
+import os
+import pathlib
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+# Modules qui ne doivent pas être importés au démarrage des commandes légères.
+HEAVY_MODULES = ["sqlglot", "docxtpl", "docx", "jinja2", "selenium", "prettytable", "cefpython3", "markdown"]
+
+class Scenario:
+    """ Commande de la CLI mesurée, avec son budget """
+    def __init__(self, name: str, argv: list[str], budget: float, forbidden: list[str], needs_jewel: bool = False, scratch: bool = False):
+        self.name = name
+        self.argv = argv
+        self.budget = budget
+        self.forbidden = forbidden
+        self.needs_jewel = needs_jewel
+        # Lancé dans un Jewel temporaire (cf. scratch_jewel) ; {jewel} est remplacé par sa racine dans argv
+        self.scratch = scratch
+
+SCENARIOS = [
+    Scenario("--help", ["--help"], budget=100.0, forbidden=HEAVY_MODULES),
+    Scenario("liste:aiots", ["--no-daemon", "liste:aiots", "-d", "0"], budget=150.0, forbidden=HEAVY_MODULES, needs_jewel=True),
+    Scenario(
+        "import:aiots", ["--no-daemon", "import:aiots", "{jewel}/aiots.csv"], budget=250.0,
+        forbidden=[module for module in HEAVY_MODULES if module != "jinja2"], scratch=True
+    ),
+]
+
+def scratch_jewel(root: pathlib.Path):
+    """ Prépare un Jewel minimal : le modèle de Fiche d'AIOT (cf. config templates), et un fichier d'import """
+    from boic.jewel import DEFAULT_CONFIG
+
+    templates = DEFAULT_CONFIG["templates"]
+    shards = root.joinpath(*templates["dir"]["shards"].split("/"))
+    shards.mkdir(parents=True)
+    (shards / f"{templates['aiot']}.md.tpl").write_text("---\ntype: aiot\nnom: {{ nom }}\n---\n", encoding="utf8")
+    (root / "aiots.csv").write_text("nom,chemin\nMesure,Mesure\n", encoding="utf8")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+class Measure:
+    """ Résultat d'un scénario """
+    def __init__(self, scenario: Scenario):
+        self.scenario = scenario
+        # Module -> temps cumulé (µs) des modules importés directement (premier niveau)
+        self.top: dict[str, int] = {}
+        self.modules: set[str] = set()
+        self.wall = 0.0
+        self.returncode = 0
+
+    @property
+    def total(self) -> float:
+        """ Temps d'import cumulé, en millisecondes """
+        return sum(self.top.values()) / 1000
+
+    def violations(self) -> list[str]:
+        return sorted(m for m in self.modules if m.split(".")[0] in self.scenario.forbidden)
+
+    def ok(self) -> bool:
+        return self.returncode == 0 and self.total <= self.scenario.budget and not self.violations()
+
+def parse(stderr: str, measure: Measure):
+    """ Analyse la sortie de -X importtime """
+    base: Optional[int] = None
+
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+
+        if match is None:
+            continue
+
+        _, cumulative, indent, module = match.groups()
+        measure.modules.add(module)
+
+        # Le niveau d'indentation le plus faible correspond aux imports de premier niveau.
+        depth = len(indent)
+        base = depth if base is None else min(base, depth)
+
+        if depth == base:
+            measure.top[module] = measure.top.get(module, 0) + int(cumulative)
+
+def run(scenario: Scenario, jewel: Optional[str] = None) -> Measure:
+    """ Lance la CLI avec -X importtime pour le scénario """
+    measure = Measure(scenario)
+    argv = [sys.executable, "-X", "importtime", "-m", "boic.cli"]
+
+    if jewel:
+        argv += ["-j", jewel]
+
+    start = time.perf_counter()
+    process = subprocess.run(argv + [arg.format(jewel=jewel) for arg in scenario.argv], capture_output=True, text=True)
+    measure.wall = (time.perf_counter() - start) * 1000
+    measure.returncode = process.returncode
+
+    parse(process.stderr, measure)
+    return measure
+
+def report(measure: Measure, top: int = 10):
+    scenario = measure.scenario
+    status = "OK" if measure.ok() else "DÉPASSÉ"
+    print(f"[{status}] {scenario.name}: imports {measure.total:.1f} ms (budget {scenario.budget:.0f} ms), processus {measure.wall:.0f} ms")
+
+    for module, us in sorted(measure.top.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f"    {us / 1000:8.1f} ms  {module}")
+
+    for module in measure.violations():
+        print(f"    module interdit importé : {module}")
+
+    if measure.returncode != 0:
+        print(f"    la commande a échoué (code {measure.returncode})")
+
+def main(args: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mesure le temps de démarrage de la CLI de la BOIC")
+    parser.add_argument("-j", "--jewel", dest="root", default=os.environ.get("JEWEL_PATH"), help="Jewel utilisé par les scénarios qui en ont besoin")
+    parser.add_argument("--budget", dest="budgets", action="append", default=[], metavar="SCENARIO=MS", help="Remplace le budget d'un scénario")
+    parser.add_argument("--top", dest="top", type=int, default=10, help="Nombre de modules les plus coûteux affichés")
+    args = parser.parse_args(args)
+
+    budgets = dict(budget.rsplit("=", 1) for budget in args.budgets)
+    failed = False
+
+    for scenario in SCENARIOS:
+        if scenario.needs_jewel and not args.root:
+            print(f"[IGNORÉ] {scenario.name}: aucun Jewel fourni")
+            continue
+
+        if scenario.name in budgets:
+            scenario.budget = float(budgets[scenario.name])
+
+        if scenario.scratch:
+            with tempfile.TemporaryDirectory(prefix="boic-importtime-") as root:
+                scratch_jewel(pathlib.Path(root))
+                measure = run(scenario, jewel=root)
+        else:
+            measure = run(scenario, jewel=args.root if scenario.needs_jewel else None)
+        report(measure, top=args.top)
+        failed = failed or not measure.ok()
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
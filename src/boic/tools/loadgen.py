@@ -0,0 +1,172 @@
+""" Générateur de charge pour le serveur HTTP de l'application (boic.app.server)
+
+Usage : python -m boic.tools.loadgen [--url URL] [-c CONNEXIONS] [-d SECONDES] [--route CHEMIN ...]
+
+Lance le serveur au préalable, par exemple :
+    python -m boic.app.server -j JEWEL_PATH --port 8080
+
+Chaque route est chargée à tour de rôle pendant la durée demandée, par *c* connexions
+persistantes (keep-alive) qui enchaînent les requêtes. Le rapport donne, par route, le
+débit (requêtes par seconde) et les latences p50/p99/max ; le code de sortie est non nul
+si une requête a échoué (erreur réseau ou statut 5xx).
+"""
+from __future__ import annotations
+from typing import Optional
+from urllib.parse import urlsplit, quote
+import argparse
+import asyncio
+import sys
+import time
+
+# Routes représentatives : page statique, liste (requête ShQL, page en cache), API JSON.
+ROUTES = [
+    "/",
+    "/aiots",
+    "/api/query?q=" + quote("SELECT nom FROM aiot") + "&limit=100",
+]
+
+class Measure:
+    """ Résultat du chargement d'une route """
+    def __init__(self, route: str):
+        self.route = route
+        # Latences, en millisecondes
+        self.latencies: list[float] = []
+        self.errors = 0
+        self.bytes = 0
+        self.statuses: dict[int, int] = {}
+        self.elapsed = 0.0
+
+    def percentile(self, p: float) -> float:
+        """ Percentile (rang le plus proche) des latences """
+        if not self.latencies:
+            return 0.0
+
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, max(0, round(p / 100 * len(latencies)) - 1))]
+
+    @property
+    def throughput(self) -> float:
+        return len(self.latencies) / self.elapsed if self.elapsed else 0.0
+
+    def ok(self) -> bool:
+        return self.errors == 0 and not any(status >= 500 for status in self.statuses)
+
+class Connection:
+    """ Connexion persistante au serveur """
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, path: str) -> tuple[int, int]:
+        """ Envoie une requête GET, et lit la réponse : (statut, taille du corps) """
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\nAccept-Encoding: gzip\r\n\r\n".encode("latin-1"))
+        await self.writer.drain()
+
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+        status = int(head[0].split(" ")[1])
+        headers = {}
+
+        for line in head[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        size = 0
+
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                length = int((await self.reader.readline()).split(b";")[0], 16)
+                await self.reader.readexactly(length + 2)
+                size += length
+
+                if length == 0:
+                    break
+        elif "content-length" in headers:
+            size = int(headers["content-length"])
+            await self.reader.readexactly(size)
+        else:
+            # Corps délimité par la fermeture de la connexion
+            size = len(await self.reader.read())
+            headers["connection"] = "close"
+
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+
+        return (status, size)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader, self.writer = (None, None)
+
+async def _worker(url: str, path: str, deadline: float, measure: Measure, count: Optional[int] = None):
+    parts = urlsplit(url)
+    connection = Connection(parts.hostname or "127.0.0.1", parts.port or 80)
+
+    try:
+        while time.perf_counter() < deadline and (count is None or count > 0):
+            start = time.perf_counter()
+
+            try:
+                status, size = await connection.request(path)
+            except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                measure.errors += 1
+                connection.close()
+                continue
+
+            measure.latencies.append((time.perf_counter() - start) * 1000)
+            measure.statuses[status] = measure.statuses.get(status, 0) + 1
+            measure.bytes += size
+
+            if count is not None:
+                count -= 1
+    finally:
+        connection.close()
+
+async def load(url: str, route: str, concurrency: int, duration: float, warmup: int = 0) -> Measure:
+    """ Charge la route pendant *duration* secondes, avec *concurrency* connexions """
+    path = urlsplit(url).path.rstrip("/") + route
+
+    # Préchauffage (caches de l'application et du système de fichiers) : non mesuré.
+    if warmup:
+        await _worker(url, path, float("inf"), Measure(route), count=warmup)
+
+    measure = Measure(route)
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(_worker(url, path, deadline, measure) for _ in range(concurrency)))
+    measure.elapsed = time.perf_counter() - start
+    return measure
+
+def report(measure: Measure):
+    status = "OK" if measure.ok() else "ERREURS"
+    statuses = ", ".join(f"{code}: {count}" for code, count in sorted(measure.statuses.items()))
+    print(f"[{status}] {measure.route}")
+    print(f"    {len(measure.latencies)} requêtes en {measure.elapsed:.1f} s, {measure.throughput:.1f} req/s, {measure.bytes / 1024 / max(measure.elapsed, 1e-9):.0f} Kio/s")
+    print(f"    latence p50 {measure.percentile(50):.2f} ms, p99 {measure.percentile(99):.2f} ms, max {max(measure.latencies, default=0):.2f} ms")
+    print(f"    statuts {statuses or '-'}, erreurs réseau {measure.errors}")
+
+def main(args: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Mesure la latence et le débit du serveur HTTP de l'application BOIC")
+    parser.add_argument("--url", dest="url", default="http://127.0.0.1:8080", help="Adresse du serveur (python -m boic.app.server)")
+    parser.add_argument("-c", "--concurrency", dest="concurrency", type=int, default=8, help="Nombre de connexions simultanées")
+    parser.add_argument("-d", "--duration", dest="duration", type=float, default=10.0, help="Durée du chargement de chaque route (secondes)")
+    parser.add_argument("--warmup", dest="warmup", type=int, default=10, help="Nombre de requêtes de préchauffage par route")
+    parser.add_argument("--route", dest="routes", action="append", default=[], metavar="CHEMIN", help="Route chargée (répétable), par défaut les routes représentatives")
+    args = parser.parse_args(args)
+
+    failed = False
+
+    for route in args.routes or ROUTES:
+        measure = asyncio.run(load(args.url, route, concurrency=args.concurrency, duration=args.duration, warmup=args.warmup))
+        report(measure)
+        failed = failed or not measure.ok()
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
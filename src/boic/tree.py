@@ -0,0 +1,286 @@
+""" Arbre des répertoires du Jewel
+
+Chaque répertoire parcouru est résumé (mtime du répertoire, nombre d'enfants,
+empreinte cumulée des empreintes des enfants) dans le répertoire des index.
+
+Lors d'un rafraîchissement, un sous-arbre dont la racine n'a pas changé (même mtime)
+et qui n'a pas été marqué comme modifié n'est pas re-parcouru : seul le chemin
+modifié est re-vérifié. Les écritures faites par la BOIC (et le watcher) marquent
+les chemins modifiés ; le mode *deep* re-vérifie chaque répertoire et chaque Shard
+par un simple stat, pour les modifications faites en dehors de la BOIC.
+
+L'arbre ne sert qu'à la mise à jour des index, pas au parcours du Jewel (JewelPath.walk) :
+tant qu'il est à jour (cf. watched, pending), les requêtes passent déjà par les index ;
+sinon, une création profonde ne change pas le mtime de la racine du sous-arbre et
+ses listes enregistrées feraient manquer le Shard.
+"""
+from __future__ import annotations
+from typing import Optional, TYPE_CHECKING
+import hashlib
+import pathlib
+import json
+import os
+import logging
+import time
+
+if TYPE_CHECKING:
+    from boic.jewel import Jewel, JewelPath
+    from boic.ignore import Chain
+
+_logger = logging.getLogger(__name__)
+
+# Période de rafraîchissement du marqueur d'un watcher actif, en secondes (cf. boic.watcher)
+HEARTBEAT = 10.0
+
+def _id(path: JewelPath) -> str:
+    return "/".join(path.segments)
+
+class Changes:
+    """ Shards ajoutés, modifiés et supprimés depuis le dernier rafraîchissement """
+    def __init__(self):
+        self.added: set[str] = set()
+        self.modified: set[str] = set()
+        self.removed: set[str] = set()
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.modified or self.removed)
+
+    def __repr__(self) -> str:
+        return f"Changes(added={len(self.added)}, modified={len(self.modified)}, removed={len(self.removed)})"
+
+class DirectoryTree:
+    """ Résumés des répertoires du Jewel, persistés dans le répertoire des index """
+
+    # Seuls les Shards sont suivis.
+    suffixes = (".md",)
+
+    def __init__(self, jewel: Jewel):
+        self.jewel = jewel
+        self.nodes: Optional[dict[str, dict]] = None
+        self.dirty: Optional[set[str]] = None
+
+    def location(self) -> JewelPath:
+        return self.jewel.path(self.jewel.config.indexes.dir, "tree")
+
+    def dirty_location(self) -> JewelPath:
+        return self.jewel.path(self.jewel.config.indexes.dir, "tree.dirty")
+
+    def watcher_location(self) -> JewelPath:
+        return self.jewel.path(self.jewel.config.indexes.dir, "watcher")
+
+    def watched(self) -> bool:
+        """ Retourne True si un watcher (watch, démon, application) maintient l'arbre et les index à jour """
+        try:
+            mtime = os.stat(self.watcher_location().canonicalize()).st_mtime
+        except OSError:
+            return False
+
+        return time.time() - mtime < 3 * HEARTBEAT
+
+    def load(self) -> dict[str, dict]:
+        """ Charge les résumés et les chemins marqués comme modifiés """
+        if self.nodes is None:
+            self.nodes, self.dirty = ({}, set())
+
+            if self.location().exists():
+                with self.location().open(mode="r") as file:
+                    self.nodes = json.load(file)
+
+            if self.dirty_location().exists():
+                # L'identifiant de la racine est la chaîne vide : les lignes vides sont gardées.
+                with self.dirty_location().open(mode="r") as file:
+                    self.dirty = {line.rstrip("\n") for line in file}
+
+        return self.nodes
+
+    def reset(self):
+        """ Oublie l'ensemble des résumés (reconstruction complète) """
+        self.nodes, self.dirty = ({}, set())
+
+    def flush(self):
+        nodes = self.load()
+        self.location().parent().mkdir()
+
+        with self.location().open_atomic() as file:
+            json.dump(nodes, file)
+
+        with self.dirty_location().open_atomic() as file:
+            file.write("".join(f"{id}\n" for id in sorted(self.dirty)))
+
+    def invalidate(self, path: JewelPath, journal: bool = True):
+        """ Marque le chemin et ses ancêtres comme modifiés.
+
+            Le marquage est ajouté au journal sans charger l'arbre, pour rester peu coûteux à chaque écriture.
+            Sans *journal*, le marquage n'est fait qu'en mémoire (ex: watcher, qui rafraîchit l'arbre lui-même).
+        """
+        self.invalidate_many([path], journal=journal)
+
+    def invalidate_many(self, paths: list[JewelPath], journal: bool = True):
+        """ Marque les chemins et leurs ancêtres comme modifiés, en une seule écriture du journal (ex: import en masse) """
+        ids = sorted({"/".join(path.segments[:depth]) for path in paths for depth in range(1, len(path.segments) + 1)})
+
+        if not ids:
+            return
+
+        self.jewel.touch()
+
+        if self.dirty is not None or not journal:
+            self.load()
+            self.dirty.update(ids)
+
+        if not journal:
+            return
+
+        self.dirty_location().parent().mkdir()
+        with self.dirty_location().open(mode="a") as file:
+            file.write("".join(f"{id}\n" for id in ids))
+
+    def pending(self) -> bool:
+        """ Retourne True si des chemins marqués comme modifiés n'ont pas encore été appliqués aux index """
+        if self.dirty:
+            return True
+
+        location = self.dirty_location()
+        return location.exists() and os.path.getsize(location.canonicalize()) > 0
+
+    def summary(self, path: JewelPath) -> Optional[tuple[int, int, str]]:
+        """ Retourne le résumé (mtime, nombre d'enfants, empreinte) du répertoire """
+        node = self.load().get(_id(path))
+        return (node["mtime"], node["count"], node["hash"]) if node else None
+
+    def refresh(self, deep: bool = False, max_depth: Optional[int] = None) -> Changes:
+        """ Met à jour l'arbre, et retourne les Shards ajoutés, modifiés ou supprimés """
+        self.load()
+        changes = Changes()
+        root = self.jewel.root()
+        self._refresh(root, self.jewel.ignore.chain(root), changes, deep=deep, depth=0, max_depth=max_depth)
+        self.dirty.clear()
+        return changes
+
+    def _list(self, path: JewelPath, chain: Chain) -> tuple[list[str], dict[str, str], list[str], bool]:
+        """ Liste le répertoire : (répertoires, liens .jlnk suivis, Shards, présence d'un .jewelignore) """
+        from boic.ignore import JewelIgnore, IGNORE_FILE
+
+        with os.scandir(path.canonicalize()) as it:
+            entries = list(it)
+
+        names = [entry.name for entry in entries]
+        chain = self.jewel.ignore.extend(chain, path, names=names)
+        dirs, links, files = ([], {}, [])
+
+        for entry in entries:
+            is_dir = entry.is_dir()
+
+            if not is_dir and not entry.name.endswith((*self.suffixes, ".jlnk")):
+                continue
+
+            if JewelIgnore.ignored(chain, path.segments, entry.name, is_dir):
+                continue
+
+            if is_dir:
+                dirs.append(entry.name)
+            elif entry.name.endswith(".jlnk"):
+                # Un lien cassé n'est ignoré que lui-même : le répertoire reste lisible.
+                try:
+                    link = path.join(entry.name).follow()
+                except OSError as e:
+                    _logger.debug(f"ERROR: {e} ({path.join(entry.name)})")
+                    continue
+
+                links[link.segments[-1]] = os.fspath(link.canonicalize())
+                dirs.append(link.segments[-1])
+            else:
+                files.append(entry.name)
+
+        return (dirs, links, files, IGNORE_FILE in names)
+
+    def _refresh(self, path: JewelPath, chain: Chain, changes: Changes, deep: bool, depth: int, max_depth: Optional[int]) -> Optional[str]:
+        from boic.jewel import JewelPath
+
+        id = _id(path)
+        node = self.nodes.get(id)
+
+        try:
+            mtime = os.stat(path.canonicalize()).st_mtime_ns
+        except OSError:
+            self._drop(id, changes)
+            return None
+
+        unchanged = node is not None and node["mtime"] == mtime and id not in self.dirty
+
+        # Sous-arbre inchangé : il n'est pas re-parcouru.
+        if unchanged and not deep:
+            return node["hash"]
+
+        if unchanged:
+            dirs, links, names, has_ignore = (node["dirs"], node["links"], list(node["files"]), node["ignore"])
+        else:
+            try:
+                dirs, links, names, has_ignore = self._list(path, chain)
+            except OSError as e:
+                _logger.debug(f"ERROR: {e} ({path})")
+                self._drop(id, changes)
+                return None
+
+        if has_ignore:
+            chain = self.jewel.ignore.extend(chain, path)
+
+        previous = node["files"] if node else {}
+        files = {}
+
+        for name in names:
+            try:
+                st = os.stat(os.path.join(path.canonicalize(), name))
+            except OSError:
+                continue
+
+            files[name] = [st.st_mtime_ns, st.st_size]
+            shard_id = f"{id}/{name}"
+
+            if name not in previous:
+                changes.added.add(shard_id)
+            elif previous[name] != files[name]:
+                changes.modified.add(shard_id)
+
+        for name in previous.keys() - files.keys():
+            changes.removed.add(f"{id}/{name}")
+
+        for name in (set(node["dirs"]) if node else set()) - set(dirs):
+            self._drop(f"{id}/{name}", changes)
+
+        hashes = {}
+
+        if max_depth is None or depth < max_depth:
+            for name in dirs:
+                child = JewelPath(self.jewel, [*path.segments, name])
+
+                if name in links:
+                    child.canon = pathlib.Path(links[name])
+
+                hashes[name] = self._refresh(child, chain, changes, deep=deep, depth=depth + 1, max_depth=max_depth)
+
+        digest = hashlib.sha1(json.dumps([sorted(files.items()), sorted(hashes.items(), key=lambda h: h[0])]).encode("utf8"))
+
+        self.nodes[id] = {
+            "mtime": mtime,
+            "count": len(dirs) + len(files),
+            "hash": digest.hexdigest(),
+            "dirs": dirs,
+            "links": links,
+            "files": files,
+            "ignore": has_ignore
+        }
+
+        return self.nodes[id]["hash"]
+
+    def _drop(self, id: str, changes: Changes):
+        """ Supprime le sous-arbre de l'arbre, ses Shards sont marqués comme supprimés """
+        node = self.nodes.pop(id, None)
+
+        if node is None:
+            return
+
+        changes.removed.update(f"{id}/{name}" for name in node["files"])
+
+        for name in node["dirs"]:
+            self._drop(f"{id}/{name}", changes)
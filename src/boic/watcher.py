@@ -0,0 +1,290 @@
+""" Surveillance du Jewel
+
+Maintient l'index primaire, les index secondaires et le cache des Shards à jour
+à partir des modifications du système de fichiers :
+- sous Linux, par les notifications du noyau (inotify, via ctypes) ;
+- ailleurs (ou si inotify n'est pas disponible), par scrutation périodique de l'arbre des répertoires.
+
+Les évènements marquent les chemins modifiés dans l'arbre des répertoires (cf. boic.tree) ;
+une rafale d'évènements est regroupée (debounce) puis appliquée en une seule mise à jour
+incrémentale, qui ne re-vérifie que les chemins modifiés.
+
+Un watcher actif le signale par un marqueur dans le répertoire des index, rafraîchi toutes
+les HEARTBEAT secondes (cf. DirectoryTree.watched) : les requêtes ne se fient aux index que
+s'il existe.
+"""
+from __future__ import annotations
+from typing import Optional, Callable, TYPE_CHECKING
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from boic.ignore import IGNORE_FILE
+from boic.tree import Changes, HEARTBEAT
+
+if TYPE_CHECKING:
+    from boic.jewel import Jewel, JewelPath
+
+_logger = logging.getLogger(__name__)
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+IN_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+
+_EVENT = struct.Struct("iIII")
+
+# Fichiers dont la modification peut changer les index.
+_WATCHED_SUFFIXES = (".md", ".jlnk", IGNORE_FILE)
+
+class InotifyBackend:
+    """ Notifications du noyau Linux (inotify) """
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.libc.inotify_init1.argtypes = [ctypes.c_int]
+        self.libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+
+        # Descripteur de surveillance -> chemins logiques du répertoire (plusieurs liens .jlnk peuvent viser le même répertoire)
+        self.watches: dict[int, list[JewelPath]] = {}
+
+    @staticmethod
+    def available() -> bool:
+        if not sys.platform.startswith("linux"):
+            return False
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+            return hasattr(libc, "inotify_init1")
+        except OSError:
+            return False
+
+    def watch(self, path: JewelPath):
+        """ Surveille le répertoire (cible canonique, y compris à travers un lien .jlnk) """
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path.canonicalize()), IN_MASK)
+
+        if wd < 0:
+            _logger.debug(f"Surveillance impossible: {path} ({os.strerror(ctypes.get_errno())})")
+            return
+
+        paths = self.watches.setdefault(wd, [])
+
+        if all(p.segments != path.segments for p in paths):
+            paths.append(path)
+
+    def read(self, timeout: float) -> list[tuple[Optional[JewelPath], str, int]]:
+        """ Attend et retourne les évènements : (répertoire, nom de l'entrée, masque) """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+
+        if not ready:
+            return []
+
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events, offset = ([], 0)
+
+        while offset < len(buf):
+            wd, mask, _cookie, length = _EVENT.unpack_from(buf, offset)
+            name = os.fsdecode(buf[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0"))
+            offset += _EVENT.size + length
+
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+
+            for path in self.watches.get(wd, [None]):
+                events.append((path, name, mask))
+
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class Watcher:
+    """ Maintient les index du Jewel à jour à partir des modifications du système de fichiers
+
+        *debounce* : délai de calme (en secondes) avant d'appliquer une rafale d'évènements ;
+        *max_delay* : délai maximal avant d'appliquer des évènements continus ;
+        *interval* : période de scrutation lorsque inotify n'est pas disponible ;
+        *on_change* : appelé avec les modifications appliquées ;
+        *lock* : verrou tenu pendant la mise à jour des index (partagé avec les lecteurs).
+    """
+    def __init__(self, jewel: Jewel, debounce: float = 0.5, max_delay: float = 5.0, interval: float = 2.0, polling: Optional[bool] = None, on_change: Optional[Callable[[Changes], None]] = None, lock: Optional[threading.RLock] = None):
+        self.jewel = jewel
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.interval = interval
+        self.polling = not InotifyBackend.available() if polling is None else polling
+        self.on_change = on_change
+        self.lock = lock or threading.RLock()
+
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        # Dernier rafraîchissement du marqueur (cf. watched)
+        self.beat: Optional[float] = None
+
+    def start(self) -> threading.Thread:
+        """ Démarre la surveillance dans un fil d'exécution dédié """
+        self.thread = threading.Thread(target=self.run, name="boic-watcher", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def stop(self):
+        self.stopped.set()
+
+        if self.thread:
+            self.thread.join()
+
+    def apply(self, deep: bool = False) -> Changes:
+        """ Applique les modifications marquées dans l'arbre des répertoires aux index """
+        from boic import shards
+
+        with self.lock:
+            changes = self.jewel.tree.refresh(deep=deep)
+
+            if changes:
+                _logger.info(f"Mise à jour des index: {changes!r}")
+                shards.update_indexes(self.jewel, changes)
+
+            self.jewel.tree.flush()
+
+        if changes and self.on_change:
+            self.on_change(changes)
+
+        return changes
+
+    def run(self):
+        """ Surveille le Jewel jusqu'à l'arrêt (bloquant) """
+        # Rattrape les modifications faites depuis le dernier rafraîchissement.
+        self.apply(deep=True)
+
+        try:
+            self.heartbeat()
+
+            if self.polling:
+                _logger.info(f"Surveillance par scrutation (toutes les {self.interval}s)")
+                self._poll()
+            else:
+                _logger.info("Surveillance par inotify")
+                self._notify()
+        finally:
+            self.jewel.tree.watcher_location().canonicalize().unlink(missing_ok=True)
+
+    def heartbeat(self):
+        """ Rafraîchit le marqueur du watcher actif (au plus une fois toutes les HEARTBEAT secondes) """
+        now = time.monotonic()
+
+        if self.beat is not None and now - self.beat < HEARTBEAT:
+            return
+
+        self.beat = now
+        self.jewel.path(self.jewel.config.indexes.dir).mkdir()
+
+        with self.jewel.tree.watcher_location().open(mode="w") as file:
+            file.write(f"{os.getpid()}\n")
+
+    def _poll(self):
+        while not self.stopped.wait(self.interval):
+            self.apply(deep=True)
+            self.heartbeat()
+
+    def _notify(self):
+        backend = InotifyBackend()
+
+        try:
+            self._watch_tree(backend, self.jewel.root())
+
+            first, last, overflow = (None, None, False)
+
+            while not self.stopped.is_set():
+                events = backend.read(timeout=self.debounce)
+                now = time.monotonic()
+                self.heartbeat()
+
+                for directory, name, mask in events:
+                    if directory is None or mask & IN_Q_OVERFLOW:
+                        overflow = True
+                    elif self._on_event(backend, directory, name, mask):
+                        first, last = (first or now, now)
+
+                if overflow:
+                    first, last = (first or now, now)
+
+                if first is None:
+                    continue
+
+                if now - last >= self.debounce or now - first >= self.max_delay:
+                    self.apply(deep=overflow)
+                    first, last, overflow = (None, None, False)
+        finally:
+            backend.close()
+
+    def _watch_tree(self, backend: InotifyBackend, path: JewelPath):
+        """ Surveille le répertoire et sa descendance (liens .jlnk suivis, entrées exclues ignorées) """
+        for directory, _dirs, _files in path.walk(suffixes=_WATCHED_SUFFIXES):
+            backend.watch(directory)
+
+    def _on_event(self, backend: InotifyBackend, directory: JewelPath, name: str, mask: int) -> bool:
+        """ Marque le chemin modifié, retourne True si l'évènement concerne les index """
+        from boic.jewel import JewelPath
+
+        is_dir = bool(mask & IN_ISDIR)
+
+        if name and not is_dir and not name.endswith(_WATCHED_SUFFIXES):
+            return False
+
+        if name.endswith(".jlnk"):
+            # La cible du lien a changé : le répertoire est re-listé et la cible surveillée.
+            path = directory
+            link = JewelPath(self.jewel, [*directory.segments, name])
+
+            if mask & (IN_CREATE | IN_MOVED_TO | IN_CLOSE_WRITE) and link.is_file():
+                try:
+                    self._watch_tree(backend, link.follow())
+                except OSError as e:
+                    _logger.debug(f"Lien invalide: {link} ({e})")
+
+        elif name:
+            path = JewelPath(self.jewel, [*directory.segments, name])
+
+            if is_dir and mask & (IN_CREATE | IN_MOVED_TO):
+                self._watch_tree(backend, path)
+
+        else:
+            path = directory
+
+        _logger.debug(f"Modification: {path}")
+
+        with self.lock:
+            self.jewel.tree.invalidate(path, journal=False)
+
+        return True
@@ -1,10 +1,44 @@
 """
-    Dummy conftest.py for boic.
-
-    If you don't know what this is for, just leave it empty.
-    Read more about conftest.py under:
-    - https://docs.pytest.org/en/stable/fixture.html
-    - https://docs.pytest.org/en/stable/writing_plugins.html
+    Fixtures partagées : un Jewel temporaire, et l'écriture de Shards.
 """
+import pathlib
+
+import pytest
+
+from boic import jewel as J, shards
+
+
+@pytest.fixture
+def root(tmp_path) -> pathlib.Path:
+    root = tmp_path / "jewel"
+    root.mkdir()
+    return root
+
+
+@pytest.fixture
+def jewel(root) -> J.Jewel:
+    return J.open(root)
+
+
+@pytest.fixture
+def write_shard(root):
+    """ Ecrit un Shard (chemin relatif à la racine, frontmatter en YAML) """
+    def write(location: str, frontmatter: str, body: str = "") -> pathlib.Path:
+        path = root.joinpath(*location.split("/"))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(f"---\n{frontmatter}---\n{body}", encoding="utf8")
+        return path
+
+    return write
+
+
+@pytest.fixture
+def indexed(root):
+    """ Construit les index et les marque à jour (comme si un watcher les maintenait) """
+    def build() -> J.Jewel:
+        jewel = J.open(root)
+        shards.build_indexes(jewel)
+        jewel.tree.watcher_location().canonicalize().touch()
+        return J.open(root)
 
-# import pytest
+    return build
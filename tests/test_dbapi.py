@@ -0,0 +1,83 @@
+from datetime import date, datetime
+
+import pytest
+from sqlglot import parse_one, exp
+
+from boic.sql import dbapi
+
+
+def where(query):
+    return parse_one(query).args["where"].this
+
+
+def test_bind_without_parameters_returns_query():
+    query = "SELECT nom FROM aiot WHERE commune = 'Lyon'"
+
+    assert dbapi.bind(query) == query
+    assert dbapi.bind(query, ()) == query
+
+
+def test_bind_qmark():
+    bound = dbapi.bind("SELECT nom FROM aiot WHERE commune = ? AND gun > ?", ("Lyon", 3))
+
+    assert bound == "SELECT nom FROM aiot WHERE commune = 'Lyon' AND gun > 3"
+
+
+def test_bind_named():
+    bound = dbapi.bind("SELECT nom FROM aiot WHERE commune = :commune OR nom = :commune", {"commune": "Lyon"})
+
+    assert bound == "SELECT nom FROM aiot WHERE commune = 'Lyon' OR nom = 'Lyon'"
+
+
+def test_bound_string_cannot_change_the_query():
+    bound = dbapi.bind("SELECT nom FROM aiot WHERE commune = ?", ("x' OR '1' = '1",))
+    condition = where(bound)
+
+    assert isinstance(condition, exp.EQ)
+    assert condition.expression.this == "x' OR '1' = '1"
+
+
+@pytest.mark.parametrize("value, sql", [
+    (None, "NULL"),
+    (True, "TRUE"),
+    (1.5, "1.5"),
+    (date(2024, 3, 1), "CAST('2024-03-01' AS DATE)"),
+    (datetime(2024, 3, 1, 8, 30), "CAST('2024-03-01T08:30:00' AS TIMESTAMP)"),
+    (["eau", 2], "ARRAY('eau', 2)"),
+])
+def test_literal(value, sql):
+    assert dbapi.literal(value).sql() == sql
+
+
+def test_literal_rejects_unknown_types():
+    with pytest.raises(dbapi.ProgrammingError):
+        dbapi.literal(object())
+
+
+@pytest.mark.parametrize("query, parameters", [
+    ("SELECT nom FROM aiot WHERE commune = ?", ()),
+    ("SELECT nom FROM aiot WHERE commune = ?", ("Lyon", "Vienne")),
+    ("SELECT nom FROM aiot", ("Lyon",)),
+    ("SELECT nom FROM aiot WHERE commune = :commune", ("Lyon",)),
+    ("SELECT nom FROM aiot WHERE commune = :commune", {"nom": "A"}),
+    ("SELECT nom FROM aiot WHERE commune = ?", {"commune": "Lyon"}),
+    ("SELECT nom FROM WHERE", ("Lyon",)),
+])
+def test_bind_errors(query, parameters):
+    with pytest.raises(dbapi.ProgrammingError):
+        dbapi.bind(query, parameters)
+
+
+def test_cursor_reads_rows_by_batch(jewel, write_shard):
+    for name in "ABC":
+        write_shard(f"{name}/Fiche.md", f"type: aiot\nnom: {name}\ntags: [eau]\n")
+
+    with dbapi.connect(jewel) as connection:
+        cursor = connection.execute("SELECT nom, tags, commune FROM aiot WHERE nom <> ?", ("B",))
+
+        assert [column[0] for column in cursor.description] == ["nom", "tags", "commune"]
+        assert sorted(cursor.fetchall()) == [("A", ("eau",), None), ("C", ("eau",), None)]
+        assert cursor.fetchone() is None
+
+    with pytest.raises(dbapi.InterfaceError):
+        cursor.fetchall()
@@ -0,0 +1,64 @@
+import pytest
+
+from boic import ignore
+
+
+@pytest.mark.parametrize("pattern, rel, is_dir, expected", [
+    ("*.tmp", "a.tmp", False, True),
+    ("*.tmp", "x/y/a.tmp", False, True),
+    ("*.tmp", "a.tmpl", False, False),
+    ("build/", "build", True, True),
+    ("build/", "build", False, False),
+    ("build/", "x/build", True, True),
+    ("/build", "build", True, True),
+    ("/build", "x/build", True, False),
+    ("doc/*.md", "doc/a.md", False, True),
+    ("doc/*.md", "x/doc/a.md", False, False),
+    ("doc/*.md", "doc/x/a.md", False, False),
+    ("a/**/b", "a/b", True, True),
+    ("a/**/b", "a/x/y/b", True, True),
+    ("**/cache", "x/cache", True, True),
+    ("fiche?.md", "fiche1.md", False, True),
+    ("fiche?.md", "fiche10.md", False, False),
+    ("[!a]*.md", "b.md", False, True),
+    ("[!a]*.md", "a.md", False, False),
+])
+def test_rule_matches(pattern, rel, is_dir, expected):
+    assert ignore.Rule(pattern).matches(rel, is_dir) is expected
+
+
+def test_parse_skips_blank_lines_and_comments():
+    rules = ignore.parse(["# commentaire\n", "\n", "*.tmp  \n", "!garde.tmp\n"])
+
+    assert len(rules) == 2
+    assert rules[1].negate
+
+
+def test_last_matching_rule_wins():
+    chain = ((1, tuple(ignore.parse(["*.tmp", "!garde.tmp"]))),)
+
+    assert ignore.JewelIgnore.ignored(chain, [""], "a.tmp", False)
+    assert not ignore.JewelIgnore.ignored(chain, [""], "garde.tmp", False)
+
+
+def test_deeper_rules_are_relative_to_their_directory():
+    # Règles de la racine, puis celles du répertoire /A (chaîne de /A et de sa descendance).
+    root = ((1, tuple(ignore.parse(["*.tmp"]))),)
+    chain = root + ((2, tuple(ignore.parse(["/brouillons/", "!b.tmp"]))),)
+
+    assert ignore.JewelIgnore.ignored(chain, ["", "A"], "brouillons", True)
+    assert not ignore.JewelIgnore.ignored(chain, ["", "A", "B"], "brouillons", True)
+    assert not ignore.JewelIgnore.ignored(chain, ["", "A", "B"], "b.tmp", False)
+    assert ignore.JewelIgnore.ignored(root, ["", "C"], "b.tmp", False)
+
+
+def test_walk_applies_config_and_jewelignore(root, jewel, write_shard):
+    write_shard("A/Fiche.md", "nom: A\n")
+    write_shard("A/brouillons/Fiche.md", "nom: brouillon\n")
+    write_shard("B/Fiche.md", "nom: B\n")
+    write_shard(".git/Fiche.md", "nom: git\n")
+    (root / "A" / ".jewelignore").write_text("brouillons/\n", encoding="utf8")
+
+    files = {"/".join(path.segments) for _, _, paths in jewel.root().walk(suffixes=(".md",)) for path in paths}
+
+    assert files == {"/A/Fiche.md", "/B/Fiche.md"}
@@ -0,0 +1,24 @@
+import pytest
+
+from boic import importer
+
+
+@pytest.fixture
+def rows(tmp_path):
+    path = tmp_path / "aiots.csv"
+    path.write_text("nom;chemin;numero.aiot\nA;Rhône/A;1\nB;Rhône/A;2\nC;../C;3\nD;Rhône/../../D;4\nE;;5\n", encoding="utf8")
+    return importer.read_rows(path)
+
+
+def test_read_rows_nests_dotted_columns(rows):
+    assert [row.nom for row in rows] == ["A", "B", "C", "D", "E"]
+    assert rows[0].values["numero"] == {"aiot": "1"}
+    assert rows[0].line == 2
+
+
+def test_prepare_rejects_duplicates_and_paths_outside_the_jewel(jewel, rows):
+    valid = importer.Importer(jewel).prepare(rows)
+
+    assert [row.nom for row in valid] == ["A"]
+    assert "/".join(valid[0].fiche.segments) == "/Rhône/A/Fiche.md"
+    assert all(row.error for row in rows[1:])
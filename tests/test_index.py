@@ -0,0 +1,94 @@
+import pytest
+
+from boic import index as I, jewel as J
+from boic.sql import dbapi
+
+DATES = {
+    "A/02_inspections/2023/Fiche_1.md": "2023-11-30",
+    "A/02_inspections/2024/Fiche_2.md": "2024-01-01",
+    "A/02_inspections/2024/Fiche_3.md": "2024-06-15",
+    "B/02_inspections/2024/Fiche_4.md": "2024-12-31",
+    "B/02_inspections/2025/Fiche_5.md": "2025-01-01",
+}
+
+CONDITIONS = [
+    "date_inspection BETWEEN '2024-01-01' AND '2024-12-31'",
+    "date_inspection BETWEEN CAST('2024-06-15' AS DATE) AND CAST('2025-01-01' AS DATE)",
+    "date_inspection < '2024-06-15'",
+    "date_inspection <= '2024-06-15'",
+    "date_inspection > '2024-06-15'",
+    "date_inspection >= '2024-06-15'",
+    "date_inspection = '2024-12-31'",
+    "date_inspection >= '2024-01-01' AND ARRAY_CONTAINS(tags, 'eau')",
+]
+
+
+@pytest.fixture
+def inspections(write_shard):
+    for n, (location, date) in enumerate(DATES.items()):
+        tags = "[eau]" if n % 2 else "[air]"
+        write_shard(location, f"type: inspection\ndate_inspection: {date}\ntags: {tags}\n")
+
+    write_shard("C/02_inspections/Fiche_6.md", "type: inspection\ntags: [eau]\n")
+
+
+def ids(jewel, condition, table="inspection"):
+    rows = dbapi.connect(jewel).execute(f"SELECT id FROM {table} WHERE {condition}").fetchall()
+    return sorted(id for id, in rows)
+
+
+@pytest.mark.parametrize("condition", CONDITIONS)
+def test_index_lookup_matches_filter(root, inspections, indexed, monkeypatch, condition):
+    lookups = []
+    lookup_range = I.Range.lookup_range
+    monkeypatch.setattr(I.Range, "lookup_range", lambda self, *a, **k: lookups.append(self) or lookup_range(self, *a, **k))
+
+    expected = ids(J.open(root), condition)
+    assert expected
+    assert not lookups, "sans watcher, le Jewel est parcouru"
+
+    jewel = indexed()
+    assert ids(jewel, condition) == expected
+    assert lookups, "les index à jour répondent à la condition"
+
+
+def test_range_index_refuses_untyped_column(jewel):
+    with pytest.raises(ValueError):
+        jewel.index.new("note", "range", ["note"])
+
+
+def test_untyped_range_index_is_not_used(root, write_shard, indexed):
+    (root / "jewel.yml").write_text("indexes:\n  schemas:\n    note: {type: range, columns: [note]}\n", encoding="utf8")
+    write_shard("A/Fiche.md", "type: aiot\nnote: 9\n")
+    write_shard("B/Fiche.md", "type: aiot\nnote: 10\n")
+    jewel = indexed()
+
+    assert not jewel.index.find("range", "note")
+    assert list(jewel.index["note"]) == []
+
+
+def test_comparisons_with_null_never_match(jewel, write_shard):
+    write_shard("A/Fiche.md", "type: aiot\nnom: A\n")
+    write_shard("B/Fiche.md", "type: aiot\nnom: B\ncommune: Lyon\n")
+
+    assert ids(jewel, "commune = absente", "aiot") == []
+    assert ids(jewel, "commune <> 'Lyon'", "aiot") == []
+    assert ids(jewel, "commune IS NULL", "aiot") == ["/A/Fiche.md"]
+    assert ids(jewel, "commune IS NOT NULL", "aiot") == ["/B/Fiche.md"]
+
+
+def test_incremental_update_removes_stale_postings(root, write_shard, indexed):
+    from boic import shards
+
+    write_shard("A/Fiche.md", "type: aiot\ntags: [eau, air]\n")
+    write_shard("B/Fiche.md", "type: aiot\ntags: [eau]\n")
+    jewel = indexed()
+
+    write_shard("A/Fiche.md", "type: aiot\ntags: [sol]\n")
+    (root / "B" / "Fiche.md").unlink()
+    shards.build_indexes(jewel, incremental=True, deep=True)
+
+    tags = J.open(root).index["tags"]
+    assert tags.lookup("eau") == set()
+    assert tags.lookup("air") == set()
+    assert tags.lookup("sol") == {"/A/Fiche.md"}
@@ -0,0 +1,64 @@
+from datetime import date
+
+import pytest
+
+from boic.sql import dbapi
+
+
+@pytest.fixture
+def pruner(jewel):
+    partition = jewel.partitions.find("inspection")
+    return lambda *bounds: partition.pruner(list(bounds))
+
+
+@pytest.mark.parametrize("location, expected", [
+    ("A", False),
+    ("A/00_archives", True),
+    ("A/02_inspections", False),
+    ("A/02_inspections/2023", True),
+    ("A/02_inspections/2024", False),
+    ("A/02_inspections/2024/visite", False),
+    ("A/02_inspections/2025", True),
+    ("A/02_inspections/divers", False),
+])
+def test_pruner_with_year_bounds(jewel, pruner, location, expected):
+    prune = pruner(("date_inspection", "2024-01-01", "2024-12-31", True, True))
+
+    assert prune(jewel.path(*location.split("/"))) is expected
+
+
+def test_pruner_with_open_bound(jewel, pruner):
+    prune = pruner(("date_inspection", date(2024, 6, 1), None, True, True))
+
+    assert prune(jewel.path("A", "02_inspections", "2023"))
+    assert not prune(jewel.path("A", "02_inspections", "2030"))
+
+
+def test_pruner_without_bounds_keeps_structure_dirs_only(jewel, pruner):
+    prune = pruner()
+
+    assert prune(jewel.path("A", "07_presentations"))
+    assert not prune(jewel.path("A", "02_inspections", "1999"))
+
+
+@pytest.fixture
+def archived(write_shard):
+    write_shard("A/02_inspections/2024/Fiche.md", "type: inspection\ndate_inspection: 2024-03-01\n")
+    write_shard("A/00_archives/Fiche.md", "type: inspection\ndate_inspection: 2024-03-01\n")
+
+
+QUERY = "SELECT id FROM inspection WHERE date_inspection BETWEEN '2024-01-01' AND '2024-12-31'"
+
+
+def test_scan_skips_pruned_dirs(jewel, archived):
+    assert dbapi.connect(jewel).execute(QUERY).fetchall() == [("/A/02_inspections/2024/Fiche.md",)]
+
+
+def test_index_lookup_applies_partition(archived, indexed):
+    jewel = indexed()
+
+    assert jewel.index["date_inspection"].lookup_range("2024-01-01", "2024-12-31") == {
+        "/A/02_inspections/2024/Fiche.md",
+        "/A/00_archives/Fiche.md",
+    }
+    assert dbapi.connect(jewel).execute(QUERY).fetchall() == [("/A/02_inspections/2024/Fiche.md",)]
@@ -0,0 +1,36 @@
+import pytest
+
+from boic.app.routing import Router
+
+
+@pytest.fixture
+def router():
+    router = Router()
+    router.add("/shard/{id:path}", lambda: None, name="shard")
+    router.add("/aiot/{id}", lambda: None, name="aiot")
+    router.add("/page/{n:int}", lambda: None, name="page")
+    return router
+
+
+@pytest.mark.parametrize("id", ["A/Fiche.md", "A B/Fiche 50%.md", "Dép/#1?x.md", "été/Fiche.md"])
+def test_path_param_round_trips(router, id):
+    url = router.url("shard", id=id)
+    route, params = router.match(url)
+
+    assert route.name == "shard"
+    assert params == {"id": id}
+    assert not set(" #?") & set(url)
+
+
+def test_segment_param_encodes_slashes(router):
+    url = router.url("aiot", id="a/b")
+
+    assert url == "/aiot/a%2Fb"
+    assert router.match(url)[1] == {"id": "a/b"}
+
+
+def test_int_param_and_query_string(router):
+    route, params = router.match("/page/3?tri=nom#haut")
+
+    assert route.name == "page"
+    assert params == {"n": 3}
@@ -0,0 +1,83 @@
+import pytest
+import yaml
+
+from boic.shards import writer
+
+
+def frontmatter(text):
+    return yaml.safe_load(text.split("---")[1])
+
+
+def test_update_keeps_comments_order_and_body():
+    text = "---\n# Fiche\nnom: A  # nom usuel\ncommune: Lyon\ntags: [eau]\n---\nCorps  \n\n- liste\n"
+    updated = writer.update_frontmatter(text, {"commune": "Vienne", "gun": 42})
+
+    assert updated == "---\n# Fiche\nnom: A  # nom usuel\ncommune: Vienne\ntags: [eau]\ngun: 42\n---\nCorps  \n\n- liste\n"
+
+
+def test_update_replaces_multiline_value_in_place():
+    text = "---\nnom: A\nnumero:\n  aiot: 1\n  gup: 2\ncommune: Lyon\n---\n"
+    updated = writer.update_frontmatter(text, {"numero": {"aiot": 3}})
+
+    assert frontmatter(updated) == {"nom": "A", "numero": {"aiot": 3}, "commune": "Lyon"}
+    assert updated.index("numero") < updated.index("commune")
+
+
+def test_update_keeps_crlf_line_endings():
+    text = "---\r\n# Fiche\r\nnom: A\r\ncommune:\r\n---\r\nCorps\r\n"
+    updated = writer.update_frontmatter(text, {"commune": "Lyon", "gun": 1})
+
+    assert updated == "---\r\n# Fiche\r\nnom: A\r\ncommune: Lyon\r\ngun: 1\r\n---\r\nCorps\r\n"
+    assert "\n" not in updated.replace("\r\n", "")
+
+
+def test_update_round_trips_crlf():
+    text = "---\r\nnom: A\r\n---\r\n"
+    once = writer.update_frontmatter(text, {"commune": "Lyon"})
+
+    assert writer.update_frontmatter(once, {"commune": "Lyon"}) == once
+    assert frontmatter(once.replace("\r\n", "\n")) == {"nom": "A", "commune": "Lyon"}
+
+
+def test_update_rewrites_flow_style_block():
+    text = "---\n{nom: A, commune: Lyon}\n---\nCorps\n"
+    updated = writer.update_frontmatter(text, {"commune": "Vienne"})
+
+    assert frontmatter(updated) == {"nom": "A", "commune": "Vienne"}
+    assert updated.endswith("---\nCorps\n")
+
+
+def test_update_adds_frontmatter_to_plain_file():
+    assert writer.update_frontmatter("Corps\n", {"nom": "A"}) == "---\nnom: A\n---\nCorps\n"
+
+
+@pytest.mark.parametrize("line, key", [
+    ("nom: A\n", "nom"),
+    ("nom:\r\n", "nom"),
+    ("'clé': 1\n", "clé"),
+    ('"a b": 1\n', "a b"),
+])
+def test_key_pattern(line, key):
+    match = writer._KEY.match(line.rstrip("\n"))
+
+    assert match is not None
+    assert next(value for value in match.group("double", "single", "plain") if value is not None) == key
+
+
+def test_commit_writes_and_indexes(jewel, root):
+    shard = writer.ShardWriter(jewel)
+    shard.create(jewel.path("A", "Fiche.md"), {"type": "aiot", "nom": "A"})
+    shard.commit()
+
+    shard.update(jewel.path("A", "Fiche.md"), {"commune": "Lyon"})
+    shard.commit()
+
+    assert frontmatter((root / "A" / "Fiche.md").read_text(encoding="utf8")) == {"type": "aiot", "nom": "A", "commune": "Lyon"}
+    assert [path.name for path in (root / "A").iterdir()] == ["Fiche.md"]
+
+
+def test_commit_refuses_existing_shard(jewel, write_shard):
+    write_shard("A/Fiche.md", "nom: A\n")
+
+    with pytest.raises(ValueError):
+        writer.ShardWriter(jewel).create(jewel.path("A", "Fiche.md"), {"nom": "B"})